@@ -0,0 +1,29 @@
+// Applies the figure patches of figure_pipeline.figure_patch: either a whole
+// figure, or the layout and the data of the new figure with the position of a
+// trace of the figure shown in place of every trace the browser keeps. The
+// patch comes from the chart's callback or, when the live updates rendered the
+// figure again, from its refresh store.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    figure_patch: {
+        apply: function (patch, refresh, figure) {
+            var triggered = window.dash_clientside.callback_context.triggered;
+            if (triggered.length &&
+                    triggered[0].prop_id.indexOf("-refresh.") !== -1) {
+                patch = refresh;
+            }
+            if (!patch) {
+                return window.dash_clientside.no_update;
+            }
+            if (patch.figure) {
+                return patch.figure;
+            }
+            var shown = (figure && figure.data) || [];
+            return {
+                data: patch.data.map(function (trace) {
+                    return typeof trace === "number" ? shown[trace] : trace;
+                }),
+                layout: patch.layout
+            };
+        }
+    }
+});
@@ -0,0 +1,387 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import multiprocessing
+import os
+import time
+
+import attr
+import numpy as np
+import pandas as pd
+
+import definitions
+import tick_store
+import time_index
+from indicators import compute_batch, shift
+
+
+# ------------------------------------------------------------------------------
+# Vectorized backtests
+#
+# Evaluates trading rules on the raw arrays of indicators.compute_batch instead
+# of the traces of charts.py. A strategy turns the study values of every bar
+# into events: NaN keeps the position, any other value is the position to hold
+# from the close of the bar on (1 long, -1 short, 0 flat). Positions are the
+# events carried forward, the strategy earns the return of the next bar on the
+# position of a bar and pays its cost on every change of the position, all as
+# whole-array NumPy operations. Trades are the runs of a non-zero position.
+#
+# A strategy splits its parameters into those of its study, which cost a pass
+# of compute_batch, and those of its rules, which only cost the events. A
+# parameter sweep computes the study once per study parameter set and runs the
+# rules of all its combinations on it, spread over a process pool. Workers are
+# handed the store rows and the combinations only and read the bars from the
+# tick store themselves, no array is pickled.
+@attr.s(frozen=True, kw_only=True)
+class Strategy:
+    name = attr.ib(type=str)
+    # indicators.compute_batch study the rules read
+    study = attr.ib(type=str)
+    # parameters passed on to the study, the rest go to the rules
+    study_params = attr.ib(default=())
+    # fixed parameters of the study not exposed by the strategy
+    study_constants = attr.ib(factory=dict)
+    # fn(values, arrays, **rule params) -> events
+    rules = attr.ib()
+    params = attr.ib(factory=dict)
+    inputs = attr.ib(default=("high", "low", "close"))
+
+    def merged_params(self, params: dict = None):
+        return {**self.params, **(params or {})}
+
+    # Splits merged params into (study params, rule params)
+    def split_params(self, params: dict = None):
+        params = self.merged_params(params)
+        study = {k: v for k, v in params.items() if k in self.study_params}
+        rules = {k: v for k, v in params.items() if k not in self.study_params}
+        return {**self.study_constants, **study}, rules
+
+    def study_values(self, arrays: dict, params: dict = None):
+        study, _ = self.split_params(params)
+        return compute_batch(arrays, [(self.study, study)])
+
+    def events(self, values: dict, arrays: dict, params: dict = None):
+        _, rules = self.split_params(params)
+        return self.rules(values, arrays, **rules)
+
+
+# Bars where x crosses a level (a number or one per bar), never on a NaN
+def crosses_above(x: np.ndarray, level):
+    return (shift(x, 1) < shift_level(level)) & (x >= level)
+
+
+def crosses_below(x: np.ndarray, level):
+    return (shift(x, 1) > shift_level(level)) & (x <= level)
+
+
+# a level of every bar is compared with the value of the bar before at the
+# level of that bar
+def shift_level(level):
+    return shift(level, 1) if isinstance(level, np.ndarray) else level
+
+
+# ------------------------------------------------------------------------------
+# Built-in strategies
+
+# CCI mean reversion: long when the CCI climbs back above -level out of the
+# oversold zone, short when it falls back below level out of the overbought
+# zone, flat when it crosses zero. A position entered at -level or level meets
+# zero before the opposite entry, so crossing zero only ever closes it; exits
+# are applied last, a bar jumping over both levels stays flat.
+def cci_reversal(values, arrays, level=100.0):
+    cci = values["cci.cci"]
+    events = np.full(len(cci), np.nan)
+    events[crosses_above(cci, -level)] = 1.0
+    events[crosses_below(cci, level)] = -1.0
+    events[crosses_above(cci, 0.0) | crosses_below(cci, 0.0)] = 0.0
+    return events
+
+
+# Bollinger breakout: long when the close breaks above the upper band, short
+# when it breaks below the lower band, flat when it crosses back over the mean.
+# The bands are computed one standard deviation wide and scaled here, so the
+# width costs no extra pass over the closes; entries are applied last, a bar
+# jumping from below the mean above the band enters.
+def bollinger_breakout(values, arrays, num_of_std=2.0):
+    close = arrays["close"]
+    mean = values["bollinger.mean"]
+    band = (values["bollinger.upper"] - mean) * num_of_std
+    events = np.full(len(close), np.nan)
+    events[crosses_above(close, mean) | crosses_below(close, mean)] = 0.0
+    events[crosses_above(close, mean + band)] = 1.0
+    events[crosses_below(close, mean - band)] = -1.0
+    return events
+
+
+STRATEGIES = {}
+
+
+def register_strategy(strategy: Strategy):
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+for _strategy in (
+        Strategy(name="cci_reversal", study="cci", study_params=("n_days",),
+                 rules=cci_reversal, params={"n_days": 20, "level": 100.0}),
+        Strategy(name="bollinger_breakout", study="bollinger",
+                 study_params=("window_size",),
+                 study_constants={"num_of_std": 1.0},
+                 rules=bollinger_breakout, inputs=("close",),
+                 params={"window_size": 20, "num_of_std": 2.0}),
+):
+    register_strategy(_strategy)
+
+
+# ------------------------------------------------------------------------------
+# Positions, returns and trades
+
+# Carries every event forward until the next one, flat before the first
+def positions_from_events(events: np.ndarray):
+    held = np.where(np.isnan(events), 0, np.arange(len(events)))
+    np.maximum.accumulate(held, out=held)
+    position = events[held]
+    position[np.isnan(position)] = 0.0
+    return position
+
+
+# Per bar return of holding `position` from the close of every bar to the
+# next, less cost_bps basis points per unit of position changed
+def strategy_returns(close: np.ndarray, position: np.ndarray,
+                     cost_bps: float = 0.0):
+    returns = np.zeros(len(close))
+    if len(close) > 1:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns[1:] = position[:-1] * (close[1:] / close[:-1] - 1)
+    returns[~np.isfinite(returns)] = 0.0
+    if cost_bps:
+        returns -= np.abs(np.diff(position, prepend=0.0)) * cost_bps * 1e-4
+    return returns
+
+
+def drawdown(equity: np.ndarray):
+    return equity / np.maximum.accumulate(equity) - 1
+
+
+# Trades as the runs of a non-zero position: entered at the close of the bar
+# the position changed to it, exited at the close of the bar it changed again
+# (or the last bar, while still open)
+def trade_list(dates: np.ndarray, close: np.ndarray, position: np.ndarray):
+    changes = np.flatnonzero(np.diff(position, prepend=0.0))
+    ends = np.append(changes[1:], len(position) - 1)
+    held = position[changes] != 0
+    entry, exit_ = changes[held], ends[held]
+    side = position[entry]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = side * (close[exit_] / close[entry] - 1)
+    return pd.DataFrame({
+        "entry": dates[entry],
+        "exit": dates[exit_],
+        "side": side.astype(np.int8),
+        "entry_price": close[entry],
+        "exit_price": close[exit_],
+        "bars": exit_ - entry,
+        "return": returns,
+        "open": np.append(changes[1:], -1)[held] < 0,
+    })
+
+
+@attr.s(frozen=True, kw_only=True)
+class BacktestResult:
+    dates = attr.ib()
+    position = attr.ib()
+    returns = attr.ib()
+    equity = attr.ib()
+    drawdown = attr.ib()
+    trades = attr.ib()
+    metrics = attr.ib()
+
+
+# Summary of per bar strategy returns and their equity curve, the Sharpe ratio
+# annualized by the bars per year of the dates
+def metrics(dates: np.ndarray, position: np.ndarray, returns: np.ndarray,
+            equity: np.ndarray, drawdowns: np.ndarray):
+    years = ((dates[-1] - dates[0]) / np.timedelta64(1, "D") / 365.25
+             if len(dates) > 1 else 0.0)
+    std = returns.std()
+    changes = np.flatnonzero(np.diff(position, prepend=0.0))
+    trades = int(np.count_nonzero(position[changes]))
+    return {
+        "total_return": float(equity[-1] - 1) if len(equity) else 0.0,
+        "max_drawdown": float(drawdowns.min()) if len(equity) else 0.0,
+        "sharpe": float(returns.mean() / std * np.sqrt(len(returns) / years))
+        if std > 0 and years > 0 else 0.0,
+        "trades": trades,
+        "exposure": float(np.mean(position != 0)) if len(position) else 0.0,
+        "turnover": float(np.abs(np.diff(position, prepend=0.0)).sum()),
+    }
+
+
+# Backtest of a strategy on bar arrays (close and the inputs of the strategy,
+# dates as datetime64), reusing study values computed for its study params
+def run_arrays(strategy: Strategy, dates: np.ndarray, arrays: dict,
+               params: dict = None, cost_bps: float = 0.0,
+               values: dict = None, with_trades: bool = True):
+    if values is None:
+        values = strategy.study_values(arrays, params)
+    position = positions_from_events(strategy.events(values, arrays, params))
+    returns = strategy_returns(arrays["close"], position, cost_bps)
+    equity = np.cumprod(1 + returns)
+    drawdowns = drawdown(equity)
+    return BacktestResult(
+        dates=dates, position=position, returns=returns, equity=equity,
+        drawdown=drawdowns,
+        trades=trade_list(dates, arrays["close"], position)
+        if with_trades else None,
+        metrics=metrics(dates, position, returns, equity, drawdowns))
+
+
+# ------------------------------------------------------------------------------
+# Store reads
+
+# [lo, hi) rows of the last `period` hours before the last bar of the ticker
+def period_rows(ticker: str, period: int,
+                resolution: str = tick_store.BASE_RESOLUTION,
+                store_dir: str = tick_store.STORE_DIR):
+    index = time_index.get_time_index(ticker, store_dir, resolution)
+    if not len(index):
+        return 0, 0
+    return index.period_positions(
+        period, pd.Timestamp(index.last).to_pydatetime())
+
+
+def read_arrays(ticker: str, lo: int, hi: int, strategy: Strategy,
+                resolution: str = tick_store.BASE_RESOLUTION,
+                store_dir: str = tick_store.STORE_DIR):
+    columns = [c for c in tick_store.OHLCV_COLUMNS
+               if c in strategy.inputs or c == "close"]
+    bars = time_index.read_bars(ticker, lo, hi, columns, store_dir,
+                                resolution)
+    return bars.dates, bars.arrays(columns)
+
+
+def run(ticker: str, strategy: str, params: dict = None, period: int = None,
+        resolution: str = tick_store.BASE_RESOLUTION, cost_bps: float = 0.0,
+        store_dir: str = tick_store.STORE_DIR):
+    strategy = STRATEGIES[strategy]
+    lo, hi = period_rows(ticker, period, resolution, store_dir)
+    dates, arrays = read_arrays(ticker, lo, hi, strategy, resolution,
+                                store_dir)
+    return run_arrays(strategy, dates, arrays, params, cost_bps)
+
+
+# ------------------------------------------------------------------------------
+# Parameter sweeps
+
+# Every combination of the given parameter values, as dicts
+def parameter_grid(values: dict):
+    names = list(values)
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*values.values())]
+
+
+# (ticker, resolution, lo, hi, store_dir, strategy, cost_bps, combinations)
+# of combinations sharing their study params -> metrics of every combination
+def _sweep_task(task):
+    ticker, resolution, lo, hi, store_dir, name, cost_bps, combinations = task
+    strategy = STRATEGIES[name]
+    dates, arrays = read_arrays(ticker, lo, hi, strategy, resolution,
+                                store_dir)
+    values = strategy.study_values(arrays, combinations[0])
+    return [{**params, **run_arrays(strategy, dates, arrays, params, cost_bps,
+                                    values, with_trades=False).metrics}
+            for params in combinations]
+
+
+def _tasks(strategy: Strategy, grid, task_size: int):
+    groups = {}
+    for params in grid:
+        study, _ = strategy.split_params(params)
+        groups.setdefault(tuple(sorted(study.items())), []).append(params)
+    for combinations in groups.values():
+        for start in range(0, len(combinations), task_size):
+            yield combinations[start:start + task_size]
+
+
+def _pool(workers: int):
+    # forked workers would inherit the locks of the server's threads, a fork
+    # server starts them from a clean process with the indicators loaded
+    method = ("forkserver" if "forkserver"
+              in multiprocessing.get_all_start_methods() else "spawn")
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        context.set_forkserver_preload(["backtest"])
+    return ProcessPoolExecutor(workers, mp_context=context)
+
+
+# Metrics of every combination of the grid as a frame, best Sharpe first;
+# combinations sharing study params are run by one task of at most task_size
+def sweep(ticker: str, strategy: str, grid, period: int = None,
+          resolution: str = tick_store.BASE_RESOLUTION, cost_bps: float = 0.0,
+          workers: int = None, task_size: int = 64,
+          store_dir: str = tick_store.STORE_DIR):
+    lo, hi = period_rows(ticker, period, resolution, store_dir)
+    tasks = [(ticker, resolution, lo, hi, store_dir, strategy, cost_bps,
+              combinations)
+             for combinations in _tasks(STRATEGIES[strategy], grid,
+                                        task_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        results = [_sweep_task(task) for task in tasks]
+    else:
+        with _pool(workers) as pool:
+            results = list(pool.map(_sweep_task, tasks))
+    frame = pd.DataFrame([row for rows in results for row in rows])
+    if frame.empty:
+        return frame
+    return frame.sort_values("sharpe", ascending=False, ignore_index=True)
+
+
+# ------------------------------------------------------------------------------
+# Runs a strategy, or sweeps it over a grid given as name=v1,v2,...
+def _grid_values(text: str):
+    name, values = text.split("=", 1)
+    return name, [float(v) if "." in v else int(v) for v in values.split(",")]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Backtest a strategy on the tick store")
+    parser.add_argument("--ticker", default="MSFT")
+    parser.add_argument("--strategy", default="cci_reversal",
+                        choices=sorted(STRATEGIES))
+    parser.add_argument("--period", default="MAX",
+                        choices=list(definitions.PERIOD_SELECTION_DICT))
+    parser.add_argument("--resolution", default=tick_store.BASE_RESOLUTION,
+                        choices=[tick_store.BASE_RESOLUTION]
+                        + list(tick_store.ROLLUP_RESOLUTIONS))
+    parser.add_argument("--cost-bps", type=float, default=0.0)
+    parser.add_argument("--grid", nargs="*", default=[], type=_grid_values,
+                        metavar="NAME=V1,V2,...")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--store-dir", default=tick_store.STORE_DIR)
+    args = parser.parse_args()
+
+    period = definitions.period_hours(
+        definitions.PERIOD_SELECTION_DICT[args.period])
+    started = time.perf_counter()
+    if args.grid:
+        grid = parameter_grid(dict(args.grid))
+        results = sweep(args.ticker, args.strategy, grid, period,
+                        args.resolution, args.cost_bps, args.workers,
+                        store_dir=args.store_dir)
+        lo, hi = period_rows(args.ticker, period, args.resolution,
+                             args.store_dir)
+        print("{} combinations on {} bars, {} workers: {:.2f}s".format(
+            len(grid), hi - lo, args.workers, time.perf_counter() - started))
+        print(results.head(args.top).to_string())
+    else:
+        result = run(args.ticker, args.strategy, period=period,
+                     resolution=args.resolution, cost_bps=args.cost_bps,
+                     store_dir=args.store_dir)
+        print("{} bars: {:.3f}s".format(len(result.dates),
+                                        time.perf_counter() - started))
+        for name, value in result.metrics.items():
+            print("{:>14}: {}".format(name, value))
+        print(result.trades.tail(args.top).to_string())
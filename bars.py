@@ -0,0 +1,142 @@
+import argparse
+
+import attr
+import numpy as np
+import pandas as pd
+
+import tick_store
+
+
+# ------------------------------------------------------------------------------
+# Compact bars
+#
+# OHLCV bars in contiguous arrays of the smallest types that hold them: epoch
+# minutes as int64, prices as float32 (or int32 multiples of a tick size) and
+# volumes as uint32, widened to uint64 when a volume outgrows it. 28 bytes per
+# bar against 56 for the csv frame the app used to keep (float64 columns, the
+# date column and a DatetimeIndex over it). time_index.read_bars returns them
+# for the backtest, which keeps its bars in this layout; the charts read the
+# mapped store columns directly. Converts cheaply to datetime64[m] dates (a
+# view of the minutes), float64 arrays for indicators.compute_batch and a date
+# indexed frame. A missing price stays NaN, or MISSING_TICK in int32 ticks.
+@attr.s(frozen=True, kw_only=True, eq=False)
+class Bars:
+    minutes = attr.ib()
+    # price columns, float32 or int32 ticks; None when not read
+    open = attr.ib(default=None)
+    high = attr.ib(default=None)
+    low = attr.ib(default=None)
+    close = attr.ib(default=None)
+    volume = attr.ib(default=None)
+    # price of one tick of int32 prices, None for float32 prices
+    tick_size = attr.ib(default=None)
+
+    def __len__(self):
+        return len(self.minutes)
+
+    @property
+    def columns(self):
+        return [c for c in tick_store.OHLCV_COLUMNS
+                if getattr(self, c) is not None]
+
+    @property
+    def nbytes(self):
+        return self.minutes.nbytes + sum(getattr(self, c).nbytes
+                                         for c in self.columns)
+
+    # Zero-copy datetime64[m] view of the minutes
+    @property
+    def dates(self):
+        return self.minutes.view("datetime64[m]")
+
+    # Column as float32 (prices, NaN where missing) or its stored integer type
+    # (volume)
+    def column(self, name: str):
+        values = getattr(self, name)
+        if name in tick_store.PRICE_COLUMNS and self.tick_size is not None:
+            prices = (values * np.float32(self.tick_size)).astype(np.float32)
+            prices[values == MISSING_TICK] = np.nan
+            return prices
+        return values
+
+    # Bars [lo, hi) as views
+    def slice(self, lo: int, hi: int):
+        return attr.evolve(self, minutes=self.minutes[lo:hi],
+                           **{c: getattr(self, c)[lo:hi]
+                              for c in self.columns})
+
+    # float64 arrays, as indicators.as_arrays returns them
+    def arrays(self, columns=tick_store.OHLCV_COLUMNS):
+        return {c: np.asarray(self.column(c), dtype=np.float64)
+                for c in columns if getattr(self, c, None) is not None}
+
+    # Frame indexed by date, the layout charts.py draws from
+    def frame(self, columns=tick_store.OHLCV_COLUMNS):
+        index = pd.DatetimeIndex((self.minutes * 60).view("datetime64[s]"),
+                                 name=tick_store.DATE_COLUMN)
+        return pd.DataFrame({c: self.column(c) for c in columns
+                             if getattr(self, c, None) is not None},
+                            index=index, copy=False)
+
+    @classmethod
+    def from_columns(cls, dates, columns: dict, tick_size: float = None):
+        minutes = np.ascontiguousarray(
+            np.asarray(dates).astype("datetime64[m]")).view(np.int64)
+        compact = {}
+        for name, values in columns.items():
+            if name in tick_store.PRICE_COLUMNS:
+                compact[name] = _prices(values, tick_size)
+            elif name == "volume":
+                compact[name] = tick_store.as_store_type(
+                    values, tick_store.COLUMN_DTYPES["volume"])
+        return cls(minutes=minutes, tick_size=tick_size, **compact)
+
+    # Bars of a frame indexed by date, or holding a date column
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, tick_size: float = None):
+        dates = (df[tick_store.DATE_COLUMN].to_numpy()
+                 if tick_store.DATE_COLUMN in df else df.index.to_numpy())
+        return cls.from_columns(dates, {c: df[c].to_numpy()
+                                        for c in tick_store.OHLCV_COLUMNS
+                                        if c in df}, tick_size)
+
+
+# int32 tick of a missing price, no price rounds to it
+MISSING_TICK = np.iinfo(np.int32).min
+
+
+def _prices(values, tick_size: float = None):
+    values = np.asarray(values)
+    if tick_size is None:
+        return np.ascontiguousarray(values, dtype=np.float32)
+    ticks = np.round(np.asarray(values, dtype=np.float64) / tick_size)
+    missing = np.isnan(ticks)
+    if (~missing).any() and (np.abs(ticks[~missing]).max()
+                             > np.iinfo(np.int32).max):
+        raise ValueError("prices exceed int32 ticks of {}".format(tick_size))
+    ticks[missing] = MISSING_TICK
+    return ticks.astype(np.int32)
+
+
+# ------------------------------------------------------------------------------
+# Bytes per bar of the csv frame, the compact bars and the store
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Compare the memory of bar representations")
+    parser.add_argument("--csv", default="assets/msft_prices.csv")
+    parser.add_argument("--tick-size", type=float)
+    args = parser.parse_args()
+
+    frame = tick_store.read_alpha_vantage_csv(args.csv)
+    indexed = frame.set_index(tick_store.DATE_COLUMN, drop=False)
+    bars = Bars.from_frame(frame, args.tick_size)
+    store = sum(np.dtype(dtype).itemsize
+                for dtype in tick_store.COLUMN_DTYPES.values()) + 8
+    year = 252 * 16 * 60
+
+    for name, per_bar in (
+            ("csv frame", indexed.memory_usage(index=True).sum() / len(frame)),
+            ("bars", bars.nbytes / len(bars)),
+            ("store", store)):
+        print("{:>10}: {:5.1f} bytes per bar, {:6.1f} MB per ticker-year"
+              .format(name, per_bar, per_bar * year / 1e6))
@@ -0,0 +1,362 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import definitions
+import tick_store
+
+
+# ------------------------------------------------------------------------------
+# Benchmark suite
+#
+# Builds a store of synthetic tickers in a scratch directory and times the
+# layers of a chart request on it: csv ingestion and store loading, period
+# slicing for every PERIOD_SELECTION_DICT entry, every study of the batch
+# kernels and the main chart callback end to end (cold and cached). Results
+# are written as JSON to assets_private/ (not checked in); handing an earlier
+# result file in as baseline flags the timings that got slower than the
+# tolerance allows.
+#
+#   python benchmarks.py --years 10 --tickers 8 \
+#       --output assets_private/before.json
+#   python benchmarks.py --years 10 --tickers 8 \
+#       --baseline assets_private/before.json
+TEMPLATE_CSV = "assets/msft_prices.csv"
+
+# extended hours the Alpha Vantage intraday bars cover
+SESSION_OPEN = np.timedelta64(4 * 60 + 1, "m")
+SESSION_MINUTES = 16 * 60
+
+
+# ------------------------------------------------------------------------------
+# Synthetic OHLCV bars
+#
+# Scales the template csv up to any number of years: the minute returns, the
+# high/low excursions and the volumes are resampled from the template, the
+# bars lie on the template's session minutes of every business day, with as
+# many minutes missing as in the template. The same seed gives the same bars.
+class Template:
+    def __init__(self, csv_path: str = TEMPLATE_CSV):
+        df = tick_store.read_alpha_vantage_csv(csv_path)
+        df = df.sort_values(tick_store.DATE_COLUMN)
+        close = df["close"].to_numpy(dtype=np.float64)
+        open_ = df["open"].to_numpy(dtype=np.float64)
+        body_top = np.maximum(open_, close)
+        body_bottom = np.minimum(open_, close)
+        # without the drift of the template, which would run the prices of
+        # long histories into zero or overflow
+        self.returns = np.diff(np.log(close))
+        self.returns -= self.returns.mean()
+        self.gaps = np.log(open_[1:] / close[:-1])
+        self.upper = np.log(df["high"].to_numpy(dtype=np.float64)
+                            / body_top)[1:]
+        self.lower = np.log(body_bottom
+                            / df["low"].to_numpy(dtype=np.float64))[1:]
+        self.volume = df["volume"].to_numpy(dtype=np.float64)[1:]
+        self.start_price = float(close[-1])
+        days = df[tick_store.DATE_COLUMN].dt.normalize().nunique()
+        self.density = min(1.0, len(df) / (days * SESSION_MINUTES))
+
+
+def synthetic_bars(template: Template, years: float, seed: int,
+                   end: datetime = None):
+    rng = np.random.default_rng(seed)
+    # up to now, the periods of the app end now
+    end = pd.Timestamp(datetime.now() if end is None else end)
+    days = pd.bdate_range(end=end.normalize(),
+                          periods=int(years * 261)).values
+    minutes = (days[:, None] + SESSION_OPEN
+               + np.arange(SESSION_MINUTES).astype("timedelta64[m]"))
+    dates = minutes.ravel()
+    dates = dates[(rng.random(len(dates)) < template.density)
+                  & (dates <= end.to_datetime64())]
+    dates = dates.astype("datetime64[ns]")
+
+    n = len(dates)
+    pick = rng.integers(0, len(template.returns), n)
+    # bootstrapped closes, drifting around the template's last price
+    log_close = (np.log(template.start_price * rng.uniform(0.5, 2.0))
+                 + np.cumsum(template.returns[pick]))
+    close = np.exp(log_close)
+    open_ = np.exp(np.concatenate(([log_close[0]], log_close[:-1]))
+                   + template.gaps[pick])
+    high = np.maximum(open_, close) * np.exp(template.upper[pick])
+    low = np.minimum(open_, close) / np.exp(template.lower[pick])
+    volume = template.volume[rng.integers(0, len(template.volume), n)]
+    return dates, {"open": open_, "high": high, "low": low, "close": close,
+                   "volume": volume.astype(np.int64)}
+
+
+def write_csv(path: str, dates: np.ndarray, columns: dict):
+    df = pd.DataFrame({key: columns[column]
+                       for key, column in tick_store.CSV_COLUMNS.items()},
+                      index=pd.DatetimeIndex(dates, name="date"))
+    # newest first, like the Alpha Vantage downloads
+    df.iloc[::-1].to_csv(path, date_format="%Y-%m-%d %H:%M:%S",
+                         float_format="%.4f")
+
+
+# ------------------------------------------------------------------------------
+# Timing
+def summary(runs):
+    return {"median": statistics.median(runs), "min": min(runs),
+            "repeat": len(runs)}
+
+
+def timed(fn, repeat: int, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return summary(runs)
+
+
+def _cold_caches():
+    from figure_pipeline import clear_caches
+    clear_caches()
+
+
+def _callback_body(period: str, chart_type: str, study: str, ticker: str):
+    periods = ["24H", "7D", "1M", "3M", "6M", "1J", "5J", "MAX"]
+    return {"output": "..msft_chart-patch.data...msft_chart-live.data..",
+            "outputs": [{"id": "msft_chart-patch", "property": "data"},
+                        {"id": "msft_chart-live", "property": "data"}],
+            "inputs": [{"id": p, "property": "n_clicks", "value": None}
+                       for p in periods]
+            + [{"id": "search-input", "property": "value", "value": ticker},
+               {"id": "chart-type-selection", "property": "value",
+                "value": chart_type},
+               {"id": "study-selection", "property": "value",
+                "value": [study] if study else []},
+               # no parameter dropdowns, the studies use their defaults
+               [],
+               {"id": "msft_chart", "property": "relayoutData",
+                "value": None}],
+            "changedPropIds": [period + ".n_clicks"],
+            "state": [[],
+                      {"id": "msft_chart-live", "property": "data",
+                       "value": None},
+                      {"id": "msft_chart-cursor", "property": "data",
+                       "value": None}]}
+
+
+def run(args):
+    results = {}
+    template = Template(os.path.abspath(args.template))
+    store_dir = tick_store.STORE_DIR
+    tickers = ["SYN{}".format(i) for i in range(args.tickers)]
+
+    # --- csv ingestion and store loading ---
+    dates, columns = synthetic_bars(template, args.csv_years, args.seed)
+    write_csv("bench_prices.csv", dates, columns)
+    results["ingest.csv.{}y".format(args.csv_years)] = timed(
+        lambda: tick_store.ingest_csv("bench_prices.csv", "CSV", store_dir),
+        args.repeat)
+
+    rows = 0
+    writes = []
+    for i, ticker in enumerate(tickers):
+        dates, columns = synthetic_bars(template, args.years, args.seed + i)
+        rows += len(dates)
+        started = time.perf_counter()
+        tick_store.write_columns(ticker, dates, columns, store_dir)
+        writes.append(time.perf_counter() - started)
+    results["store.write.{}y".format(args.years)] = summary(writes)
+    print("{} tickers, {} bars".format(len(tickers), rows), file=sys.stderr)
+
+    import time_index
+    from indicators import as_arrays, compute_batch
+    from trace_registry import default_registry
+    ticker = tickers[0]
+
+    def load_close():
+        index = time_index.get_time_index(ticker)
+        close = time_index.read_rows(ticker, 0, len(index), ("close",))
+        float(np.asarray(close["close"]).sum())
+    results["store.load_full_close"] = timed(load_close, args.repeat,
+                                             _cold_caches)
+
+    # --- period slicing ---
+    now = pd.Timestamp(time_index.get_time_index(ticker).last).to_pydatetime()
+    for name, period in definitions.PERIOD_SELECTION_DICT.items():
+        hours = definitions.period_hours(period)
+        start = None if hours is None else now - pd.Timedelta(hours=hours)
+        resolution = time_index.select_resolution(ticker, start, now, 1600)
+
+        def slice_period(resolution=resolution, hours=hours):
+            as_arrays(time_index.read_period(ticker, hours, now=now,
+                                             resolution=resolution))
+        results["slice.{}.{}".format(name, resolution)] = timed(
+            slice_period, args.repeat)
+        results["slice.{}.1m".format(name)] = timed(
+            lambda hours=hours: as_arrays(time_index.read_period(
+                ticker, hours, now=now)), args.repeat)
+
+    # --- studies over a year of base bars ---
+    year = as_arrays(time_index.read_period(
+        ticker, definitions.PERIOD_SELECTION_DICT["1J"], now=now))
+    defaults = {d.study: d.params for d in map(default_registry.get,
+                                               default_registry.names())
+                if d.study is not None}
+    for study, params in defaults.items():
+        results["study.{}".format(study)] = timed(
+            lambda study=study, params=params: compute_batch(
+                year, [(study, params)]), args.repeat)
+    results["study.all"] = timed(
+        lambda: compute_batch(year, list(defaults.items())),
+        args.repeat)
+
+    # --- backtests over the whole history ---
+    import backtest
+    for name in backtest.STRATEGIES:
+        results["backtest.{}".format(name)] = timed(
+            lambda name=name: backtest.run(ticker, name, store_dir=store_dir),
+            args.repeat)
+    grid = backtest.parameter_grid({"n_days": [14, 20, 50],
+                                    "level": [100.0, 150.0, 200.0]})
+    results["backtest.sweep.{}".format(len(grid))] = timed(
+        lambda: backtest.sweep(ticker, "cci_reversal", grid, workers=1,
+                               store_dir=store_dir), args.repeat)
+
+    # --- main chart callback end to end ---
+    import dash_app
+    client = dash_app.app.server.test_client()
+
+    def callback(period, chart_type="candlestick_trace", study=""):
+        response = client.post("/_dash-update-component",
+                               json=_callback_body(period, chart_type, study,
+                                                   ticker))
+        assert response.status_code == 200, response.status_code
+
+    for period in definitions.PERIOD_SELECTION_DICT:
+        results["callback.{}.cold".format(period)] = timed(
+            lambda period=period: callback(period), args.repeat,
+            _cold_caches)
+        results["callback.{}.cached".format(period)] = timed(
+            lambda period=period: callback(period), args.repeat)
+    for study in definitions.STUDY_TRACE_SELECTION_DICT.values():
+        if study:
+            results["callback.1M.{}".format(study)] = timed(
+                lambda study=study: callback("1M", "line_trace", study),
+                args.repeat, _cold_caches)
+    return results
+
+
+# ------------------------------------------------------------------------------
+# Result files and regressions
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "date": datetime.now().isoformat(timespec="seconds")}
+
+
+# Timings slower than baseline * (1 + tolerance), ignoring differences below
+# min_delta seconds
+def regressions(results: dict, baseline: dict, tolerance: float,
+                min_delta: float):
+    flagged = {}
+    for name, timing in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if timing["median"] > before["median"] * (1 + tolerance) and \
+                timing["median"] - before["median"] > min_delta:
+            flagged[name] = {"before": before["median"],
+                             "after": timing["median"],
+                             "ratio": timing["median"] / before["median"]}
+    return flagged
+
+
+def _print_results(results: dict, baseline: dict = None):
+    for name, timing in results.items():
+        line = "{:<48} {:>10.2f} ms".format(name, timing["median"] * 1e3)
+        if baseline and name in baseline:
+            line += "  x{:.2f}".format(timing["median"]
+                                       / baseline[name]["median"])
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--years", type=float, default=10,
+                        help="years of minute bars per synthetic ticker")
+    parser.add_argument("--tickers", type=int, default=4)
+    parser.add_argument("--csv-years", type=float, default=1,
+                        help="years of minute bars in the ingested csv")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--template", default=TEMPLATE_CSV)
+    parser.add_argument("--workdir",
+                        help="scratch directory of the store, kept when given")
+    parser.add_argument("--output",
+                        default="assets_private/benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier result file to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=0.001,
+                        help="seconds below which differences are noise")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = args.baseline and os.path.abspath(args.baseline)
+    args.template = os.path.abspath(args.template)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="stock-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    cwd = os.getcwd()
+    # the app reads its store relative to the working directory
+    os.chdir(workdir)
+    try:
+        results = run(args)
+    finally:
+        os.chdir(cwd)
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"environment": environment(),
+              "config": {k: v for k, v in vars(args).items()
+                         if k in ("years", "tickers", "csv_years", "repeat",
+                                  "seed")},
+              "results": results}
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, "r") as f:
+            baseline = json.load(f)["results"]
+        report["regressions"] = regressions(results, baseline, args.tolerance,
+                                            args.min_delta)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    _print_results(results, baseline)
+    if report.get("regressions"):
+        print("\nregressions:")
+        for name, r in report["regressions"].items():
+            print("  {:<46} {:.2f} -> {:.2f} ms (x{:.2f})".format(
+                name, r["before"] * 1e3, r["after"] * 1e3, r["ratio"]))
+        sys.exit(1)
@@ -1,6 +1,7 @@
-import pandas as pd
 import plotly.graph_objects as go
 
+from indicators import as_arrays, compute_batch
+
 
 # remove later
 def candlestick_chart(df):
@@ -19,49 +20,88 @@ def candlestick_chart(df):
 
 
 # STUDIES TRACES --------------------------------------------------------------
+# Every study can be handed the results of indicators.compute_batch as
+# `values`, so one render computes all selected studies in a single pass with
+# shared intermediates. Without it the study computes its own values.
+# Studies decimated by downsampling.decimate_values plot against their own x.
+def _study_values(df, study, params, values):
+    if values is None:
+        values = compute_batch(as_arrays(df), [(study, params)])
+    return values
+
+
+# x values of a study, downsampled studies carry their own
+def _study_x(df, values, study):
+    return values.get(study + ".x", df.index)
+
+
 # Moving average
-def moving_average_trace(df, fig):
-    df2 = df.rolling(window=5).mean()
+def moving_average_trace(df, fig, window=5, values=None):
+    values = _study_values(df, "moving_average", {"window": window}, values)
+    x = _study_x(df, values, "moving_average")
     trace = go.Scatter(
-        x=df2.index, y=df2["close"], mode="lines", showlegend=True, name="MA",
-        line=dict(width=1),
+        x=x, y=values["moving_average.ma"], mode="lines",
+        showlegend=True, name="MA", line=dict(width=1),
     )
     fig.append_trace(trace, 1, 1)  # plot in first row
     return fig
 
 
 # Exponential moving average
-def e_moving_average_trace(df, fig):
-    df2 = df.rolling(window=20).mean()
+def e_moving_average_trace(df, fig, span=20, values=None):
+    values = _study_values(df, "e_moving_average", {"span": span}, values)
+    x = _study_x(df, values, "e_moving_average")
+    trace = go.Scatter(
+        x=x, y=values["e_moving_average.ema"], mode="lines",
+        showlegend=True, name="EMA", line=dict(width=1),
+    )
+    fig.append_trace(trace, 1, 1)  # plot in first row
+    return fig
+
+
+# Weighted moving average
+def w_moving_average_trace(df, fig, window=20, values=None):
+    values = _study_values(df, "w_moving_average", {"window": window}, values)
+    x = _study_x(df, values, "w_moving_average")
     trace = go.Scatter(
-        x=df2.index, y=df2["close"], mode="lines", showlegend=True, name="EMA",
-        line=dict(width=1),
+        x=x, y=values["w_moving_average.wma"], mode="lines",
+        showlegend=True, name="WMA", line=dict(width=1),
+    )
+    fig.append_trace(trace, 1, 1)  # plot in first row
+    return fig
+
+
+# Double exponential moving average
+def de_moving_average_trace(df, fig, span=20, values=None):
+    values = _study_values(df, "de_moving_average", {"span": span}, values)
+    x = _study_x(df, values, "de_moving_average")
+    trace = go.Scatter(
+        x=x, y=values["de_moving_average.dema"], mode="lines",
+        showlegend=True, name="DEMA", line=dict(width=1),
     )
     fig.append_trace(trace, 1, 1)  # plot in first row
     return fig
 
 
 # Bollinger Bands
-def bollinger_trace(df, fig, window_size=10, num_of_std=5):
-    price = df["close"]
-    rolling_mean = price.rolling(window=window_size).mean()
-    rolling_std = price.rolling(window=window_size).std()
-    upper_band = rolling_mean + (rolling_std * num_of_std)
-    lower_band = rolling_mean - (rolling_std * num_of_std)
+def bollinger_trace(df, fig, window_size=10, num_of_std=5, values=None):
+    values = _study_values(df, "bollinger", {"window_size": window_size,
+                                             "num_of_std": num_of_std}, values)
+    x = _study_x(df, values, "bollinger")
 
     trace = go.Scatter(
-        x=df.index, y=upper_band, mode="lines", showlegend=True,
-        name="BB_upper", line=dict(width=0.6),
+        x=x, y=values["bollinger.upper"], mode="lines",
+        showlegend=True, name="BB_upper", line=dict(width=0.6),
     )
 
     trace2 = go.Scatter(
-        x=df.index, y=rolling_mean, mode="lines", showlegend=True,
-        name="BB_mean", line=dict(width=0.6),
+        x=x, y=values["bollinger.mean"], mode="lines",
+        showlegend=True, name="BB_mean", line=dict(width=0.6),
     )
 
     trace3 = go.Scatter(
-        x=df.index, y=lower_band, mode="lines", showlegend=True,
-        name="BB_lower", line=dict(width=0.6),
+        x=x, y=values["bollinger.lower"], mode="lines",
+        showlegend=True, name="BB_lower", line=dict(width=0.6),
     )
 
     fig.append_trace(trace, 1, 1)  # plot in first row
@@ -71,13 +111,12 @@ def bollinger_trace(df, fig, window_size=10, num_of_std=5):
 
 
 # Accumulation Distribution
-def accumulation_trace(df):
-    df["volume"] = ((df["close"] - df["low"]) - (df["high"] - df["close"])) / (
-        df["high"] - df["low"]
-    )
+def accumulation_trace(df, values=None):
+    values = _study_values(df, "accumulation", {}, values)
+    x = _study_x(df, values, "accumulation")
     trace = go.Scatter(
-        x=df.index, y=df["volume"], mode="lines", showlegend=True,
-        name="Accumulation", line=dict(width=0.6),
+        x=x, y=values["accumulation.accumulation"], mode="lines",
+        showlegend=True, name="Accumulation", line=dict(width=0.6),
     )
     return trace
 
@@ -89,15 +128,11 @@ def accumulation_trace(df):
 # refrain from taking a trade, or add to an existing position. In this way, the indicator can be used to provide trade
 # signals when it acts in a certain way.
 # source: https://www.investopedia.com/terms/c/commoditychannelindex.asp
-def cci_trace(df, n_days=20):
-    tp = (df["high"] + df["low"] + df["close"]) / 3
-    cci = pd.Series(
-        (tp - tp.rolling(window=n_days, center=False).mean())
-        / (0.015 * tp.rolling(window=n_days, center=False).std()),
-        name="cci",
-    )
-    trace = go.Scatter(x=df.index, y=cci, mode="lines", showlegend=True,
-                       name="CCI", line=dict(width=0.6),)
+def cci_trace(df, n_days=20, values=None):
+    values = _study_values(df, "cci", {"n_days": n_days}, values)
+    x = _study_x(df, values, "cci")
+    trace = go.Scatter(x=x, y=values["cci.cci"], mode="lines",
+                       showlegend=True, name="CCI", line=dict(width=0.6),)
     return trace
 
 
@@ -107,62 +142,42 @@ def cci_trace(df, n_days=20):
 # with the indicator moving upwards into positive territory if price changes are to the upside, and moving into
 # negative territory if price changes are to the downside.
 # source: https://www.investopedia.com/terms/p/pricerateofchange.asp
-def roc_trace(df, n_days=5):
-    n = df["close"].diff(n_days)
-    d = df["close"].shift(n_days)
-    roc = pd.Series(n / d, name="roc")
-    trace = go.Scatter(x=df.index, y=roc, mode="lines", showlegend=True,
-                       name="ROC", line=dict(width=0.6),)
+def roc_trace(df, n_days=5, values=None):
+    values = _study_values(df, "roc", {"n_days": n_days}, values)
+    x = _study_x(df, values, "roc")
+    trace = go.Scatter(x=x, y=values["roc.roc"], mode="lines",
+                       showlegend=True, name="ROC", line=dict(width=0.6),)
     return trace
 
 
 # Stochastic oscillator %K
-def stoc_trace(df):
-    so_k = pd.Series((df["close"] - df["low"]) / (df["high"] - df["low"]),
-                     name="SO%k")
-    trace = go.Scatter(x=df.index, y=so_k, mode="lines", showlegend=True,
-                       name="SO%k", line=dict(width=0.6),)
+def stoc_trace(df, values=None):
+    values = _study_values(df, "stoc", {}, values)
+    x = _study_x(df, values, "stoc")
+    trace = go.Scatter(x=x, y=values["stoc.so_k"], mode="lines",
+                       showlegend=True, name="SO%k", line=dict(width=0.6),)
     return trace
 
 
 # Momentum
-def mom_trace(df, n=5):
-    m = pd.Series(df["close"].diff(n), name="Momentum_" + str(n))
-    trace = go.Scatter(x=df.index, y=m, mode="lines", showlegend=True,
-                       name="MOM", line=dict(width=0.6),)
+def mom_trace(df, n=5, values=None):
+    values = _study_values(df, "mom", {"n": n}, values)
+    x = _study_x(df, values, "mom")
+    trace = go.Scatter(x=x, y=values["mom.mom"], mode="lines",
+                       showlegend=True, name="MOM", line=dict(width=0.6),)
     return trace
 
 
 # Pivot points
-def pp_trace(df, fig):
-    pp = pd.Series((df["high"] + df["low"] + df["close"]) / 3)
-    r1 = pd.Series(2 * pp - df["low"])
-    s1 = pd.Series(2 * pp - df["high"])
-    r2 = pd.Series(pp + df["high"] - df["low"])
-    s2 = pd.Series(pp - df["high"] + df["low"])
-    r3 = pd.Series(df["high"] + 2 * (pp - df["low"]))
-    s3 = pd.Series(df["low"] - 2 * (df["high"] - pp))
-    trace = go.Scatter(x=df.index, y=pp, mode="lines", showlegend=True,
-                       name="PP", line=dict(width=0.6),)
-    trace1 = go.Scatter(x=df.index, y=r1, mode="lines", showlegend=True,
-                        name="R1", line=dict(width=0.6),)
-    trace2 = go.Scatter(x=df.index, y=s1, mode="lines", showlegend=True,
-                        name="S1", line=dict(width=0.6),)
-    trace3 = go.Scatter(x=df.index, y=r2, mode="lines", showlegend=True,
-                        name="R2", line=dict(width=0.6),)
-    trace4 = go.Scatter(x=df.index, y=s2, mode="lines", showlegend=True,
-                        name="S2", line=dict(width=0.6),)
-    trace5 = go.Scatter(x=df.index, y=r3, mode="lines", showlegend=True,
-                        name="R3", line=dict(width=0.6),)
-    trace6 = go.Scatter(x=df.index, y=s3, mode="lines", showlegend=True,
-                        name="S3", line=dict(width=0.6),)
-    fig.append_trace(trace, 1, 1)
-    fig.append_trace(trace1, 1, 1)
-    fig.append_trace(trace2, 1, 1)
-    fig.append_trace(trace3, 1, 1)
-    fig.append_trace(trace4, 1, 1)
-    fig.append_trace(trace5, 1, 1)
-    fig.append_trace(trace6, 1, 1)
+def pp_trace(df, fig, values=None):
+    values = _study_values(df, "pp", {}, values)
+    x = _study_x(df, values, "pp")
+    for output, name in (("pp", "PP"), ("r1", "R1"), ("s1", "S1"),
+                         ("r2", "R2"), ("s2", "S2"), ("r3", "R3"),
+                         ("s3", "S3")):
+        trace = go.Scatter(x=x, y=values["pp." + output], mode="lines",
+                           showlegend=True, name=name, line=dict(width=0.6),)
+        fig.append_trace(trace, 1, 1)
     return fig
 
 
@@ -213,8 +228,7 @@ def colored_bar_trace(df):
 
 def candlestick_trace(df):
     return go.Candlestick(
-        # x=df.index,
-        x=df["date"],
+        x=df.index,
         open=df["open"],
         high=df["high"],
         low=df["low"],
@@ -1,170 +1,63 @@
-import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
+from datetime import datetime
+import glob
+import os
+import time
 
+import flask
+import numpy as np
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ALL, ClientsideFunction, Input, Output, State
 
 import dash_actions
 import definitions
-from charts import (line_trace, area_trace, candlestick_trace,
-                    colored_bar_trace, accumulation_trace, cci_trace,
-                    roc_trace, stoc_trace, mom_trace, moving_average_trace,
-                    e_moving_average_trace, bollinger_trace, pp_trace)
+import ingestion
+import instrumentation
+import live_updates
+import serialization
+import sparklines
+import tick_store
+import zoom_detail
+from ticker_manager import tickers
+from favorites_board import favorites_renderer
+from figure_pipeline import (get_main_fig, get_zoom_fig, cache_stats,
+                             figure_patch, MAIN_CHART_MAX_POINTS,
+                             FAVORITE_CHART_MAX_POINTS)
+from trace_registry import default_registry
 
 
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport",
-                                      "content": "width=device-width"}])
+                                      "content": "width=device-width"}],
+                # gzips callback responses
+                compress=True)
+serialization.instrument(app.server)
 
 # ------------------------------------------------------------------------------
-# Import and clean data (importing csv into pandas)
-df = pd.read_csv("assets/msft_prices.csv")
-# df.set_index("date", inplace=True)
-df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d %H:%M:%S")
-df.rename(columns={"1. open": "open",
-                   "2. high": "high",
-                   "3. low": "low",
-                   "4. close": "close",
-                   "5. volume": "volume"},
-          inplace=True)
+# Import data (ingesting every <ticker>_prices.csv into the columnar tick store
+# once), the ticker manager opens a ticker on its first request only
+for csv_path in glob.glob("assets/*_prices.csv"):
+    tick_store.ensure_ingested(
+        csv_path, os.path.basename(csv_path)[:-len("_prices.csv")].upper())
 
-ticker_selected = "MSFT"
-tickers = ["MSFT"]
+# api key of the background ingestion, the app runs on the stored data only
+# when it is missing
+APPCONFIG_PATH = "assets_private/appconfig.json"
 
+ticker_selected = "MSFT"
 
-# ------------------------------------------------------------------------------
-# Returns main graph figure
-def get_main_fig(ticker: str, period: int, chart_type: str, studies: tuple):
-    if ticker not in tickers:
-        fig = go.Figure()
-        return fig
-
-    now = datetime.now()
-    start_dt = now - timedelta(hours=period)
-    end_dt = now
-
-    dff = df.copy()
-    dff = dff[(dff.date >= start_dt) & (dff.date <= end_dt)]
-
-    if dff[dff.date < start_dt].empty:
-        true_start_data = [{"date": start_dt, "open": None, "high": None, "low": None, "close": None, "volume": None}]
-        dff_new = pd.DataFrame(true_start_data)
-        dff_new["date"] = pd.to_datetime(dff_new["date"], format="%Y-%m-%d %H:%M:%S")
-        dff = dff_new.append(dff)
-
-    dff.set_index("date", inplace=True)
-
-    # first row traces
-    subplot_traces = [
-        "accumulation_trace",
-        "cci_trace",
-        "roc_trace",
-        "stoc_trace",
-        "mom_trace",
-    ]
-    selected_subplots_studies = []
-    selected_first_row_studies = []
-    row = 1  # number of subplots
-
-    if studies:
-        for study in studies:
-            if study == "":
-                break
-            if study in subplot_traces:
-                # increment number of rows only if the study needs a subplot
-                row += 1
-                selected_subplots_studies.append(study)
-            else:
-                selected_first_row_studies.append(study)
-
-    fig = make_subplots(
-        rows=row,
-        shared_xaxes=True,
-        shared_yaxes=True,
-        cols=1,
-        print_grid=False,
-        vertical_spacing=0.12,
-    )
+# the favorites board renders from rollups, warms up the tickers it shows
+tickers.prefetch(tick_store.list_tickers()[:len(dash_actions.FAVORITE_CHARTS)],
+                 resolutions=tuple(tick_store.ROLLUP_RESOLUTIONS))
 
-    # Add main trace (style) to figure, eval of chart type
-    fig.append_trace(eval(chart_type)(dff), row=1, col=1)  # chart_type
-
-    # Add trace(s) on fig's first row
-    for study in selected_first_row_studies:
-        fig = eval(study)(dff, fig)
-
-    row = 1
-    # Plot trace on new row
-    for study in selected_subplots_studies:
-        row += 1
-        fig.append_trace(eval(study)(dff), row=row, col=1)
-
-    # rebinds all traces to the x-axis
-    # fig.update_traces(xaxis="x1")
-
-    # Ensures zoom on graph is the same on update
-    fig["layout"]["uirevision"] = "The User is always right"
-
-    fig["layout"]["margin"] = {"t": 50, "l": 50, "b": 50, "r": 25}
-    fig["layout"]["autosize"] = True
-    fig["layout"]["height"] = 600
-
-    # --- legend definitions ---
-    # defines if showlegend of single charts is True (default) or False
-    fig["layout"]["showlegend"] = True
-    # somehow cannot be defined here
-    # fig["layout"]["legend_orientation"] = "h"
-    # position of legend
-    fig["layout"]["legend"] = dict(y=1, x=0)
-    # legend and probably title font definitions
-    fig["layout"]["font"] = dict(color="#dedddc")
-
-    # --- x-axis definitions ---
-    # disables sub-graph time range slider
-    fig["layout"]["xaxis"]["rangeslider"]["visible"] = False
-    # numbers not showing????????
-    if period <= 24:
-        fig["layout"]["xaxis"]["tickformat"] = "%H:%M"
-    else:
-        fig["layout"]["xaxis"]["tickformat"] = "%Y-%m-%d %H:%M"
-
-    # --- y-axis definitions ---
-    # fig["layout"]["xaxis"]["showline"] = True
-    # fig["layout"]["yaxis"]["showgrid"] = True
-    fig["layout"]["yaxis"]["gridcolor"] = "#3E3F40"
-    fig["layout"]["yaxis"]["gridwidth"] = 1
-
-    # --- crosshairs definitions ---
-    # solid line instead of dashed default or others
-    fig["layout"]["xaxis"]["spikedash"] = "solid"
-    # snap to cursor or data point
-    fig["layout"]["xaxis"]["spikesnap"] = "cursor"
-    # solid line instead of dashed default or others
-    fig["layout"]["yaxis"]["spikedash"] = "solid"
-    # snap to cursor or data point
-    fig["layout"]["yaxis"]["spikesnap"] = "cursor"
-
-    fig["layout"].update(paper_bgcolor="#21252C",
-                         plot_bgcolor="#21252C",
-                         # orient legend content vertically or horizontally
-                         legend_orientation="v",
-                         # legend=dict(y=1, x=0),
-                         # font=dict(color="#dedddc"),
-                         # grab and move chart instead of time selection
-                         # dragmode='pan',
-                         # enables cursor crosshairs
-                         hovermode='x unified',
-
-                         # width=200,
-                         # height=200,
-                         )
-    return fig
+# how often the charts are extended with newly ingested bars
+LIVE_INTERVAL_MS = 5 * 1000
 
 
+# ------------------------------------------------------------------------------
+# Returns an empty figure showing a message
 def get_empty_fig(msg):
     fig = make_subplots()
 
@@ -191,109 +84,6 @@ def get_empty_fig(msg):
     return fig
 
 
-# Returns favorite graph figure
-def get_favorite_fig(ticker: str, period: int, chart_type: str, studies: tuple):
-    if ticker not in tickers:
-        fig = go.Figure()
-        return fig
-
-    now = datetime.now()
-    start_dt = now - timedelta(hours=period)
-    end_dt = now
-
-    dff = df.copy()
-    dff = dff[(dff.date >= start_dt) & (dff.date <= end_dt)]
-
-    if dff[dff.date < start_dt].empty:
-        true_start_data = [{"date": start_dt, "open": None, "high": None,
-                            "low": None, "close": None, "volume": None}]
-        dff_new = pd.DataFrame(true_start_data)
-        dff_new["date"] = pd.to_datetime(dff_new["date"],
-                                         format="%Y-%m-%d %H:%M:%S")
-        dff = dff_new.append(dff)
-
-    dff.set_index("date", inplace=True)
-
-    # first row traces
-    subplot_traces = [
-        "accumulation_trace",
-        "cci_trace",
-        "roc_trace",
-        "stoc_trace",
-        "mom_trace",
-    ]
-    selected_subplots_studies = []
-    selected_first_row_studies = []
-    row = 1  # number of subplots
-
-    if studies:
-        for study in studies:
-            if study == "":
-                break
-            if study in subplot_traces:
-                # increment number of rows only if the study needs a subplot
-                row += 1
-                selected_subplots_studies.append(study)
-            else:
-                selected_first_row_studies.append(study)
-
-    fig = make_subplots(
-        rows=row,
-        shared_xaxes=True,
-        shared_yaxes=True,
-        cols=1,
-        print_grid=False,
-        vertical_spacing=0.12,
-    )
-
-    # Add main trace (style) to figure, eval of chart type
-    fig.append_trace(eval(chart_type)(dff), row=1, col=1)  # chart_type
-
-    # Add trace(s) on fig's first row
-    for study in selected_first_row_studies:
-        fig = eval(study)(dff, fig)
-
-    row = 1
-    # Plot trace on new row
-    for study in selected_subplots_studies:
-        row += 1
-        fig.append_trace(eval(study)(dff), row=row, col=1)
-
-    # rebinds all traces to the x-axis
-    # fig.update_traces(xaxis="x1")
-
-    # Ensures zoom on graph is the same on update
-    fig["layout"]["uirevision"] = "The User is always right"
-
-    fig["layout"]["margin"] = {"t": 50, "l": 50, "b": 50, "r": 25}
-    fig["layout"]["autosize"] = True
-    # fig["layout"]["height"] = 600
-
-    # --- legend definitions ---
-    # defines if showlegend of single charts is True (default) or False
-    fig["layout"]["showlegend"] = False
-
-    # --- x-axis definitions ---
-    # disables sub-graph time range slider
-    fig["layout"]["xaxis"]["rangeslider"]["visible"] = False
-
-    fig["layout"]["yaxis"]["visible"] = False
-    fig["layout"]["xaxis"]["visible"] = False
-
-    fig["layout"].update(paper_bgcolor="#21252C",
-                         plot_bgcolor="#21252C",
-                         # width=200,
-                         # height=200,
-                         xaxis=dict(
-                             autorange=True
-                         ),
-                         yaxis=dict(
-                             autorange=True
-                         ),
-                         )
-    return fig
-
-
 # ------------------------------------------------------------------------------
 # Sub-divs loaded into app layout
 def charts_div(ticker):
@@ -312,6 +102,15 @@ def charts_div(ticker):
     )
 
 
+# Stores of a live graph: what its figure was rendered from and the store row
+# it was extended up to
+def live_stores(graph_id):
+    return [dcc.Store(id=graph_id + "-live"),
+            dcc.Store(id=graph_id + "-cursor"),
+            # the figure rendered again by live_updates.refresh
+            dcc.Store(id=graph_id + "-refresh")]
+
+
 # ------------------------------------------------------------------------------
 # App layout
 
@@ -323,6 +122,9 @@ def ticker_line(children):
 div_ticker_line = ticker_line([
     # # Interval component for live clock
     # dcc.Interval(id="interval", interval=1 * 100, n_intervals=0),
+    # clock of the live chart updates
+    dcc.Interval(id="live-interval", interval=LIVE_INTERVAL_MS,
+                 n_intervals=0),
     html.Div(
         id="live-clock",
         className="live-clock",
@@ -397,10 +199,14 @@ div_main_chart_configuration = main_chart_configuration([
                  dcc.Dropdown(id="study-selection",
                               className="dropdown",
                               options=definitions.STUDY_TRACE_SELECTION_OPTIONS,
-                              multi=False,
-                              clearable=False,
-                              value=definitions.STUDY_TRACE_SELECTION_OPTIONS[0]["value"]),
-             ])
+                              multi=True,
+                              clearable=True,
+                              placeholder="Studies",
+                              value=[]),
+             ]),
+    # parameter dropdowns of the selected studies
+    html.Div(id="study-parameters", className="study-parameters",
+             children=[]),
 ])
 
 div_main_chart_period = main_chart_period([
@@ -439,6 +245,9 @@ div_main_chart_data = chart_data([
                             children=[]
                         ),
                     ),
+                    *live_stores("msft" + "_chart"),
+                    # patches of the figure, see figure_pipeline.figure_patch
+                    dcc.Store(id="msft" + "_chart-patch"),
                 ]
             )
         ],
@@ -464,6 +273,8 @@ def generate_favorite_chart(chart):
                             children=[]
                         ),
                     ),
+                    *live_stores(chart + "_chart"),
+                    dcc.Store(id=chart + "_chart-patch"),
                     # favorite-chart-overlay covers all access to chart and carries buttons and information
                     html.Div(
                         className="favorite-chart-overlay",
@@ -472,12 +283,14 @@ def generate_favorite_chart(chart):
                                 className="favorite-infos",
                                 children=[
                                     html.P(
+                                        id=chart + "_ticker",
                                         className="favorite-ticker",
                                         children="MSFT"
                                     ),
                                     html.P(
+                                        id=chart + "_day_trend",
                                         className="favorite-day-trend",
-                                        children="+2.3%"
+                                        children=""
                                     )
                                 ]
                             ),
@@ -552,19 +365,99 @@ div_analysis_board = analysis_board([
 
 
 # --- overall layout aggregation ---
+# --- debug panel, only with instrumentation enabled ---
+def debug_panel(children):
+    return html.Div(children, className="debug-panel")
+
+
+div_debug_panel = debug_panel([
+    dcc.Interval(id="debug-interval", interval=2 * 1000, n_intervals=0),
+    html.Table(id="debug-timings", className="debug-timings"),
+])
+
+
 app.layout = html.Div(
     className="app",
     children=[
         div_ticker_line,
         div_analysis_board,
-    ]
+    ] + ([div_debug_panel] if instrumentation.enabled() else [])
 )
 
 
+# ------------------------------------------------------------------------------
+# study parameters
+STUDY_PARAMETER = "study-parameter"
+
+
+def study_parameter_default(study, parameter):
+    return default_registry.get(study).params[parameter]
+
+
+# Selectable values of a parameter, its default among them
+def study_parameter_values(study, parameter):
+    values = definitions.STUDY_PARAMETER_DICT[study][parameter]
+    default = study_parameter_default(study, parameter)
+    return sorted(set(values) | {default})
+
+
+# Parameters of the selected studies, their defaults overridden by the values
+# of the parameter dropdowns which are among the choices of the parameter
+def selected_study_params(studies, parameter_ids, parameter_values):
+    study_params = {
+        study: {parameter: study_parameter_default(study, parameter)
+                for parameter in definitions.STUDY_PARAMETER_DICT[study]}
+        for study in studies if study in definitions.STUDY_PARAMETER_DICT}
+    for parameter_id, value in zip(parameter_ids, parameter_values):
+        study, parameter = parameter_id["study"], parameter_id["parameter"]
+        params = study_params.get(study)
+        if params is not None and parameter in params \
+                and value in study_parameter_values(study, parameter):
+            params[parameter] = value
+    return study_params
+
+
+# parameter dropdowns of the selected studies, keeping the values chosen
+@app.callback(
+    Output(component_id="study-parameters", component_property="children"),
+    Input(component_id="study-selection", component_property="value"),
+    [State(component_id={"type": STUDY_PARAMETER, "study": ALL,
+                         "parameter": ALL}, component_property="id"),
+     State(component_id={"type": STUDY_PARAMETER, "study": ALL,
+                         "parameter": ALL}, component_property="value")]
+)
+def generate_study_parameters_callback(study_selection, parameter_ids,
+                                       parameter_values):
+    study_params = selected_study_params(study_selection or (), parameter_ids,
+                                         parameter_values)
+    labels = {o["value"]: o["label"]
+              for o in definitions.STUDY_TRACE_SELECTION_OPTIONS}
+    return [html.Div(
+        className="study-parameter",
+        children=[html.P(labels[study] + " "
+                         + definitions.STUDY_PARAMETER_LABELS[parameter]),
+                  dcc.Dropdown(id={"type": STUDY_PARAMETER, "study": study,
+                                   "parameter": parameter},
+                               className="dropdown",
+                               options=[{"label": str(v), "value": v}
+                                        for v in study_parameter_values(
+                                            study, parameter)],
+                               multi=False,
+                               clearable=False,
+                               value=value)])
+        for study, params in study_params.items()
+        for parameter, value in params.items()]
+
+
 # ------------------------------------------------------------------------------
 # main chart depiction callback
+#
+# Sends patches of the figure (figure_pipeline.figure_patch) which the
+# clientside callback below applies to the figure shown, so selecting a study
+# or changing its parameters only sends the traces of that study.
 @app.callback(
-    Output(component_id="msft" + "_chart", component_property="figure"),
+    [Output(component_id="msft" + "_chart-patch", component_property="data"),
+     Output(component_id="msft" + "_chart-live", component_property="data")],
     [Input(component_id="24H", component_property="n_clicks"),
      Input(component_id="7D", component_property="n_clicks"),
      Input(component_id="1M", component_property="n_clicks"),
@@ -575,15 +468,49 @@ app.layout = html.Div(
      Input(component_id="MAX", component_property="n_clicks"),
      Input(component_id="search-input", component_property="value"),
      Input(component_id="chart-type-selection", component_property="value"),
-     Input(component_id="study-selection", component_property="value")],
-    [State(component_id="msft" + "_chart", component_property="figure")]
+     Input(component_id="study-selection", component_property="value"),
+     Input(component_id={"type": STUDY_PARAMETER, "study": ALL,
+                         "parameter": ALL}, component_property="value"),
+     Input(component_id="msft" + "_chart", component_property="relayoutData")],
+    [State(component_id={"type": STUDY_PARAMETER, "study": ALL,
+                         "parameter": ALL}, component_property="id"),
+     State(component_id="msft" + "_chart-live", component_property="data"),
+     State(component_id="msft" + "_chart-cursor", component_property="data")]
 )
 def generate_main_chart_callback(one_day, one_week, one_month,
                                  three_month, six_month, one_year, five_years,
                                  max_data, search_input, chart_type_selection,
-                                 study_selection, old_fig):
+                                 study_selection, parameter_values,
+                                 relayout_data, parameter_ids, shown_meta,
+                                 cursor):
 
+    # the figure shown may have been rendered again since it was sent
+    shown_meta = live_updates.shown_meta(shown_meta, cursor)
     changed_id = [p['prop_id'] for p in dash.callback_context.triggered][0]
+    if "relayoutData" in changed_id:
+        # zoom and pan of the chart shown, see zoom_detail
+        visible = zoom_detail.visible_range(relayout_data)
+        if not shown_meta or visible is None:
+            raise dash.exceptions.PreventUpdate
+        if visible == zoom_detail.AUTORANGE:
+            if "window" not in shown_meta:
+                raise dash.exceptions.PreventUpdate
+            fig = get_main_fig(shown_meta["ticker"], shown_meta["period"],
+                               shown_meta["chart_type"],
+                               tuple(shown_meta["studies"]),
+                               shown_meta["study_params"])
+            return main_chart_update(fig, shown_meta, cursor)
+        window = zoom_detail.detail_window(shown_meta, *visible)
+        if window is None:
+            raise dash.exceptions.PreventUpdate
+        with instrumentation.record("zoom"):
+            fig = get_zoom_fig(shown_meta["ticker"], window,
+                               shown_meta["chart_type"],
+                               tuple(shown_meta["studies"]),
+                               shown_meta["study_params"],
+                               shown_meta["period"])
+        return main_chart_update(fig, shown_meta, cursor)
+
     if "24H" in changed_id:
         period_selection = definitions.PERIOD_SELECTION_DICT["24H"]
     elif "7D" in changed_id:
@@ -598,25 +525,53 @@ def generate_main_chart_callback(one_day, one_week, one_month,
         period_selection = definitions.PERIOD_SELECTION_DICT["1J"]
     elif "5J" in changed_id:
         period_selection = definitions.PERIOD_SELECTION_DICT["5J"]
-    # elif "MAX" in changed_id:
-    #     period_selection = definitions.PERIOD_SELECTION_DICT["MAX"]
+    elif "MAX" in changed_id:
+        period_selection = definitions.PERIOD_SELECTION_DICT["MAX"]
+    elif shown_meta and "period" in shown_meta:
+        # studies and chart type changes keep the period shown
+        period_selection = shown_meta["period"]
     else:
         period_selection = definitions.PERIOD_SELECTION_DICT["3M"]
 
     # dummy while no search bar dummy strategy is met
     if search_input is None:
         search_input = "MSFT"
+    search_input = search_input.strip().upper()
 
-    if search_input not in tickers:
-        return get_empty_fig("No ticker data available")
+    if not tick_store.has_ticker(search_input):
+        return {"figure": get_empty_fig("No ticker data available")}, None
 
-    if old_fig is None or old_fig["data"] == {}:
-        return get_main_fig(search_input, period_selection, chart_type_selection, (study_selection,))
+    studies = tuple(study for study in study_selection or () if study)
+    study_params = selected_study_params(studies, parameter_ids,
+                                         parameter_values)
 
-    fig = get_main_fig(search_input, period_selection, chart_type_selection,
-                       (study_selection,))
+    with instrumentation.record("main_chart"):
+        fig = get_main_fig(search_input, period_selection,
+                           chart_type_selection, studies, study_params)
+
+    return main_chart_update(fig, shown_meta, cursor)
 
-    return fig
+
+# Patch of the main chart and live meta of a rendered figure, nothing when the
+# figure is shown already
+def main_chart_update(fig, shown_meta, cursor):
+    patch = figure_patch(fig, shown_meta, cursor)
+    if patch is None:
+        raise dash.exceptions.PreventUpdate
+    return patch, live_meta(fig)
+
+
+# the figures of all charts are patched in the browser, by their callback or
+# by a live refresh
+for chart in ["msft"] + dash_actions.FAVORITE_CHARTS:
+    app.clientside_callback(
+        ClientsideFunction(namespace="figure_patch", function_name="apply"),
+        Output(component_id=chart + "_chart", component_property="figure"),
+        [Input(component_id=chart + "_chart-patch", component_property="data"),
+         Input(component_id=chart + "_chart-refresh",
+               component_property="data")],
+        State(component_id=chart + "_chart", component_property="figure"),
+    )
 
 
 # make favorite callback
@@ -630,37 +585,141 @@ def mark_favorite(submit_button_clicks):
     return False
 
 
-# favorite charts callback
-def generate_favorite_charts():
-    def generate_favorite_charts_callback(search_input, old_fig):
-        period_selection = definitions.PERIOD_SELECTION_DICT["7D"]
-        chart_type_selection = definitions.CHART_TYPE_SELECTION_OPTIONS[0]["value"]
-        study_selection = ""
-
-        # dummy while no search bar dummy strategy is met
-        if search_input is None:
-            search_input = "MSFT"
-
-        if search_input not in tickers:
-            return get_empty_fig("No ticker data available")
-
-        if old_fig is None or old_fig["data"] == {}:
-            return get_favorite_fig(search_input, period_selection, chart_type_selection, (study_selection,))
+# favorite charts callback, renders the whole favorites board at once
+@app.callback(
+    [Output(component_id=chart + suffix, component_property=prop)
+     for chart in dash_actions.FAVORITE_CHARTS
+     for suffix, prop in (("_chart-patch", "data"), ("_chart-live", "data"),
+                          ("_ticker", "children"),
+                          ("_day_trend", "children"))],
+    Input(component_id="search-input", component_property="value"),
+)
+def generate_favorite_charts_callback(search_input):
+    period_selection = definitions.PERIOD_SELECTION_DICT["7D"]
+    chart_type_selection = definitions.CHART_TYPE_SELECTION_OPTIONS[0]["value"]
+    studies = ()
 
-        fig = get_favorite_fig(search_input, period_selection, chart_type_selection, (study_selection,))
-        print(fig)
+    # dummy while no search bar dummy strategy is met
+    if search_input is None:
+        search_input = "MSFT"
+    search_input = search_input.strip().upper()
 
-        return fig
+    if not tick_store.has_ticker(search_input):
+        empty_fig = get_empty_fig("No ticker data available")
+        return [{"figure": empty_fig}, None, search_input, ""] * len(
+            dash_actions.FAVORITE_CHARTS)
 
-    return generate_favorite_charts_callback
+    favorite_tickers = [search_input for chart in dash_actions.FAVORITE_CHARTS]
+    with instrumentation.record("favorites"):
+        figs = favorites_renderer.render(
+            [(ticker, period_selection, chart_type_selection,
+              studies, None) for ticker in favorite_tickers])
+        trends = [sparklines.format_trend(sparklines.day_trend(ticker))
+                  for ticker in favorite_tickers]
+    return [value for ticker, fig, trend in zip(favorite_tickers, figs, trends)
+            for value in ({"figure": fig}, live_meta(fig), ticker, trend)]
 
 
-for chart in dash_actions.FAVORITE_CHARTS:
+# ------------------------------------------------------------------------------
+# live chart updates
+# Meta of a rendered figure, revised on every render since the figure cache
+# hands out the same figure more than once
+def live_meta(fig):
+    layout = fig["layout"]
+    meta = layout["meta"] if "meta" in layout else None
+    if not meta:
+        return None
+    return {**meta, "revision": time.time_ns()}
+
+
+# Main chart of a meta rendered again, through the figure cache
+def render_main(meta):
+    if "window" in meta:
+        return get_zoom_fig(meta["ticker"],
+                            [np.datetime64(w) for w in meta["window"]],
+                            meta["chart_type"], tuple(meta["studies"]),
+                            meta["study_params"], meta["period"])
+    return get_main_fig(meta["ticker"], meta["period"], meta["chart_type"],
+                        tuple(meta["studies"]), meta["study_params"])
+
+
+# Favorite chart of a meta rendered again, through the board's cache
+def render_favorite(meta):
+    return favorites_renderer.render(
+        [(meta["ticker"], meta["period"], meta["chart_type"],
+          tuple(meta["studies"]), meta["study_params"] or None)])[0]
+
+
+# Extends live figures with the new bars, renders the others again once the
+# store moved on
+def generate_live_chart(max_points, render):
+    def live_chart_callback(n_intervals, meta, cursor):
+        update, new_cursor = live_updates.extend_data(meta, cursor, max_points)
+        refresh = None
+        if update is None:
+            refresh, new_cursor = live_updates.refresh(meta, new_cursor,
+                                                       render)
+        if update is None and refresh is None:
+            if new_cursor == cursor:
+                raise dash.exceptions.PreventUpdate
+            return dash.no_update, new_cursor, dash.no_update
+        return (dash.no_update if update is None else update, new_cursor,
+                dash.no_update if refresh is None else refresh)
+
+    return live_chart_callback
+
+
+for chart, max_points, render in [("msft", MAIN_CHART_MAX_POINTS,
+                                   render_main)] + [
+        (chart, FAVORITE_CHART_MAX_POINTS, render_favorite)
+        for chart in dash_actions.FAVORITE_CHARTS]:
     app.callback(
-        Output(component_id=chart + "_chart", component_property="figure"),
-        Input(component_id="search-input", component_property="value"),
-        State(component_id=chart + "_chart", component_property="figure")
-    )(generate_favorite_charts())
+        [Output(component_id=chart + "_chart", component_property="extendData"),
+         Output(component_id=chart + "_chart-cursor", component_property="data"),
+         Output(component_id=chart + "_chart-refresh",
+                component_property="data")],
+        Input(component_id="live-interval", component_property="n_intervals"),
+        [State(component_id=chart + "_chart-live", component_property="data"),
+         State(component_id=chart + "_chart-cursor", component_property="data")]
+    )(generate_live_chart(max_points, render))
+
+
+# figure cache hit/miss counters
+@app.server.route("/stats/figure-cache")
+def figure_cache_stats():
+    return flask.jsonify(cache_stats())
+
+
+# per stage timings of the chart callbacks in Prometheus text format
+@app.server.route("/metrics")
+def metrics():
+    return flask.Response(instrumentation.recorder.prometheus(),
+                          mimetype="text/plain; version=0.0.4")
+
+
+# debug panel callback, the latest callbacks with their stage timings
+def update_debug_timings(n):
+    records = instrumentation.recorder.recent(15)[::-1]
+    stages = []
+    for record in records:
+        stages += [s for s in record.stages if s not in stages]
+    counts = ["rows", "points", "bytes"]
+    header = html.Tr([html.Th(h) for h in
+                      ["callback", "total ms"] + stages + counts])
+    rows = [html.Tr([html.Td(record.name),
+                     html.Td("{:.1f}".format(record.seconds * 1e3))]
+                    + [html.Td("{:.1f}".format(record.stages[s] * 1e3)
+                               if s in record.stages else "")
+                       for s in stages]
+                    + [html.Td(record.counts.get(c, "")) for c in counts])
+            for record in records]
+    return [header] + rows
+
+
+if instrumentation.enabled():
+    app.callback(Output("debug-timings", "children"),
+                 [Input("debug-interval", "n_intervals")])(
+        update_debug_timings)
 
 
 """
@@ -673,4 +732,12 @@ def update_time(n):
 
 
 if __name__ == '__main__':
+    # keeps the stored tickers up to date while the app runs, only in the
+    # reloader's serving process; callbacks only ever see complete versions
+    # of the store (see ingestion)
+    if os.path.isfile(APPCONFIG_PATH) and \
+            os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        ingestion.IngestionService(tick_store.list_tickers(),
+                                   ingestion.load_api_key(APPCONFIG_PATH)
+                                   ).start()
     app.run_server(debug=True)
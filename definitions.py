@@ -23,6 +23,10 @@ class LookBackHours:
         return h
 
 
+# option value of the whole history, see period_hours
+MAX_PERIOD = "MAX"
+
+
 PERIOD_SELECTION_DICT = {
     "24H": LookBackHours(value=24, unit="H").h,
     "7D": LookBackHours(value=7, unit="D").h,
@@ -30,7 +34,13 @@ PERIOD_SELECTION_DICT = {
     "3M": LookBackHours(value=3, unit="M").h,
     "6M": LookBackHours(value=6, unit="M").h,
     "1J": LookBackHours(value=1, unit="J").h,
-    "5J": LookBackHours(value=5, unit="J").h}
+    "5J": LookBackHours(value=5, unit="J").h,
+    "MAX": MAX_PERIOD}
+
+
+# Hours of a period option, None for the whole history
+def period_hours(period):
+    return None if period == MAX_PERIOD else period
 
 
 PERIOD_SELECTION_OPTIONS = [{"label": o[0], "value": o[1]}
@@ -62,8 +72,38 @@ STUDY_TRACE_SELECTION_DICT = {
     "PP": "pp_trace",
     "Bollinger Band": "bollinger_trace",
     "Moving average": "moving_average_trace",
-    "Exponential moving average": "e_moving_average_trace"}
+    "Exponential moving average": "e_moving_average_trace",
+    "Weighted moving average": "w_moving_average_trace",
+    "Double exponential moving average": "de_moving_average_trace"}
 
 
+# "No study" is an empty selection of the multi-select dropdown
 STUDY_TRACE_SELECTION_OPTIONS = [{"label": o[0], "value": o[1]}
-                                 for o in STUDY_TRACE_SELECTION_DICT.items()]
+                                 for o in STUDY_TRACE_SELECTION_DICT.items()
+                                 if o[1]]
+
+
+# ------------------------------------------------------------------------------
+# Study parameter selection
+# study -> parameter -> selectable values; the default of the parameter (the
+# params of the trace in the trace registry) is selectable as well
+SPAN_SELECTION_VALUES = [5, 10, 20, 50, 100, 200]
+
+STUDY_PARAMETER_DICT = {
+    "moving_average_trace": {"window": SPAN_SELECTION_VALUES},
+    "e_moving_average_trace": {"span": SPAN_SELECTION_VALUES},
+    "w_moving_average_trace": {"window": SPAN_SELECTION_VALUES},
+    "de_moving_average_trace": {"span": SPAN_SELECTION_VALUES},
+    "bollinger_trace": {"window_size": [10, 20, 50, 100],
+                        "num_of_std": [1, 1.5, 2, 2.5, 3, 5]},
+    "cci_trace": {"n_days": [10, 14, 20, 50, 100]},
+    "roc_trace": {"n_days": [5, 10, 20, 50]},
+    "mom_trace": {"n": [5, 10, 20, 50]}}
+
+STUDY_PARAMETER_LABELS = {
+    "window": "Window",
+    "span": "Span",
+    "window_size": "Window",
+    "num_of_std": "Std. dev.",
+    "n_days": "Periods",
+    "n": "Periods"}
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------------------------------------------------------
+# Server side downsampling
+#
+# Caps the points of every trace before it is sent to the browser. Line and
+# area traces keep their visual shape through Largest-Triangle-Three-Buckets,
+# candles and bars are aggregated into OHLCV buckets. Studies are computed on
+# the full resolution data and decimated afterwards.
+
+# Chart types drawn from OHLC buckets, all others are decimated with LTTB
+OHLC_CHART_TYPES = ("candlestick_trace", "colored_bar_trace", "bar_trace")
+
+
+# Forward then backward filled copy of y, NaNs would poison the triangle areas
+def _filled(y: np.ndarray):
+    nan = np.isnan(y)
+    if not nan.any():
+        return y
+    if nan.all():
+        return np.zeros(len(y))
+    idx = np.where(nan, 0, np.arange(len(y)))
+    np.maximum.accumulate(idx, out=idx)
+    filled = y[idx]
+    first = np.flatnonzero(~nan)[0]
+    filled[:first] = y[first]
+    return filled
+
+
+# Returns the indices of the n_out points LTTB keeps, always including the
+# first and the last point. Bars are equally spaced on the x-axis, so their
+# positions stand in for the x values.
+def lttb_indices(y: np.ndarray, n_out: int):
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = _filled(np.asarray(y, dtype=np.float64))
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo = edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = (next_lo + next_hi - 1) / 2
+        avg_y = y[next_lo:next_hi].mean()
+
+        x = np.arange(lo, hi)
+        area = np.abs((a - avg_x) * (y[lo:hi] - y[a])
+                      - (a - x) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+# Start positions of n_out buckets of (almost) equal row count
+def bucket_starts(n: int, n_out: int):
+    return np.unique(np.linspace(0, n, n_out + 1).astype(np.int64)[:-1])
+
+
+# Aggregates the rows of df into at most n_out OHLCV buckets: first open, max
+# high, min low, last close, summed volume, stamped with the bucket start
+def aggregate_ohlc(df: pd.DataFrame, n_out: int):
+    if len(df) <= n_out:
+        return df
+    starts = bucket_starts(len(df), n_out)
+    ends = np.append(starts[1:], len(df))
+    data = {}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column == "open":
+            data[column] = values[starts]
+        elif column == "high":
+            data[column] = np.fmax.reduceat(values, starts)
+        elif column == "low":
+            data[column] = np.fmin.reduceat(values, starts)
+        elif column == "volume" and values.dtype.kind in "iu":
+            data[column] = np.add.reduceat(values, starts, dtype=np.uint64)
+        elif column == "volume":
+            data[column] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            data[column] = values[ends - 1]
+    return pd.DataFrame(data, index=df.index[starts])
+
+
+def decimate_frame(df: pd.DataFrame, chart_type: str, max_points: int):
+    if len(df) <= max_points:
+        return df
+    if chart_type in OHLC_CHART_TYPES:
+        return aggregate_ohlc(df, max_points)
+    return df.iloc[lttb_indices(df["close"].to_numpy(), max_points)]
+
+
+# Decimates the outputs of compute_batch study by study. All outputs of a
+# study keep the points LTTB picks on its first output and the study gets its
+# own x values under "<study>.x".
+def decimate_values(index: pd.Index, values: dict, max_points: int):
+    if len(index) <= max_points:
+        return values
+    decimated = {}
+    studies = {}
+    for key in values:
+        studies.setdefault(key.split(".", 1)[0], []).append(key)
+    for study, keys in studies.items():
+        idx = lttb_indices(values[keys[0]], max_points)
+        for key in keys:
+            decimated[key] = values[key][idx]
+        decimated[study + ".x"] = index[idx]
+    return decimated
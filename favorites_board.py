@@ -0,0 +1,96 @@
+import argparse
+import itertools
+import time
+
+import definitions
+import tick_store
+from figure_pipeline import (clear_caches, empty_figure, favorite_figure,
+                             figure_cache)
+from sparklines import sparkline_figure
+from ticker_manager import tickers
+
+
+# ------------------------------------------------------------------------------
+# Favorites board rendering
+#
+# Renders all favorite charts of a page load in one call instead of one
+# callback each: identical requests are built once (the board shows one ticker
+# in every chart, which is one figure) and cached figures are reused. The
+# figures are built serially; a pool of worker processes did not pay for its
+# start-up and the columns every worker maps again (see the benchmark below).
+
+# (ticker, period, chart_type, studies, study_params), plain line favorites
+# are drawn as sparklines
+def _render(request):
+    ticker, period, chart_type, studies, study_params = request
+    if not tick_store.has_ticker(ticker):
+        return empty_figure()
+    with tickers.pinned():
+        if chart_type == "line_trace" and not any(studies or ()):
+            return sparkline_figure(ticker, period)
+        return favorite_figure(ticker, period, chart_type, studies,
+                               study_params)
+
+
+def _cache_key(request):
+    ticker, period, chart_type, studies, study_params = request
+    params = tuple(sorted((study, tuple(sorted(p.items())))
+                          for study, p in (study_params or {}).items()))
+    return ("favorite-board", ticker, period, chart_type, tuple(studies or ()),
+            params, tickers.version(ticker))
+
+
+class FavoritesRenderer:
+    def render(self, requests):
+        keys = [_cache_key(request) for request in requests]
+        figures = {}
+        for key, request in zip(keys, requests):
+            if key in figures:
+                continue
+            figure = figure_cache.get(key)
+            if figure is None:
+                figure = _render(request)
+                figure_cache.put(key, figure)
+            figures[key] = figure
+        return [figures[key] for key in keys]
+
+
+favorites_renderer = FavoritesRenderer()
+
+
+# ------------------------------------------------------------------------------
+# Wall-clock time of rendering a favorites board of distinct charts from empty
+# caches and again from the figure cache, best of `rounds` rounds
+def _benchmark(requests, rounds=3):
+    timings = {"cold": [], "cached": []}
+    for _ in range(rounds):
+        clear_caches()
+        for name in timings:
+            started = time.perf_counter()
+            favorites_renderer.render(requests)
+            timings[name].append(time.perf_counter() - started)
+    return {name: min(seconds) for name, seconds in timings.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Time the favorites board rendering")
+    parser.add_argument("--charts", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--period", type=int,
+                        default=definitions.PERIOD_SELECTION_DICT["7D"])
+    args = parser.parse_args()
+
+    # distinct charts over the stored tickers, so nothing is deduplicated
+    combinations = itertools.product(
+        tick_store.list_tickers(),
+        definitions.CHART_TYPE_SELECTION_DICT.values(),
+        definitions.STUDY_TRACE_SELECTION_DICT.values())
+    board = [(ticker, args.period, chart_type, (study,), None)
+             for ticker, chart_type, study
+             in itertools.islice(combinations, args.charts)]
+
+    timings = _benchmark(board, args.rounds)
+    print("{} charts, best of {}".format(len(board), args.rounds))
+    for name, seconds in timings.items():
+        print("{:>10}: {:.3f}s".format(name, seconds))
@@ -0,0 +1,660 @@
+from collections import OrderedDict
+import copy
+from datetime import datetime, timedelta
+import hashlib
+import json
+import threading
+import time
+
+import attr
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+import definitions
+import instrumentation
+import tick_store
+import time_index
+from downsampling import decimate_frame, decimate_values
+from indicators import as_arrays, compute_batch
+from serialization import encode_layout, encode_traces
+from study_cache import study_cache
+from ticker_manager import tickers
+from trace_registry import CHART, OVERLAY, plan_render
+from trading_calendar import get_calendar
+
+
+# ------------------------------------------------------------------------------
+# Points per trace sent to the browser, about the pixel width of the charts
+MAIN_CHART_MAX_POINTS = 1600
+FAVORITE_CHART_MAX_POINTS = 300
+
+# bars per point the whole history (MAX) is computed on at most, longer
+# histories are coarsened while they are read
+MAX_PERIOD_BARS_PER_POINT = 4
+
+
+# ------------------------------------------------------------------------------
+# Figure cache
+#
+# LRU cache with a time to live. Keys carry the data version of the ticker, so
+# new bars never hit a stale figure; the ttl bounds how far the period window
+# (which is relative to now) may drift. Concurrent misses on the same key wait
+# for the first computation instead of repeating it.
+class FigureCache:
+    def __init__(self, max_entries: int = 128, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if time.monotonic() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    # get() counted as a hit or a miss
+    def lookup(self, key):
+        value = self.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # another thread may have computed it while we waited
+            value = self.get(key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                return value
+            with self._lock:
+                self.misses += 1
+            value = compute()
+            self.put(key, value)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_ratio": self.hits / total if total else 0.0,
+                    "entries": len(self._entries),
+                    "max_entries": self.max_entries,
+                    "ttl": self.ttl}
+
+
+figure_cache = FigureCache()
+# encoded traces of figure segments, keyed by segment id
+segment_cache = FigureCache(max_entries=512)
+
+
+def cache_stats():
+    return {**figure_cache.stats(), "segments": segment_cache.stats(),
+            "studies": study_cache.stats(), "tickers": tickers.stats()}
+
+
+# Empty every cache a figure is built from (figures, segments, studies, grids
+# and the opened tickers with their calendars), for cold timings
+def clear_caches():
+    figure_cache.clear()
+    segment_cache.clear()
+    study_cache.clear()
+    tickers.clear()
+    with _grids_lock:
+        _grids.clear()
+
+
+# ------------------------------------------------------------------------------
+# Subplot grids and figure segments
+#
+# A figure is a subplot grid (a row for the chart plus one per subplot study)
+# laid out for its board, and segments of traces: the chart and every selected
+# study. make_subplots and the layout functions spend tens of milliseconds in
+# plotly's validation and only depend on the layout signature (board, rows and
+# tick format), so every grid is built once and kept as plain JSON. Segments
+# are encoded on their own and cached by what they show, a figure is a copy of
+# its grid with the traces of its segments: selecting another study or changing
+# the parameters of one renders that study only. The meta of a figure lists its
+# segments, figure_patch sends the browser only the ones it does not show yet.
+MAIN_BOARD = "main"
+FAVORITE_BOARD = "favorite"
+
+_grids = {}
+_grids_lock = threading.Lock()
+
+
+@attr.s(frozen=True, kw_only=True)
+class Segment:
+    # what the traces show, see segment_id
+    id = attr.ib(type=str)
+    # encoded traces
+    traces = attr.ib()
+
+
+# Layout of a new figure of `rows` rows on a board, tick labels of the time of
+# day for intraday figures
+def grid_layout(board: str, rows: int, intraday: bool = False):
+    key = (board, rows, intraday)
+    with _grids_lock:
+        layout = _grids.get(key)
+    if layout is None:
+        with instrumentation.stage("subplots"):
+            layout = _build_grid(board, rows, intraday)
+        with _grids_lock:
+            layout = _grids.setdefault(key, layout)
+    return copy.deepcopy(layout)
+
+
+def _build_grid(board: str, rows: int, intraday: bool):
+    # one row for the chart plus one per subplot study
+    fig = make_subplots(
+        rows=rows,
+        shared_xaxes=True,
+        shared_yaxes=True,
+        cols=1,
+        print_grid=False,
+        vertical_spacing=0.12,
+    )
+    if board == FAVORITE_BOARD:
+        _favorite_layout(fig)
+    else:
+        _main_layout(fig, intraday)
+    return encode_layout(fig.layout)
+
+
+# Axes make_subplots gives the traces of a row of a one column grid
+def _row_axes(row: int):
+    suffix = str(row) if row > 1 else ""
+    return {"xaxis": "x" + suffix, "yaxis": "y" + suffix}
+
+
+# Id of the segment of the store rows [lo, hi) the (descriptor, params, row)
+# of a plan is drawn with
+def segment_id(ticker: str, resolution: str, lo: int, hi: int,
+               max_points: int, max_rows: int, segment):
+    descriptor, params, row = segment
+    key = (ticker.upper(), resolution, lo, hi, tickers.version(ticker),
+           max_points, max_rows, descriptor.name,
+           tuple(sorted(params.items())), row)
+    return hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
+
+# Segments of the plan for the store rows [lo, hi), rendering only those which
+# are not cached; with max_rows the rows are coarsened (see render_coarsened)
+def render_segments(ticker: str, plan, resolution: str, lo: int, hi: int,
+                    max_points: int = None, max_rows: int = None):
+    ids = [segment_id(ticker, resolution, lo, hi, max_points, max_rows, s)
+           for s in plan.segments]
+    found = {i: segment_cache.lookup(i) for i in ids}
+    missing = [(i, s) for i, s in zip(ids, plan.segments) if found[i] is None]
+    if missing:
+        segments = [s for _, s in missing]
+        if max_rows is None:
+            rendered = render_rows(ticker, plan, resolution, lo, hi,
+                                   max_points, segments)
+        else:
+            rendered = render_coarsened(ticker, plan, resolution, lo, hi,
+                                        max_rows, max_points, segments)
+        for (i, _), traces in zip(missing, rendered):
+            found[i] = Segment(id=i, traces=traces)
+            segment_cache.put(i, found[i])
+    instrumentation.count("segments", len(missing))
+    return [found[i] for i in ids]
+
+
+# Figure dict of the segments on the grid of the plan
+def assemble_figure(board: str, plan, segments, intraday: bool = False):
+    fig = {"data": [trace for segment in segments
+                    for trace in segment.traces],
+           "layout": grid_layout(board, plan.rows, intraday)}
+    if instrumentation.enabled():
+        instrumentation.count("bytes", len(json.dumps(fig)))
+    return fig
+
+
+# Intraday figures label their ticks with the time of day
+def _intraday(hours):
+    return hours is not None and hours <= 24
+
+
+# ------------------------------------------------------------------------------
+# Figure construction shared by the main and the favorite charts
+# study_params maps a study to the keyword parameters it is computed with, the
+# period is a value of definitions.PERIOD_SELECTION_DICT
+def build_figure(ticker: str, period: int, chart_type: str, studies: tuple,
+                 study_params: dict = None, now: datetime = None,
+                 max_points: int = MAIN_CHART_MAX_POINTS,
+                 board: str = MAIN_BOARD):
+    # resolves chart type and studies through the trace registry
+    with instrumentation.stage("plan"):
+        plan = plan_render(chart_type, studies, study_params)
+    now = datetime.now() if now is None else now
+    hours = definitions.period_hours(period)
+    start_dt = None if hours is None else now - timedelta(hours=hours)
+
+    # the coarsest rollup that still fills the chart keeps long periods cheap
+    with instrumentation.stage("resolution"):
+        resolution = time_index.select_resolution(ticker, start_dt, now,
+                                                  max_points)
+        index = time_index.get_time_index(ticker, resolution=resolution)
+        lo, hi = index.period_positions(hours, now)
+
+    max_rows = max_points * MAX_PERIOD_BARS_PER_POINT
+    coarsened = hours is None and hi - lo > max_rows
+    segments = render_segments(ticker, plan, resolution, lo, hi, max_points,
+                               max_rows if coarsened else None)
+    fig = assemble_figure(board, plan, segments, _intraday(hours))
+    with instrumentation.stage("layout"):
+        time_axis(fig, ticker, resolution, lo, hi, start_dt, now)
+
+    fig["layout"]["meta"] = figure_meta(
+        fig, ticker, chart_type, studies, study_params, resolution, lo, hi,
+        max_points, segments, period=period,
+        live=_live(resolution, lo, hi, len(index), max_points))
+    return fig
+
+
+# Whether live updates extend the figure of the rows [lo, hi): drawn bar by
+# bar from the base bars, up to the newest one. Decimated figures are
+# rendered again as a whole instead (live_updates.refresh), raw bars appended
+# to their traces would push their decimated history out of the browser.
+def _live(resolution: str, lo: int, hi: int, rows: int, max_points: int):
+    return (resolution == tick_store.BASE_RESOLUTION
+            and hi - lo <= max_points and hi == rows)
+
+
+# Collapses the nights, weekends and holidays between the sessions of the
+# ticker on the x-axes and, when the history starts after start_dt, extends
+# them back to it
+def time_axis(fig, ticker: str, resolution: str, lo: int, hi: int,
+              start_dt: datetime = None, end_dt: datetime = None):
+    index = time_index.get_time_index(ticker, resolution=resolution)
+    dates = index.date_view(lo, hi)
+    first, last = (dates[0], dates[-1]) if hi > lo else (None, None)
+    axes = [axis for name, axis in fig["layout"].items()
+            if name.startswith("xaxis")]
+    rangebreaks = get_calendar(ticker).rangebreaks(first, last, resolution)
+    for axis in axes:
+        axis["rangebreaks"] = rangebreaks
+    if start_dt is not None and lo == 0 and \
+            (not len(index) or index.first > np.datetime64(start_dt)):
+        bounds = [str(pd.Timestamp(start_dt)), str(pd.Timestamp(end_dt or last))]
+        for axis in axes:
+            axis["range"] = bounds
+    return fig
+
+
+# What live updates need to extend the figure from its last bar on (only
+# figures of base bars reaching the newest bar are extended, the others are
+# rendered again once the version of the store moves on), what the zoom
+# callback needs to tell whether it has to re-query and the segments
+# figure_patch compares
+def figure_meta(fig, ticker: str, chart_type: str, studies: tuple,
+                study_params: dict, resolution: str, lo: int, hi: int,
+                max_points: int, segments, **extra):
+    index = time_index.get_time_index(ticker, resolution=resolution)
+    dates = index.date_view(lo, hi)
+    store = tickers.meta(ticker)
+    return {
+        "ticker": ticker,
+        "chart_type": chart_type,
+        "studies": list(studies or ()),
+        "study_params": study_params or {},
+        "resolution": resolution,
+        "row": hi,
+        "version": store["version"],
+        "base_version": store.get("base_version"),
+        "traces": len(fig["data"]),
+        "segments": [[s.id, len(s.traces)] for s in segments],
+        # first and last bar of the figure, shown bar by bar when full
+        "range": [str(dates[0]), str(dates[-1])] if hi > lo else None,
+        "full": (resolution == tick_store.BASE_RESOLUTION
+                 and hi - lo <= max_points),
+        **extra,
+    }
+
+
+# Encoded traces of the store rows [lo, hi) for the (descriptor, params, row)
+# segments of the plan (all by default), decimated to max_points when given
+def render_rows(ticker: str, plan, resolution: str, lo: int, hi: int,
+                max_points: int = None, segments=None):
+    segments = plan.segments if segments is None else segments
+    plan = plan.restricted(segments)
+    # reads only the columns and rows the planned traces need, as views
+    with instrumentation.stage("slice"):
+        dff = time_index.read_rows(ticker, lo, hi, plan.columns,
+                                   resolution=resolution)
+    instrumentation.count("rows", hi - lo)
+
+    # computes all selected studies in one pass sharing their intermediates,
+    # warmed up on the bars before the period so its first bars are valid;
+    # rows computed for an earlier request are reused
+    with instrumentation.stage("studies"):
+        values = study_cache.study_values(ticker, resolution, plan, lo, hi)
+
+    return render_frame(plan, dff, values, max_points, segments)
+
+
+# Traces of the store rows [lo, hi) aggregated into at most max_rows bars
+# while they are streamed from the store, with the studies computed on the
+# aggregated bars
+def render_coarsened(ticker: str, plan, resolution: str, lo: int, hi: int,
+                     max_rows: int, max_points: int = None, segments=None):
+    segments = plan.segments if segments is None else segments
+    plan = plan.restricted(segments)
+    with instrumentation.stage("slice"):
+        dff = time_index.read_coarsened(ticker, lo, hi, max_rows,
+                                        plan.columns, resolution=resolution)
+    instrumentation.count("rows", hi - lo)
+
+    with instrumentation.stage("studies"):
+        values = compute_batch(as_arrays(dff, plan.columns), plan.batch)
+
+    return render_frame(plan, dff, values, max_points, segments)
+
+
+# Stands in for the figure the overlay functions of charts.py append their
+# traces to
+class _RowTraces:
+    def __init__(self):
+        self.traces = []
+
+    def append_trace(self, trace, row, col):
+        self.traces.append(trace)
+
+
+# Encoded traces of a frame and the study values aligned with it, one list
+# per segment
+def render_frame(plan, dff: pd.DataFrame, values: dict,
+                 max_points: int = None, segments=None):
+    segments = plan.segments if segments is None else segments
+
+    # caps the points sent to the browser, after the studies were computed
+    # on the full resolution data
+    chart_df = dff
+    if max_points is not None:
+        with instrumentation.stage("decimate"):
+            values = decimate_values(dff.index, values, max_points)
+            if any(d.placement == CHART for d, _, _ in segments):
+                chart_df = decimate_frame(dff, plan.chart.name, max_points)
+    instrumentation.count("points", len(chart_df))
+
+    with instrumentation.stage("traces"):
+        rendered = []
+        for descriptor, params, row in segments:
+            if descriptor.placement == CHART:
+                traces = [descriptor.function(chart_df)]
+            elif descriptor.placement == OVERLAY:
+                # Add trace(s) on fig's first row
+                row_traces = _RowTraces()
+                descriptor.function(dff, row_traces, values=values, **params)
+                traces = row_traces.traces
+            else:
+                # Plot trace on its own row
+                traces = [descriptor.function(dff, values=values, **params)]
+            rendered.append((row, traces))
+
+    # all traces in one encoding, then split into their segments
+    encoded = iter(encode_traces([trace for _, traces in rendered
+                                  for trace in traces]))
+    return [[{**next(encoded), **_row_axes(row)} for _ in traces]
+            for row, traces in rendered]
+
+
+def _main_layout(fig, intraday: bool):
+    # rebinds all traces to the x-axis
+    # fig.update_traces(xaxis="x1")
+
+    # Ensures zoom on graph is the same on update
+    fig["layout"]["uirevision"] = "The User is always right"
+
+    fig["layout"]["margin"] = {"t": 50, "l": 50, "b": 50, "r": 25}
+    fig["layout"]["autosize"] = True
+    fig["layout"]["height"] = 600
+
+    # --- legend definitions ---
+    # defines if showlegend of single charts is True (default) or False
+    fig["layout"]["showlegend"] = True
+    # somehow cannot be defined here
+    # fig["layout"]["legend_orientation"] = "h"
+    # position of legend
+    fig["layout"]["legend"] = dict(y=1, x=0)
+    # legend and probably title font definitions
+    fig["layout"]["font"] = dict(color="#dedddc")
+
+    # --- x-axis definitions ---
+    # disables sub-graph time range slider
+    fig["layout"]["xaxis"]["rangeslider"]["visible"] = False
+    # numbers not showing????????
+    if intraday:
+        fig["layout"]["xaxis"]["tickformat"] = "%H:%M"
+    else:
+        fig["layout"]["xaxis"]["tickformat"] = "%Y-%m-%d %H:%M"
+
+    # --- y-axis definitions ---
+    # fig["layout"]["xaxis"]["showline"] = True
+    # fig["layout"]["yaxis"]["showgrid"] = True
+    fig["layout"]["yaxis"]["gridcolor"] = "#3E3F40"
+    fig["layout"]["yaxis"]["gridwidth"] = 1
+
+    # --- crosshairs definitions ---
+    # solid line instead of dashed default or others
+    fig["layout"]["xaxis"]["spikedash"] = "solid"
+    # snap to cursor or data point
+    fig["layout"]["xaxis"]["spikesnap"] = "cursor"
+    # solid line instead of dashed default or others
+    fig["layout"]["yaxis"]["spikedash"] = "solid"
+    # snap to cursor or data point
+    fig["layout"]["yaxis"]["spikesnap"] = "cursor"
+
+    fig["layout"].update(paper_bgcolor="#21252C",
+                         plot_bgcolor="#21252C",
+                         # orient legend content vertically or horizontally
+                         legend_orientation="v",
+                         # legend=dict(y=1, x=0),
+                         # font=dict(color="#dedddc"),
+                         # grab and move chart instead of time selection
+                         # dragmode='pan',
+                         # enables cursor crosshairs
+                         hovermode='x unified',
+
+                         # width=200,
+                         # height=200,
+                         )
+    return fig
+
+
+def _favorite_layout(fig):
+    # rebinds all traces to the x-axis
+    # fig.update_traces(xaxis="x1")
+
+    # Ensures zoom on graph is the same on update
+    fig["layout"]["uirevision"] = "The User is always right"
+
+    fig["layout"]["margin"] = {"t": 50, "l": 50, "b": 50, "r": 25}
+    fig["layout"]["autosize"] = True
+    # fig["layout"]["height"] = 600
+
+    # --- legend definitions ---
+    # defines if showlegend of single charts is True (default) or False
+    fig["layout"]["showlegend"] = False
+
+    # --- x-axis definitions ---
+    # disables sub-graph time range slider
+    fig["layout"]["xaxis"]["rangeslider"]["visible"] = False
+
+    fig["layout"]["yaxis"]["visible"] = False
+    fig["layout"]["xaxis"]["visible"] = False
+
+    fig["layout"].update(paper_bgcolor="#21252C",
+                         plot_bgcolor="#21252C",
+                         # width=200,
+                         # height=200,
+                         xaxis=dict(
+                             autorange=True
+                         ),
+                         yaxis=dict(
+                             autorange=True
+                         ),
+                         )
+    return fig
+
+
+# Figure dict drawn for a ticker the store does not have, a new one per call
+def empty_figure():
+    return {"data": [], "layout": {}}
+
+
+def _cache_key(kind: str, ticker: str, period: int, chart_type: str,
+               studies: tuple, study_params: dict):
+    params = tuple(sorted((study, tuple(sorted(p.items())))
+                          for study, p in (study_params or {}).items()))
+    return (kind, ticker, period, chart_type, tuple(studies or ()), params,
+            tickers.version(ticker))
+
+
+# Returns main graph figure as a dict of plain JSON values, keyed and built
+# on one version of the ticker
+def get_main_fig(ticker: str, period: int, chart_type: str, studies: tuple,
+                 study_params: dict = None):
+    if not tick_store.has_ticker(ticker):
+        return empty_figure()
+
+    with tickers.pinned():
+        return figure_cache.get_or_compute(
+            _cache_key("main", ticker, period, chart_type, studies,
+                       study_params),
+            lambda: build_figure(ticker, period, chart_type, studies,
+                                 study_params))
+
+
+# Figure dict of the rows in [start, end] at the coarsest resolution that
+# still gives max_points bars
+def zoom_figure(ticker: str, start: np.datetime64, end: np.datetime64,
+                chart_type: str, studies: tuple, study_params: dict = None,
+                period: int = None, max_points: int = MAIN_CHART_MAX_POINTS):
+    with instrumentation.stage("plan"):
+        plan = plan_render(chart_type, studies, study_params)
+    with instrumentation.stage("resolution"):
+        resolution = time_index.select_resolution(ticker, start, end,
+                                                  max_points)
+        index = time_index.get_time_index(ticker, resolution=resolution)
+        lo, hi = index.range_positions(start, end)
+
+    segments = render_segments(ticker, plan, resolution, lo, hi, max_points)
+    hours = (end - start) / np.timedelta64(1, "h")
+    fig = assemble_figure(MAIN_BOARD, plan, segments, _intraday(hours))
+    with instrumentation.stage("layout"):
+        time_axis(fig, ticker, resolution, lo, hi)
+    fig["layout"]["meta"] = figure_meta(
+        fig, ticker, chart_type, studies, study_params, resolution, lo, hi,
+        max_points, segments, period=period, window=[str(start), str(end)],
+        live=_live(resolution, lo, hi, len(index), max_points))
+    return fig
+
+
+# Returns the zoom figure of a window as a dict of plain JSON values
+def get_zoom_fig(ticker: str, window, chart_type: str, studies: tuple,
+                 study_params: dict = None, period: int = None):
+    if not tick_store.has_ticker(ticker):
+        return empty_figure()
+
+    with tickers.pinned():
+        key = _cache_key("zoom", ticker, period, chart_type, studies,
+                         study_params) + (str(window[0]), str(window[1]))
+        return figure_cache.get_or_compute(
+            key, lambda: zoom_figure(ticker, window[0], window[1], chart_type,
+                                     studies, study_params, period))
+
+
+# Builds a favorite graph figure dict, uncached
+def favorite_figure(ticker: str, period: int, chart_type: str, studies: tuple,
+                    study_params: dict = None):
+    return build_figure(ticker, period, chart_type, studies, study_params,
+                        max_points=FAVORITE_CHART_MAX_POINTS,
+                        board=FAVORITE_BOARD)
+
+
+# ------------------------------------------------------------------------------
+# Figure patches
+#
+# Dash replaces a figure as a whole. The main chart is sent patches instead,
+# applied in the browser by a clientside callback (assets/figure_patch.js): the
+# layout and the data of the new figure, with the position of the trace in the
+# figure shown in place of every trace of a segment the browser already has.
+# A figure extended by live updates since it was sent, or showing a segment
+# with another number of traces than it is listed with, is replaced as a whole.
+
+# Returns the patch turning the figure described by `shown` (the live meta it
+# was sent with) into `fig`, None when it already is `fig`
+def figure_patch(fig, shown: dict = None, cursor: dict = None):
+    meta = fig["layout"]["meta"] if "meta" in fig["layout"] else None
+    if not meta or not shown or "segments" not in shown:
+        return {"figure": fig}
+    if cursor and cursor.get("revision") == shown.get("revision") \
+            and cursor.get("row") != shown.get("row"):
+        return {"figure": fig}
+    if {**meta, "revision": shown.get("revision")} == shown:
+        return None
+
+    # first trace and number of traces of the segments shown
+    positions = {}
+    start = 0
+    for segment, count in shown["segments"]:
+        positions[segment] = (start, count)
+        start += count
+
+    data = []
+    kept = 0
+    start = 0
+    for segment, count in meta["segments"]:
+        shown_at = positions.get(segment)
+        if shown_at is not None and shown_at[1] != count:
+            return {"figure": fig}
+        if shown_at is not None:
+            data.extend(range(shown_at[0], shown_at[0] + count))
+            kept += count
+        else:
+            data.extend(fig["data"][start:start + count])
+        start += count
+    instrumentation.count("kept_traces", kept)
+    if not kept:
+        return {"figure": fig}
+    return {"layout": fig["layout"], "data": data}
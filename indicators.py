@@ -0,0 +1,856 @@
+import math
+import threading
+
+import numpy as np
+
+import tick_store
+from ticker_manager import tickers
+
+
+# ------------------------------------------------------------------------------
+# Incremental indicator engine
+#
+# Keeps the state of every study per (ticker, indicator, params) so that a new
+# bar costs O(1) per indicator instead of recomputing the whole frame. The full
+# output series is kept in growable arrays and returned on demand. Results
+# match the pandas computations in charts.py (rolling std with ddof=1, NaN
+# until a window is complete or while it holds a NaN).
+
+# Fixed size buffer holding the last `size` values
+class RingBuffer:
+    def __init__(self, size: int):
+        self.size = size
+        self.values = np.full(size, np.nan)
+        self.count = 0
+        self._pos = 0
+
+    @property
+    def full(self):
+        return self.count >= self.size
+
+    # Appends x and returns the value falling out of the buffer (NaN if none)
+    def append(self, x: float):
+        evicted = self.values[self._pos] if self.full else math.nan
+        self.values[self._pos] = x
+        self._pos = (self._pos + 1) % self.size
+        self.count += 1
+        return evicted
+
+    # Oldest value still in the buffer
+    def oldest(self):
+        return self.values[self._pos] if self.full else math.nan
+
+    def ordered(self):
+        if not self.full:
+            return self.values[:self.count].copy()
+        return np.concatenate((self.values[self._pos:],
+                               self.values[:self._pos]))
+
+
+# Rolling sum and sum of squares over the last `window` values. The sums are
+# recomputed from the ring every time it wraps, which keeps the float drift
+# bounded at an amortized O(1) cost.
+class RollingWindow:
+    def __init__(self, window: int):
+        self.window = window
+        self.ring = RingBuffer(window)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nans = 0
+
+    def append(self, x: float):
+        full = self.ring.full
+        evicted = self.ring.append(x)
+        if full:
+            if math.isnan(evicted):
+                self.nans -= 1
+            else:
+                self.total -= evicted
+                self.total_sq -= evicted * evicted
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+            self.total_sq += x * x
+        if self.ring.count % self.window == 0:
+            valid = self.ring.values[~np.isnan(self.ring.values)]
+            self.total = float(valid.sum())
+            self.total_sq = float((valid * valid).sum())
+
+    @property
+    def ready(self):
+        return self.ring.full and self.nans == 0
+
+    def mean(self):
+        if not self.ready:
+            return math.nan
+        return self.total / self.window
+
+    def std(self):
+        if not self.ready or self.window < 2:
+            return math.nan
+        n = self.window
+        var = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+# Growable float array with amortized O(1) appends
+class SeriesBuffer:
+    def __init__(self, capacity: int = 1024):
+        self._values = np.empty(capacity)
+        self.count = 0
+
+    def append(self, x: float):
+        if self.count == len(self._values):
+            grown = np.empty(2 * len(self._values))
+            grown[:self.count] = self._values[:self.count]
+            self._values = grown
+        self._values[self.count] = x
+        self.count += 1
+
+    def extend(self, values: np.ndarray):
+        needed = self.count + len(values)
+        if needed > len(self._values):
+            grown = np.empty(max(needed, 2 * len(self._values)))
+            grown[:self.count] = self._values[:self.count]
+            self._values = grown
+        self._values[self.count:needed] = values
+        self.count = needed
+
+    def values(self):
+        view = self._values[:self.count]
+        view.flags.writeable = False
+        return view
+
+
+# ------------------------------------------------------------------------------
+# Indicators
+class Indicator:
+    # names of the produced series
+    outputs = ()
+    # store columns the indicator reads
+    inputs = ("close",)
+
+    def __init__(self):
+        self._series = {name: SeriesBuffer() for name in self.outputs}
+
+    # lookback (bars) before the first valid value
+    @property
+    def lookback(self):
+        return 0
+
+    def update(self, bar: dict):
+        values = self._update(bar)
+        for name, value in zip(self.outputs, values):
+            self._series[name].append(value)
+        return dict(zip(self.outputs, values))
+
+    # Pushes a block of bars given as column arrays; indicators with a
+    # vectorized kernel override this, the default updates bar by bar
+    def extend(self, columns: dict):
+        names = self.inputs
+        for i in range(len(columns[names[0]])):
+            self.update({c: columns[c][i] for c in names})
+
+    def series(self):
+        return {name: buf.values() for name, buf in self._series.items()}
+
+    def __len__(self):
+        return self._series[self.outputs[0]].count
+
+    def _update(self, bar: dict):
+        raise NotImplementedError
+
+
+class MovingAverage(Indicator):
+    outputs = ("ma",)
+
+    def __init__(self, window: int):
+        super().__init__()
+        self.window = window
+        self._rolling = RollingWindow(window)
+
+    @property
+    def lookback(self):
+        return self.window - 1
+
+    def _update(self, bar):
+        self._rolling.append(bar["close"])
+        return (self._rolling.mean(),)
+
+
+class Bollinger(Indicator):
+    outputs = ("upper", "mean", "lower")
+
+    def __init__(self, window_size: int, num_of_std: float):
+        super().__init__()
+        self.window_size = window_size
+        self.num_of_std = num_of_std
+        self._rolling = RollingWindow(window_size)
+
+    @property
+    def lookback(self):
+        return self.window_size - 1
+
+    def _update(self, bar):
+        self._rolling.append(bar["close"])
+        mean = self._rolling.mean()
+        band = self._rolling.std() * self.num_of_std
+        return mean + band, mean, mean - band
+
+
+class CCI(Indicator):
+    outputs = ("cci",)
+    inputs = ("high", "low", "close")
+
+    def __init__(self, n_days: int):
+        super().__init__()
+        self.n_days = n_days
+        self._rolling = RollingWindow(n_days)
+
+    @property
+    def lookback(self):
+        return self.n_days - 1
+
+    def _update(self, bar):
+        tp = (bar["high"] + bar["low"] + bar["close"]) / 3
+        self._rolling.append(tp)
+        std = self._rolling.std()
+        if std == 0:
+            return (math.nan,)
+        return ((tp - self._rolling.mean()) / (0.015 * std),)
+
+
+# Shared base of the indicators comparing the close with the close n bars ago
+class _Lagged(Indicator):
+    def __init__(self, n: int):
+        super().__init__()
+        self.n = n
+        self._closes = RingBuffer(n)
+
+    @property
+    def lookback(self):
+        return self.n
+
+    def _update(self, bar):
+        close = bar["close"]
+        previous = self._closes.oldest()
+        self._closes.append(close)
+        return self._compute(close, previous)
+
+    def _compute(self, close, previous):
+        raise NotImplementedError
+
+
+class ROC(_Lagged):
+    outputs = ("roc",)
+
+    def __init__(self, n_days: int):
+        super().__init__(n_days)
+
+    def _compute(self, close, previous):
+        if previous == 0:
+            return (math.nan,)
+        return ((close - previous) / previous,)
+
+
+class Momentum(_Lagged):
+    outputs = ("mom",)
+
+    def __init__(self, n: int):
+        super().__init__(n)
+
+    def _compute(self, close, previous):
+        return (close - previous,)
+
+
+class Stochastic(Indicator):
+    outputs = ("so_k",)
+    inputs = ("high", "low", "close")
+
+    def _update(self, bar):
+        span = bar["high"] - bar["low"]
+        if span == 0:
+            return (math.nan,)
+        return ((bar["close"] - bar["low"]) / span,)
+
+
+class WeightedMovingAverage(Indicator):
+    outputs = ("wma",)
+
+    def __init__(self, window: int):
+        super().__init__()
+        self.window = window
+        self._rolling = RollingWindow(window)
+        # sum of the linearly weighted values, NaN counted as 0
+        self._numerator = 0.0
+
+    @property
+    def lookback(self):
+        return self.window - 1
+
+    def _update(self, bar):
+        x = bar["close"]
+        previous_total = self._rolling.total
+        self._rolling.append(x)
+        value = 0.0 if math.isnan(x) else x
+        self._numerator += self.window * value - previous_total
+        if self._rolling.ring.count % self.window == 0:
+            ordered = np.nan_to_num(self._rolling.ring.ordered())
+            self._numerator = float(
+                (np.arange(1, self.window + 1) * ordered).sum())
+        if not self._rolling.ready:
+            return (math.nan,)
+        return (self._numerator / (self.window * (self.window + 1) / 2),)
+
+
+class ExponentialMovingAverage(Indicator):
+    outputs = ("ema",)
+
+    def __init__(self, span: int):
+        super().__init__()
+        self.span = span
+        self._state = EMAState(span)
+
+    # the seed still weighs (1 - alpha)^(3 * span), about 0.25%, after this
+    @property
+    def lookback(self):
+        return 3 * self.span
+
+    def _update(self, bar):
+        return (self._state.update(bar["close"]),)
+
+    def extend(self, columns: dict):
+        self._series["ema"].extend(self._state.extend(columns["close"]))
+
+
+class DoubleExponentialMovingAverage(Indicator):
+    outputs = ("dema",)
+
+    def __init__(self, span: int):
+        super().__init__()
+        self.span = span
+        self._ema = EMAState(span)
+        self._ema_of_ema = EMAState(span)
+
+    @property
+    def lookback(self):
+        return 6 * self.span
+
+    def _update(self, bar):
+        ema = self._ema.update(bar["close"])
+        return (2 * ema - self._ema_of_ema.update(ema),)
+
+    def extend(self, columns: dict):
+        ema = self._ema.extend(columns["close"])
+        self._series["dema"].extend(2 * ema - self._ema_of_ema.extend(ema))
+
+
+# Accumulation/distribution line: running sum of the close location value
+# times the volume of every bar since the first one
+class Accumulation(Indicator):
+    outputs = ("accumulation",)
+    inputs = ("high", "low", "close", "volume")
+
+    def __init__(self):
+        super().__init__()
+        self.total = 0.0
+
+    def _update(self, bar):
+        span = bar["high"] - bar["low"]
+        if span:
+            flow = ((bar["close"] - bar["low"]) - (bar["high"] - bar["close"])
+                    ) / span * bar["volume"]
+            if math.isfinite(flow):
+                self.total += flow
+        return (self.total,)
+
+    def extend(self, columns: dict):
+        values = self.total + np.cumsum(money_flow_volume(columns))
+        if len(values):
+            self.total = float(values[-1])
+        self._series["accumulation"].extend(values)
+
+
+INDICATORS = {
+    "moving_average": MovingAverage,
+    "e_moving_average": ExponentialMovingAverage,
+    "w_moving_average": WeightedMovingAverage,
+    "de_moving_average": DoubleExponentialMovingAverage,
+    "bollinger": Bollinger,
+    "cci": CCI,
+    "roc": ROC,
+    "mom": Momentum,
+    "stoc": Stochastic,
+    "accumulation": Accumulation,
+}
+
+
+# ------------------------------------------------------------------------------
+# Engine
+#
+# Indicators are fed from the tick store: sync() pushes only the rows that were
+# appended since the last call. An indicator requested late is primed from the
+# rows already in the store, from its lookback before the first row asked for
+# (cumulative ones from the first row). When the store was rewritten rather
+# than appended to (its base version changed), the indicators of the ticker
+# are dropped and primed again on their next request. Live updates take the
+# study values of the bars they append from here (see live_updates).
+class IndicatorEngine:
+    def __init__(self, store_dir: str = tick_store.STORE_DIR):
+        self.store_dir = store_dir
+        self._indicators = {}
+        # first store row pushed to every indicator
+        self._first = {}
+        self._rows = {}
+        # base version of the store the indicators were fed from
+        self._versions = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def supports(name: str):
+        return name in INDICATORS
+
+    # Indicator whose values are valid from row `start` on, primed from the
+    # first row when start is None
+    def indicator(self, ticker: str, name: str, start: int = None, **params):
+        key = (ticker.upper(), name, tuple(sorted(params.items())))
+        with self._lock:
+            indicator = self._indicators.get(key)
+            if indicator is not None and start is not None \
+                    and self._first[key] > 0 \
+                    and self._first[key] > start - indicator.lookback:
+                # not warmed up that far back
+                indicator = None
+            if indicator is None:
+                indicator = INDICATORS[name](**{**study_defaults(name),
+                                                **params})
+                rows = self._rows.get(key[0], 0)
+                first = 0
+                if start is not None and name not in CUMULATIVE_STUDIES:
+                    first = min(rows, max(0, start - indicator.lookback))
+                if rows > first:
+                    self._push(ticker, [indicator], first, rows)
+                self._indicators[key] = indicator
+                self._first[key] = first
+            return indicator
+
+    def sync(self, ticker: str):
+        ticker = ticker.upper()
+        with self._lock:
+            meta = tickers.meta(ticker, self.store_dir)
+            base_version = meta.get("base_version", meta["version"])
+            if self._versions.get(ticker, base_version) != base_version:
+                self.reset(ticker)
+            self._versions[ticker] = base_version
+
+            start = self._rows.get(ticker, 0)
+            end = meta["rows"]
+            if end > start:
+                indicators = [ind for key, ind in self._indicators.items()
+                              if key[0] == ticker]
+                self._push(ticker, indicators, start, end)
+                self._rows[ticker] = end
+            return end - start
+
+    # "<study>.<output>" -> values of the store rows [lo, hi) of (study,
+    # params) pairs, as compute_batch names them. The indicators keep their
+    # state between calls, following the end of the store costs O(new rows).
+    def study_values(self, ticker: str, studies, lo: int, hi: int):
+        values = {}
+        with self._lock:
+            self.sync(ticker)
+            for name, params in studies:
+                indicator = self.indicator(ticker, name, start=lo, **params)
+                first = self._first[(ticker.upper(), name,
+                                     tuple(sorted(params.items())))]
+                for output, series in indicator.series().items():
+                    values[name + "." + output] = series[lo - first:
+                                                         hi - first]
+        return values
+
+    def reset(self, ticker: str = None):
+        with self._lock:
+            for key in [k for k in self._indicators
+                        if ticker is None or k[0] == ticker.upper()]:
+                del self._indicators[key]
+                del self._first[key]
+            if ticker is None:
+                self._rows.clear()
+                self._versions.clear()
+            else:
+                self._rows.pop(ticker.upper(), None)
+                self._versions.pop(ticker.upper(), None)
+
+    def _push(self, ticker, indicators, start, end):
+        if not indicators:
+            return
+        columns = set()
+        for indicator in indicators:
+            columns.update(indicator.inputs)
+        opened = tickers.get(ticker, self.store_dir).columns
+        arrays = {c: opened[c][start:end].astype(float) for c in columns}
+        for indicator in indicators:
+            indicator.extend(arrays)
+
+
+engine = IndicatorEngine()
+
+
+# ------------------------------------------------------------------------------
+# Batch computation
+#
+# Computes several studies in one go over contiguous float64 arrays. The
+# intermediates are computed once per call and shared between the studies:
+# the typical price (CCI, pivot points), the high-low range (stochastic),
+# the money flow volume (accumulation), rolling means/stds per (source,
+# window) and the n-bar close differences (ROC, momentum). Returns a flat
+# dict "<study>.<output>" -> array.
+
+# The studies only ever read their inputs, which compute_batch hands them as
+# read-only views (writing into one raises), and return fresh arrays, which
+# are read-only as well: frames, mapped store columns and cached outputs can
+# be shared between concurrent callbacks without defensive copies.
+
+# Rows per chunk of the rolling window sums. Every chunk is offset by its own
+# mean before the cumulative sums are taken, which keeps the sums small and the
+# variance free of cancellation errors.
+_ROLLING_CHUNK = 1 << 14
+
+# Default parameters of every study. The trace descriptors plotting the
+# studies hold them (trace_registry.register_trace copies them in here), a
+# study without a trace brings its own through register_study.
+STUDY_DEFAULTS = {}
+
+
+def study_defaults(name: str):
+    if name not in STUDY_DEFAULTS:
+        # the built-in traces; imported late, trace_registry imports this
+        # module (through charts)
+        import trace_registry  # noqa: F401
+    return STUDY_DEFAULTS[name]
+
+
+# Studies whose values add up from the first bar of the store: study -> its
+# per-bar increments. compute_batch takes the total of the bars before the
+# first row as the `initial` parameter of such a study.
+CUMULATIVE_STUDIES = {}
+
+# Studies whose value at a row is a recursion over every earlier row (an
+# exponential moving average and its derivatives): the first row of a
+# computation seeds it, so values depend on where it started, the lookback
+# only bounds the weight of the seed.
+RECURSIVE_STUDIES = {"e_moving_average", "de_moving_average"}
+
+
+def readonly(x: np.ndarray):
+    view = np.asarray(x).view()
+    view.flags.writeable = False
+    return view
+
+
+def as_arrays(df, columns=tick_store.OHLCV_COLUMNS):
+    return {c: np.ascontiguousarray(df[c].to_numpy(), dtype=np.float64)
+            for c in columns if c in df}
+
+
+# Rolling mean and sample std (ddof=1) in O(N); a window holding a NaN is NaN
+def rolling_moments(x: np.ndarray, window: int, with_std: bool = True):
+    mean = np.full(len(x), np.nan)
+    std = np.full(len(x), np.nan) if with_std else None
+    for lo in range(window - 1, len(x), _ROLLING_CHUNK):
+        hi = min(lo + _ROLLING_CHUNK, len(x))
+        segment = x[lo - window + 1:hi]
+        nan = np.isnan(segment)
+        ref = segment[~nan].mean() if not nan.all() else 0.0
+        dev = np.where(nan, 0.0, segment - ref)
+
+        sums = np.concatenate(([0.0], np.cumsum(dev)))
+        nans = np.concatenate(([0], np.cumsum(nan)))
+        dev_mean = (sums[window:] - sums[:-window]) / window
+        invalid = (nans[window:] - nans[:-window]) > 0
+
+        mean[lo:hi] = np.where(invalid, np.nan, dev_mean + ref)
+        if with_std and window > 1:
+            squares = np.concatenate(([0.0], np.cumsum(dev * dev)))
+            var = (squares[window:] - squares[:-window]
+                   - window * dev_mean * dev_mean) / (window - 1)
+            std[lo:hi] = np.where(invalid, np.nan,
+                                  np.sqrt(np.maximum(var, 0.0)))
+    return mean, std
+
+
+def rolling_mean(x: np.ndarray, window: int):
+    return rolling_moments(x, window, with_std=False)[0]
+
+
+def shift(x: np.ndarray, n: int):
+    out = np.full(len(x), np.nan)
+    if n < len(x):
+        out[n:] = x[:len(x) - n]
+    return out
+
+
+# ------------------------------------------------------------------------------
+# Moving average kernels
+#
+# Single pass kernels over a close array. NaNs after the first valid value are
+# forward filled, so gaps hold the last price instead of breaking the average.
+
+def _forward_fill(x: np.ndarray, last: float = math.nan):
+    nan = np.isnan(x)
+    if not nan.any():
+        return x
+    idx = np.where(nan, 0, np.arange(len(x)))
+    np.maximum.accumulate(idx, out=idx)
+    filled = x[idx]
+    if nan[0] and not math.isnan(last):
+        filled = np.where(np.isnan(filled), last, filled)
+    return filled
+
+
+# Exponential moving average y[t] = alpha * x[t] + (1 - alpha) * y[t - 1],
+# alpha = 2 / (span + 1), seeded with `last` (the state of a previous call) or
+# the first valid value; equal to pandas ewm(span, adjust=False). Evaluated
+# block wise in closed form,
+#   y[t] = w^(t+1) * (y[-1] + alpha * sum_k<=t x[k] * w^-(k+1)),  w = 1 - alpha,
+# with blocks short enough for w^-k to stay finite.
+def ema(x: np.ndarray, span: float, last: float = math.nan):
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    alpha = 2.0 / (span + 1)
+    w = 1.0 - alpha
+
+    start = 0
+    if math.isnan(last):
+        valid = np.flatnonzero(~np.isnan(x))
+        if not len(valid):
+            return out
+        start = valid[0]
+        last = x[start]
+    xs = _forward_fill(x[start:], last)
+    if w <= 0.0:
+        out[start:] = xs
+        return out
+
+    block = max(1, int(600 / -math.log(w)))
+    powers = w ** -np.arange(1, min(block, len(xs)) + 1, dtype=np.float64)
+    for lo in range(0, len(xs), block):
+        segment = xs[lo:lo + block]
+        p = powers[:len(segment)]
+        y = (last + alpha * np.cumsum(segment * p)) / p
+        out[start + lo:start + lo + len(segment)] = y
+        last = y[-1]
+    return out
+
+
+# Linearly weighted moving average, the newest value weighs `window`. Uses
+# the same mean offset chunking as rolling_moments to keep the weighted
+# cumulative sums small.
+def wma(x: np.ndarray, window: int):
+    out = np.full(len(x), np.nan)
+    denominator = window * (window + 1) / 2
+    for lo in range(window - 1, len(x), _ROLLING_CHUNK):
+        hi = min(lo + _ROLLING_CHUNK, len(x))
+        segment = x[lo - window + 1:hi]
+        nan = np.isnan(segment)
+        ref = segment[~nan].mean() if not nan.all() else 0.0
+        dev = np.where(nan, 0.0, segment - ref)
+        j = np.arange(1, len(segment) + 1, dtype=np.float64)
+
+        sums = np.concatenate(([0.0], np.cumsum(dev)))
+        weighted = np.concatenate(([0.0], np.cumsum(j * dev)))
+        nans = np.concatenate(([0], np.cumsum(nan)))
+        offset = np.arange(len(segment) - window + 1, dtype=np.float64)
+        numerator = (weighted[window:] - weighted[:-window]
+                     - offset * (sums[window:] - sums[:-window]))
+        invalid = (nans[window:] - nans[:-window]) > 0
+        out[lo:hi] = np.where(invalid, np.nan, ref + numerator / denominator)
+    return out
+
+
+# Streaming state of one exponential moving average
+class EMAState:
+    def __init__(self, span: float):
+        self.alpha = 2.0 / (span + 1)
+        self.span = span
+        self.last = math.nan
+        self._last_x = math.nan
+
+    def update(self, x: float):
+        if math.isnan(x):
+            x = self._last_x
+        if math.isnan(x):
+            return math.nan
+        self._last_x = x
+        if math.isnan(self.last):
+            self.last = x
+        else:
+            self.last = self.alpha * x + (1 - self.alpha) * self.last
+        return self.last
+
+    def extend(self, x: np.ndarray):
+        x = _forward_fill(np.asarray(x, dtype=np.float64), self._last_x)
+        out = ema(x, self.span, self.last)
+        if len(x) and not np.isnan(out[-1]):
+            self.last = out[-1]
+            self._last_x = x[-1]
+        return out
+
+
+class _Intermediates:
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self._cache = {}
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def column(self, name):
+        return self.arrays[name]
+
+    def typical_price(self):
+        return self._get("tp", lambda: (self.arrays["high"]
+                                        + self.arrays["low"]
+                                        + self.arrays["close"]) / 3)
+
+    def hl_range(self):
+        return self._get("hl", lambda: self.arrays["high"]
+                         - self.arrays["low"])
+
+    def source(self, name):
+        return self.typical_price() if name == "tp" else self.column(name)
+
+    # mean and std of a window come out of the same pass
+    def moments(self, source: str, window: int):
+        return self._get(("moments", source, window),
+                         lambda: rolling_moments(self.source(source), window))
+
+    def mean(self, source: str, window: int):
+        if ("moments", source, window) in self._cache:
+            return self.moments(source, window)[0]
+        return self._get(("mean", source, window),
+                         lambda: rolling_mean(self.source(source), window))
+
+    def std(self, source: str, window: int):
+        return self.moments(source, window)[1]
+
+    def ema(self, source: str, span: float):
+        return self._get(("ema", source, span),
+                         lambda: ema(self.source(source), span))
+
+    def money_flow_volume(self):
+        return self._get("mfv", lambda: money_flow_volume(self.arrays))
+
+    def close_diff(self, n: int):
+        return self._get(("diff", n), lambda: self.arrays["close"]
+                         - shift(self.arrays["close"], n))
+
+
+# Close location value ((c - l) - (h - c)) / (h - l) times volume, the
+# increment of the accumulation/distribution line; bars without a range or
+# with a NaN add nothing
+def money_flow_volume(arrays: dict):
+    h, l, c = arrays["high"], arrays["low"], arrays["close"]
+    flow = _divide((c - l) - (h - c), h - l) * arrays["volume"]
+    return np.where(np.isfinite(flow), flow, 0.0)
+
+
+def _divide(num, den):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return num / den
+
+
+def _moving_average(im, window):
+    return {"ma": im.mean("close", window)}
+
+
+def _e_moving_average(im, span):
+    return {"ema": im.ema("close", span)}
+
+
+def _w_moving_average(im, window):
+    return {"wma": wma(im.column("close"), window)}
+
+
+def _de_moving_average(im, span):
+    first = im.ema("close", span)
+    return {"dema": 2 * first - ema(first, span)}
+
+
+def _bollinger(im, window_size, num_of_std):
+    mean = im.mean("close", window_size)
+    band = im.std("close", window_size) * num_of_std
+    return {"upper": mean + band, "mean": mean, "lower": mean - band}
+
+
+def _accumulation(im, initial=0.0):
+    return {"accumulation": initial + np.cumsum(im.money_flow_volume())}
+
+
+def _cci(im, n_days):
+    return {"cci": _divide(im.typical_price() - im.mean("tp", n_days),
+                           0.015 * im.std("tp", n_days))}
+
+
+def _roc(im, n_days):
+    return {"roc": _divide(im.close_diff(n_days),
+                           shift(im.column("close"), n_days))}
+
+
+def _stoc(im):
+    return {"so_k": _divide(im.column("close") - im.column("low"),
+                            im.hl_range())}
+
+
+def _mom(im, n):
+    return {"mom": im.close_diff(n)}
+
+
+def _pp(im):
+    pp, h, l = im.typical_price(), im.column("high"), im.column("low")
+    return {"pp": pp,
+            "r1": 2 * pp - l,
+            "s1": 2 * pp - h,
+            "r2": pp + h - l,
+            "s2": pp - h + l,
+            "r3": h + 2 * (pp - l),
+            "s3": l - 2 * (h - pp)}
+
+
+_BATCH_STUDIES = {
+    "moving_average": _moving_average,
+    "e_moving_average": _e_moving_average,
+    "w_moving_average": _w_moving_average,
+    "de_moving_average": _de_moving_average,
+    "bollinger": _bollinger,
+    "accumulation": _accumulation,
+    "cci": _cci,
+    "roc": _roc,
+    "stoc": _stoc,
+    "mom": _mom,
+    "pp": _pp,
+}
+
+CUMULATIVE_STUDIES["accumulation"] = money_flow_volume
+
+
+# Adds a study to the batch computation; fn(intermediates, **params) returns
+# a dict of output name -> array
+def register_study(name: str, fn, defaults: dict = None):
+    _BATCH_STUDIES[name] = fn
+    STUDY_DEFAULTS[name] = dict(defaults or {})
+
+
+# studies: iterable of study names or (name, params) tuples
+def compute_batch(arrays: dict, studies):
+    im = _Intermediates({k: readonly(v) for k, v in arrays.items()})
+    results = {}
+    for study in studies:
+        name, params = study if isinstance(study, tuple) else (study, {})
+        params = {**study_defaults(name), **(params or {})}
+        for output, values in _BATCH_STUDIES[name](im, **params).items():
+            results[name + "." + output] = readonly(values)
+    return results
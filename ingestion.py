@@ -0,0 +1,333 @@
+#! -*- coding: utf-8 -*-
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+
+import numpy as np
+
+import tick_store
+
+
+# ------------------------------------------------------------------------------
+# Background ingestion of Alpha Vantage intraday bars
+#
+# Fetches many tickers concurrently while a token bucket keeps the calls within
+# the API budget, retries with exponential backoff on throttling, server and
+# network errors (a client error such as a bad key or symbol fails at once),
+# and appends only bars newer than the stored ones. Every append bumps
+# the data version of the ticker in the store, which is what the Dash app keys
+# its caches on; an optional on_update(ticker, version) callback is called as
+# well. Appends may run in the process serving the charts: the store writes
+# the rows before the headers counting them and meta.json last, and readers
+# trim every column to one meta.json and open again what a rewrite changed
+# under them (see tick_store and ticker_manager).
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+# free tier budget
+CALLS_PER_MINUTE = 5
+
+SERIES_KEY = "Time Series ({})"
+
+
+class RateLimited(Exception):
+    pass
+
+
+class ApiError(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1):
+        # tokens per second
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Turns an intraday payload into sorted dates and store columns
+def parse_intraday(payload: dict, interval: str = "1min"):
+    if "Error Message" in payload:
+        raise ApiError(payload["Error Message"])
+    if "Note" in payload or "Information" in payload:
+        raise RateLimited(payload.get("Note") or payload.get("Information"))
+    series = payload.get(SERIES_KEY.format(interval))
+    if series is None:
+        raise ApiError("no intraday series in response")
+
+    stamps = sorted(series)
+    dates = np.array(stamps, dtype="datetime64[ns]")
+    columns = {column: np.array([float(series[s][key]) for s in stamps])
+               for key, column in tick_store.CSV_COLUMNS.items()}
+    return dates, columns
+
+
+# Throttling (429) and server errors may pass, other HTTP errors are answered
+# the same way again
+def _retryable(error: Exception):
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return True
+
+
+class IngestionService:
+    def __init__(self, tickers, api_key: str, base_url: str = ALPHA_VANTAGE_URL,
+                 calls_per_minute: float = CALLS_PER_MINUTE,
+                 max_retries: int = 5, backoff: float = 2.0,
+                 max_backoff: float = 120.0, poll_seconds: float = 60.0,
+                 interval: str = "1min", timeout: float = 30.0,
+                 store_dir: str = tick_store.STORE_DIR, on_update=None):
+        self.tickers = [t.upper() for t in tickers]
+        self.api_key = api_key
+        self.base_url = base_url
+        self.calls_per_minute = calls_per_minute
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_seconds = poll_seconds
+        self.interval = interval
+        self.timeout = timeout
+        self.store_dir = store_dir
+        self.on_update = on_update
+        self.stats = {"requests": 0, "retries": 0, "failures": 0,
+                      "appended_bars": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _url(self, ticker: str, outputsize: str):
+        query = urllib.parse.urlencode({"function": "TIME_SERIES_INTRADAY",
+                                        "symbol": ticker,
+                                        "interval": self.interval,
+                                        "outputsize": outputsize,
+                                        "apikey": self.api_key})
+        return self.base_url + "?" + query
+
+    def _get(self, url: str):
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    async def fetch(self, ticker: str, bucket: TokenBucket):
+        # a ticker new to the store gets its full history, others the latest
+        # bars only
+        outputsize = ("compact" if tick_store.has_ticker(ticker, self.store_dir)
+                      else "full")
+        url = self._url(ticker, outputsize)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            self.stats["requests"] += 1
+            try:
+                payload = await asyncio.to_thread(self._get, url)
+                return parse_intraday(payload, self.interval)
+            except (RateLimited, urllib.error.URLError, TimeoutError,
+                    ConnectionError, json.JSONDecodeError) as error:
+                if attempt == self.max_retries or not _retryable(error):
+                    raise
+                self.stats["retries"] += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+    async def ingest(self, ticker: str, bucket: TokenBucket):
+        dates, columns = await self.fetch(ticker, bucket)
+        appended = await asyncio.to_thread(tick_store.append_columns, ticker,
+                                           dates, columns, self.store_dir)
+        if appended:
+            self.stats["appended_bars"] += appended
+            if self.on_update is not None:
+                self.on_update(ticker,
+                               tick_store.data_version(ticker, self.store_dir))
+        return appended
+
+    # One round over all tickers, returns ticker -> appended bars (or the
+    # exception that ended its retries)
+    async def run_once(self, bucket: TokenBucket = None):
+        if bucket is None:
+            bucket = TokenBucket(self.calls_per_minute / 60)
+        results = await asyncio.gather(
+            *(self.ingest(ticker, bucket) for ticker in self.tickers),
+            return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.stats["failures"] += 1
+        return dict(zip(self.tickers, results))
+
+    async def run_forever(self):
+        bucket = TokenBucket(self.calls_per_minute / 60)
+        while not self._stop.is_set():
+            started = time.monotonic()
+            await self.run_once(bucket)
+            remaining = self.poll_seconds - (time.monotonic() - started)
+            while remaining > 0 and not self._stop.is_set():
+                await asyncio.sleep(min(remaining, 1.0))
+                remaining -= 1.0
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self.run_forever()),
+            name="ingestion", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+# ------------------------------------------------------------------------------
+# Local stand-in for the Alpha Vantage API
+#
+# Serves TIME_SERIES_INTRADAY payloads of a deterministic price path per symbol
+# up to the current minute, and answers with the API's throttling note once its
+# own call budget is spent, so the service can be exercised offline.
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = dict(urllib.parse.parse_qsl(
+            urllib.parse.urlparse(self.path).query))
+        payload = self.server.respond(query)
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubAlphaVantageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, calls_per_minute: float = None,
+                 full_bars: int = 5000, compact_bars: int = 100):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.calls_per_minute = calls_per_minute
+        self.full_bars = full_bars
+        self.compact_bars = compact_bars
+        self.calls = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/query".format(self.server_address[1])
+
+    def _throttled(self):
+        with self._lock:
+            self.calls += 1
+            if self.calls_per_minute is None:
+                return False
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 60]
+            if len(self._window) >= self.calls_per_minute:
+                return True
+            self._window.append(now)
+            return False
+
+    def respond(self, query: dict):
+        if self._throttled():
+            return {"Note": "Thank you for using Alpha Vantage! Our standard "
+                            "API call frequency is {} calls per minute."
+                    .format(self.calls_per_minute)}
+        symbol = query.get("symbol", "").upper()
+        interval = query.get("interval", "1min")
+        if not symbol or query.get("function") != "TIME_SERIES_INTRADAY":
+            return {"Error Message": "Invalid API call."}
+
+        bars = (self.full_bars if query.get("outputsize") == "full"
+                else self.compact_bars)
+        end = datetime.now().replace(second=0, microsecond=0)
+        series = {}
+        for i in range(bars, 0, -1):
+            stamp = end - timedelta(minutes=i - 1)
+            open_, close = (_stub_price(symbol, stamp - timedelta(minutes=1)),
+                            _stub_price(symbol, stamp))
+            rng = random.Random(zlib.crc32((symbol + str(stamp)).encode()))
+            series[stamp.strftime("%Y-%m-%d %H:%M:%S")] = {
+                "1. open": "{:.4f}".format(open_),
+                "2. high": "{:.4f}".format(max(open_, close)
+                                           * (1 + rng.random() * 0.001)),
+                "3. low": "{:.4f}".format(min(open_, close)
+                                          * (1 - rng.random() * 0.001)),
+                "4. close": "{:.4f}".format(close),
+                "5. volume": str(rng.randint(100, 10000))}
+        return {"Meta Data": {"2. Symbol": symbol, "4. Interval": interval},
+                SERIES_KEY.format(interval): series}
+
+
+# Price of a symbol at a minute, a pure function of both so that repeated
+# calls agree on the bars they have in common
+def _stub_price(symbol: str, stamp: datetime):
+    seed = zlib.crc32(symbol.encode())
+    minutes = stamp.timestamp() / 60
+    noise = random.Random(seed ^ int(minutes)).gauss(0, 0.001)
+    return (100.0 + seed % 400) * (1 + 0.05 * np.sin(minutes / 997 + seed)
+                                   + 0.01 * np.sin(minutes / 61) + noise)
+
+
+def start_stub_server(port: int = 0, calls_per_minute: float = None):
+    server = StubAlphaVantageServer(port, calls_per_minute)
+    threading.Thread(target=server.serve_forever, name="alpha-vantage-stub",
+                     daemon=True).start()
+    return server
+
+
+def load_api_key(path: str = "assets_private/appconfig.json"):
+    with open(path, "r") as f:
+        return json.load(f)["vantage_api_key"]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest Alpha Vantage bars")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--calls-per-minute", type=float,
+                        default=CALLS_PER_MINUTE)
+    parser.add_argument("--poll-seconds", type=float, default=60.0)
+    parser.add_argument("--once", action="store_true",
+                        help="fetch every ticker once and exit")
+    parser.add_argument("--stub", action="store_true",
+                        help="fetch from a local stand-in of the API")
+    args = parser.parse_args()
+
+    if args.stub:
+        stub = start_stub_server(calls_per_minute=args.calls_per_minute)
+        base_url, api_key = stub.url, "stub"
+    else:
+        base_url, api_key = ALPHA_VANTAGE_URL, load_api_key()
+
+    service = IngestionService(
+        args.tickers, api_key, base_url=base_url,
+        calls_per_minute=args.calls_per_minute,
+        poll_seconds=args.poll_seconds,
+        on_update=lambda ticker, version: print(ticker, "->", version))
+    if args.once:
+        print(asyncio.run(service.run_once()))
+    else:
+        asyncio.run(service.run_forever())
@@ -0,0 +1,187 @@
+from collections import deque
+from contextlib import nullcontext
+import os
+import threading
+import time
+
+import numpy as np
+
+
+# ------------------------------------------------------------------------------
+# Hot path instrumentation
+#
+# A callback opens a record, the figure pipeline times its stages (slicing,
+# studies, subplots, traces, serialization, ...) and counts rows, points and
+# payload bytes into whatever record is open on its thread. Finished records go
+# to an in-process ring buffer, which the debug panel of the app reads, and into
+# running totals exported as Prometheus text at /metrics.
+#
+# Disabled unless FIGURE_TIMINGS is set (or enable() is called): stage() and
+# record() then hand out one shared no-op context and count() returns at once.
+RING_SIZE = 512
+
+_enabled = os.environ.get("FIGURE_TIMINGS", "") not in ("", "0")
+_local = threading.local()
+_NULL = nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+class Record:
+    __slots__ = ("name", "started", "seconds", "stages", "counts")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.seconds = 0.0
+        self.stages = {}
+        self.counts = {}
+
+    def as_dict(self):
+        return {"name": self.name, "started": self.started,
+                "ms": self.seconds * 1e3,
+                "stages_ms": {k: v * 1e3 for k, v in self.stages.items()},
+                "counts": dict(self.counts)}
+
+
+class Recorder:
+    def __init__(self, size: int = RING_SIZE):
+        self._ring = deque(maxlen=size)
+        # cumulative since start, keyed by (record, stage) and (record, count)
+        self._seconds = {}
+        self._calls = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: Record):
+        with self._lock:
+            self._ring.append(record)
+            for stage, seconds in [("total", record.seconds),
+                                   *record.stages.items()]:
+                key = (record.name, stage)
+                self._seconds[key] = self._seconds.get(key, 0.0) + seconds
+                self._calls[key] = self._calls.get(key, 0) + 1
+            for name, value in record.counts.items():
+                key = (record.name, name)
+                self._counts[key] = self._counts.get(key, 0) + value
+
+    def recent(self, n: int = None):
+        with self._lock:
+            records = list(self._ring)
+        return records if n is None else records[-n:]
+
+    def clear(self):
+        with self._lock:
+            self._ring.clear()
+            self._seconds.clear()
+            self._calls.clear()
+            self._counts.clear()
+
+    # Prometheus text exposition: a summary per stage with quantiles over the
+    # ring buffer and running sums, and the running count totals
+    def prometheus(self):
+        records = self.recent()
+        with self._lock:
+            seconds = dict(self._seconds)
+            calls = dict(self._calls)
+            counts = dict(self._counts)
+
+        samples = {}
+        for record in records:
+            samples.setdefault((record.name, "total"), []).append(
+                record.seconds)
+            for stage, value in record.stages.items():
+                samples.setdefault((record.name, stage), []).append(value)
+
+        lines = ["# HELP figure_stage_seconds Time spent per stage of a "
+                 "chart callback",
+                 "# TYPE figure_stage_seconds summary"]
+        for (name, stage), total in sorted(seconds.items()):
+            labels = 'callback="{}",stage="{}"'.format(name, stage)
+            values = samples.get((name, stage))
+            if values:
+                for q in (0.5, 0.9, 0.99):
+                    lines.append('figure_stage_seconds{{{},quantile="{}"}} {:.6f}'
+                                 .format(labels, q, np.quantile(values, q)))
+            lines.append("figure_stage_seconds_sum{{{}}} {:.6f}".format(
+                labels, total))
+            lines.append("figure_stage_seconds_count{{{}}} {}".format(
+                labels, calls[(name, stage)]))
+
+        lines += ["# HELP figure_items_total Rows, points and bytes handled "
+                  "by chart callbacks",
+                  "# TYPE figure_items_total counter"]
+        for (name, item), total in sorted(counts.items()):
+            lines.append('figure_items_total{{callback="{}",item="{}"}} {}'
+                         .format(name, item, total))
+        return "\n".join(lines) + "\n"
+
+
+recorder = Recorder()
+
+
+class _RecordContext:
+    def __init__(self, name: str):
+        self.record = Record(name)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        _local.record = self.record
+        return self.record
+
+    def __exit__(self, *exc):
+        self.record.seconds = time.perf_counter() - self._started
+        _local.record = None
+        recorder.add(self.record)
+        return False
+
+
+class _StageContext:
+    def __init__(self, record: Record, name: str):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        stages = self.record.stages
+        stages[self.name] = (stages.get(self.name, 0.0)
+                             + time.perf_counter() - self._started)
+        return False
+
+
+def _current():
+    return getattr(_local, "record", None)
+
+
+# Records a callback; records opened inside another one are folded into it
+def record(name: str):
+    if not _enabled or _current() is not None:
+        return _NULL
+    return _RecordContext(name)
+
+
+# Times a stage into the open record, stages of the same name add up
+def stage(name: str):
+    if not _enabled:
+        return _NULL
+    current = _current()
+    if current is None:
+        return _NULL
+    return _StageContext(current, name)
+
+
+def count(name: str, value):
+    if not _enabled:
+        return
+    current = _current()
+    if current is not None:
+        current.counts[name] = current.counts.get(name, 0) + value
@@ -0,0 +1,137 @@
+import instrumentation
+import tick_store
+import time_index
+from figure_pipeline import render_frame
+from indicators import engine
+from study_cache import study_cache
+from ticker_manager import tickers
+from trace_registry import CHART, plan_render
+
+
+# ------------------------------------------------------------------------------
+# Live chart updates
+#
+# Instead of rebuilding a figure on every tick, only the bars appended to the
+# store since the figure was sent are rendered, together with the tail values
+# of its studies, and handed to dcc.Graph as extendData. The study values come
+# from the incremental indicator engine (indicators.engine), which keeps the
+# state of every study at the end of the store. The browser drops the oldest
+# points once a trace holds max_points, so a tick costs O(new bars) on both
+# sides.
+#
+# Figures which cannot be extended (drawn from a rollup, decimated, or of a
+# store rewritten since) are rendered again as a whole, through the figure
+# caches, once the store version of their ticker moves past the one they show.
+#
+# A figure carries what is needed to extend it in layout.meta (see
+# figure_pipeline.build_figure). The callbacks keep it next to the graph with a
+# revision of their own, since cached figures are sent more than once, and the
+# cursor: the store row the figure was extended up to and, once the figure
+# was rendered again, the meta of the new figure.
+
+# trace attributes holding one value per bar
+DATA_ATTRIBUTES = ("x", "y", "open", "high", "low", "close")
+
+
+# Returns the cursor a freshly rendered figure starts at
+def live_cursor(meta: dict):
+    if not meta or not meta.get("live"):
+        return None
+    return {"revision": meta["revision"], "row": meta["row"]}
+
+
+# Meta of the figure shown: the one it was sent with or, once the figure was
+# rendered again, the one of the new figure
+def shown_meta(meta: dict, cursor: dict):
+    if meta and cursor and cursor.get("revision") == meta.get("revision") \
+            and "meta" in cursor:
+        return cursor["meta"]
+    return meta
+
+
+# Returns (extendData or None, cursor) for the bars the store got past the
+# cursor. Figures which cannot be extended (rollup resolutions, decimated
+# figures, a rewritten store or a changed plan) are left to refresh().
+def extend_data(meta: dict, cursor: dict, max_points: int,
+                store_dir: str = tick_store.STORE_DIR):
+    if not meta:
+        return None, cursor
+    if cursor is None or cursor.get("revision") != meta["revision"]:
+        cursor = live_cursor(meta)
+    meta = shown_meta(meta, cursor)
+    if not meta.get("live"):
+        return None, cursor
+    with tickers.pinned():
+        return _extend_data(meta, cursor, max_points, store_dir)
+
+
+def _extend_data(meta, cursor, max_points, store_dir):
+    ticker = meta["ticker"]
+    if tickers.meta(ticker, store_dir).get("base_version") \
+            != meta["base_version"]:
+        return None, cursor
+    rows = len(time_index.get_time_index(ticker, store_dir,
+                                         meta["resolution"]))
+    if rows <= cursor["row"]:
+        return None, cursor
+
+    plan = plan_render(meta["chart_type"], meta["studies"],
+                       meta["study_params"])
+    lo = cursor["row"]
+    dff = time_index.read_rows(ticker, lo, rows, plan.columns,
+                               resolution=meta["resolution"])
+    # the engine follows the end of the store bar by bar, studies it has no
+    # indicator for are computed with their warm-up
+    with instrumentation.stage("studies"):
+        values = engine.study_values(
+            ticker, [(d.study, p) for d, p in plan.studies
+                     if engine.supports(d.study)], lo, rows)
+        others = plan.restricted([s for s in plan.segments
+                                  if s[0].placement == CHART
+                                  or not engine.supports(s[0].study)])
+        if others.studies:
+            values.update(study_cache.study_values(
+                ticker, meta["resolution"], others, lo, rows))
+    tail = [trace for traces in render_frame(plan, dff, values)
+            for trace in traces]
+    if len(tail) != meta["traces"]:
+        return None, cursor
+
+    # one update per set of attributes, extendTraces needs every attribute on
+    # every trace it extends
+    groups = {}
+    for i, data in enumerate(tail):
+        attributes = tuple(a for a in DATA_ATTRIBUTES if data.get(a) is not None)
+        groups.setdefault(attributes, []).append((i, data))
+    update = []
+    for attributes, traces in groups.items():
+        if not attributes:
+            continue
+        update.append([{a: [data[a] for _, data in traces] for a in attributes},
+                       [i for i, _ in traces], max_points])
+    return update, {**cursor, "row": rows}
+
+
+# Returns (figure patch or None, cursor) for a figure extend_data leaves
+# alone, rendered again by render(meta) once the store version of its ticker
+# moved on. The cursor then carries the meta of the new figure, with the
+# revision of the one sent.
+def refresh(meta: dict, cursor: dict, render,
+            store_dir: str = tick_store.STORE_DIR):
+    shown = shown_meta(meta, cursor)
+    if not shown or not tick_store.has_ticker(shown["ticker"], store_dir):
+        return None, cursor
+    with tickers.pinned():
+        current = tickers.meta(shown["ticker"], store_dir)
+        if current["version"] == shown.get("version"):
+            return None, cursor
+        if shown.get("live") and \
+                current.get("base_version") == shown["base_version"]:
+            return None, cursor
+        fig = render(shown)
+    new = fig["layout"].get("meta")
+    if not new:
+        return {"figure": fig}, None
+    new = {**new, "revision": meta["revision"]}
+    return {"figure": fig}, {"revision": meta["revision"], "row": new["row"],
+                             "meta": new}
@@ -0,0 +1,156 @@
+from collections import deque
+import json
+import threading
+import time
+
+import flask
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # falls back to plotly's encoder
+    orjson = None
+
+import instrumentation
+
+
+# ------------------------------------------------------------------------------
+# Figure serialization
+#
+# Dash JSON-encodes callback outputs with plotly's encoder, which validates
+# every go.Figure again, converts each array element by element and encodes
+# the whole response twice once it contains a NaN. The figure pipeline instead
+# caches figures as dicts of plain JSON values, encoded once per build: all
+# arrays of a figure go through orjson in one call (NaN becomes null, float32
+# keeps its short repr, dates become ISO strings), so a cache hit is only a
+# json.dumps of lists and strings. Float arrays are written at float32
+# precision (the precision of the stored prices, far below a pixel), which
+# halves the time Dash spends printing them. Plain lists keep the figures
+# extendable by extendData, which typed-array (base64) payloads are not.
+
+_ORJSON_OPTIONS = 0 if orjson is None else orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        # orjson serializes C-contiguous arrays of numbers and dates only
+        if obj.dtype.kind in "biufM" and not obj.flags.c_contiguous:
+            return np.ascontiguousarray(obj)
+        return obj.tolist()
+    if hasattr(obj, "to_numpy"):
+        return obj.to_numpy()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError
+
+
+def _single(value):
+    if isinstance(value, np.ndarray) and value.dtype == np.float64:
+        return value.astype(np.float32)
+    return value
+
+
+# Encodes traces on their own, for figures assembled from the traces and a
+# layout encoded once (see figure_pipeline)
+def encode_traces(traces):
+    with instrumentation.stage("encode"):
+        started = time.perf_counter()
+        encoded = _plain(_trace_payload(traces))
+        _add_encode_time(time.perf_counter() - started)
+        return encoded
+
+
+def encode_layout(layout):
+    return _plain(layout.to_plotly_json())
+
+
+def _trace_payload(traces):
+    return [{k: _single(v) for k, v in trace.to_plotly_json().items()}
+            for trace in traces]
+
+
+def _plain(payload):
+    if orjson is not None:
+        return orjson.loads(orjson.dumps(payload, default=_default,
+                                         option=_ORJSON_OPTIONS))
+    return json.loads(json.dumps(payload, cls=PlotlyJSONEncoder))
+
+
+# ------------------------------------------------------------------------------
+# Per request report
+#
+# Every callback response carries its encode time, total time and payload
+# size in a Server-Timing and an X-Payload-Bytes header (bytes before and after
+# compression); the recent ones are summarised at /stats/serialization.
+CALLBACK_PATH = "/_dash-update-component"
+
+
+def _add_encode_time(seconds: float):
+    if flask.has_request_context():
+        flask.g.encode_seconds = flask.g.get("encode_seconds", 0.0) + seconds
+
+
+class SerializationStats:
+    def __init__(self, max_records: int = 256):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, record: dict):
+        with self._lock:
+            self._records.append(record)
+
+    def stats(self):
+        with self._lock:
+            records = list(self._records)
+        summary = {"requests": len(records)}
+        for field in ("encode_ms", "total_ms", "bytes", "sent_bytes"):
+            values = [r[field] for r in records]
+            summary[field] = {"mean": float(np.mean(values)) if values else 0.0,
+                              "max": max(values, default=0)}
+        summary["recent"] = records[-20:]
+        return summary
+
+
+serialization_stats = SerializationStats()
+
+
+# Hooks the report into the Flask server of a Dash app (after the app has
+# installed its response compression)
+def instrument(server: flask.Flask):
+    @server.before_request
+    def _start_timer():
+        flask.g.request_started = time.perf_counter()
+
+    # runs before the compression
+    def _payload_size(response):
+        if flask.request.path == CALLBACK_PATH and not response.direct_passthrough:
+            flask.g.payload_bytes = response.calculate_content_length() or 0
+        return response
+
+    # runs after the compression
+    def _report(response):
+        if flask.request.path != CALLBACK_PATH or \
+                "request_started" not in flask.g:
+            return response
+        record = {
+            "encode_ms": flask.g.get("encode_seconds", 0.0) * 1e3,
+            "total_ms": (time.perf_counter() - flask.g.request_started) * 1e3,
+            "bytes": flask.g.get("payload_bytes", 0),
+            "sent_bytes": response.calculate_content_length() or 0,
+        }
+        serialization_stats.record(record)
+        response.headers["Server-Timing"] = \
+            "encode;dur={encode_ms:.2f}, total;dur={total_ms:.2f}".format(
+                **record)
+        response.headers["X-Payload-Bytes"] = "{bytes}/{sent_bytes}".format(
+            **record)
+        return response
+
+    server.after_request(_payload_size)
+    # after_request functions run in reverse order of registration
+    server.after_request_funcs.setdefault(None, []).insert(0, _report)
+
+    @server.route("/stats/serialization")
+    def serialization_report():
+        return flask.jsonify(serialization_stats.stats())
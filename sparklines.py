@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import tick_store
+import time_index
+from downsampling import lttb_indices
+from ticker_manager import tickers
+from trading_calendar import get_calendar
+
+
+# ------------------------------------------------------------------------------
+# Sparklines of the favorites board
+#
+# A favorite thumbnail is a single line of closes without axes, so instead of
+# going through make_subplots and plotly's validation it is written directly as
+# the figure dict Dash sends: one LTTB decimated trace of plain lists (dates as
+# epoch milliseconds) and a fixed layout. The day trend next to it is read from
+# the same mapped columns of the ticker manager.
+
+SPARKLINE_MAX_POINTS = 300
+
+# line_trace look of the favorites
+SPARKLINE_LAYOUT = {
+    "uirevision": "The User is always right",
+    "margin": {"t": 50, "l": 50, "b": 50, "r": 25},
+    "autosize": True,
+    "showlegend": False,
+    "paper_bgcolor": "#21252C",
+    "plot_bgcolor": "#21252C",
+    "xaxis": {"type": "date", "visible": False, "autorange": True},
+    "yaxis": {"visible": False, "autorange": True},
+}
+
+
+def _plain(values: np.ndarray):
+    values = np.asarray(values, dtype=np.float64)
+    nan = np.isnan(values)
+    if nan.any():
+        return [None if n else v for n, v in zip(nan, values.tolist())]
+    return values.tolist()
+
+
+def _epoch_ms(dates: np.ndarray):
+    return dates.astype("datetime64[ms]").astype(np.int64).tolist()
+
+
+# Figure dict of the closes of the last `period` hours
+def sparkline_figure(ticker: str, period: int, now: datetime = None,
+                     max_points: int = SPARKLINE_MAX_POINTS):
+    now = datetime.now() if now is None else now
+    start = None if period is None else now - timedelta(hours=period)
+    resolution = time_index.select_resolution(ticker, start, now, max_points)
+    data = tickers.get(ticker, resolution=resolution)
+    index = time_index.get_time_index(ticker, resolution=resolution)
+    lo, hi = index.period_positions(period, now)
+
+    close = index.view(data.columns["close"], lo, hi)
+    dates = index.date_view(lo, hi)
+    keep = lttb_indices(close, max_points)
+    trace = {"type": "scatter", "mode": "lines", "name": "Line",
+             "x": _epoch_ms(dates[keep]),
+             "y": _plain(close[keep]),
+             "line": {"width": 0.6}}
+
+    # what live_updates needs to extend the line, see build_figure
+    store = tickers.meta(ticker)
+    meta = {"ticker": ticker,
+            "chart_type": "line_trace",
+            "studies": [],
+            "study_params": {},
+            "period": period,
+            "resolution": resolution,
+            "row": hi,
+            "version": store["version"],
+            "base_version": store.get("base_version"),
+            "traces": 1,
+            "live": (resolution == tick_store.BASE_RESOLUTION
+                     and hi == len(index))}
+    rangebreaks = get_calendar(ticker).rangebreaks(
+        dates[0] if hi > lo else None, dates[-1] if hi > lo else None,
+        resolution)
+    return {"data": [trace],
+            "layout": {**SPARKLINE_LAYOUT,
+                       "xaxis": {**SPARKLINE_LAYOUT["xaxis"],
+                                 "rangebreaks": rangebreaks},
+                       "meta": meta}}
+
+
+# Change of the close over the day up to the last bar, in percent. Missing
+# closes (NaN) are skipped: the trend runs from the last close a day before
+# the last close, or from the first close, and is None without both.
+def day_trend(ticker: str):
+    with tickers.pinned():
+        data = tickers.get(ticker)
+        index = time_index.get_time_index(ticker)
+        close = data.columns["close"]
+        last = _valid_row(index, close, 0, len(index), last=True)
+        if last is None:
+            return None
+        _, before = index.range_positions(
+            None, index.date_view(last, last + 1)[0] - np.timedelta64(1, "D"))
+        first = _valid_row(index, close, 0, before, last=True) \
+            if before else _valid_row(index, close, 0, last, last=False)
+        if first is None:
+            return None
+        first_close, last_close = (index.view(close, row, row + 1)[0]
+                                   for row in (first, last))
+        if not first_close:
+            return None
+        return float(last_close / first_close - 1) * 100
+
+
+# rows of a close column read at once when looking for one which is not NaN
+_SCAN_ROWS = 1024
+
+
+# Row of the last (or first) close in [lo, hi) which is not NaN, None when
+# there is none. Reads blocks from that end, a few missing bars read a few rows.
+def _valid_row(index, close: np.ndarray, lo: int, hi: int, last: bool):
+    while lo < hi:
+        start, end = ((max(hi - _SCAN_ROWS, lo), hi) if last
+                      else (lo, min(lo + _SCAN_ROWS, hi)))
+        valid = np.flatnonzero(~np.isnan(index.view(close, start, end)))
+        if len(valid):
+            return start + int(valid[-1] if last else valid[0])
+        if last:
+            hi = start
+        else:
+            lo = end
+    return None
+
+
+def format_trend(trend: float):
+    return "" if trend is None else "{:+.1f}%".format(trend)
@@ -0,0 +1,209 @@
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+import tick_store
+import time_index
+from indicators import (CUMULATIVE_STUDIES, RECURSIVE_STUDIES, compute_batch,
+                        readonly)
+from ticker_manager import tickers
+
+
+# ------------------------------------------------------------------------------
+# Study cache with lookback-aware warm-up
+#
+# Studies are computed over the visible rows plus the lookback of the render
+# plan (the longest warm-up of its studies) before them, so the left edge of a
+# period is valid instead of NaN, and then trimmed to the visible rows. The
+# outputs are cached per (ticker, resolution, study, params) with the store
+# rows [lo, hi) they cover; a later request only computes the rows it does not
+# have yet (switching from 1M to 3M computes the two extra months, not three).
+# Values of a windowed study at a row only depend on the lookback rows before
+# it, so extending a cached range on either side never changes it, except for
+# the last bucket of a rollup, which is recomputed after an append.
+#
+# Recursive studies (indicators.RECURSIVE_STUDIES, the exponential averages)
+# depend on the row their computation started from, a range computed on its
+# own would be seeded differently than the cached rows next to it. An entry of
+# one is never stitched together: extending it recomputes the whole range from
+# the warm-up before its new first row.
+#
+# Cumulative studies (indicators.CUMULATIVE_STUDIES, the accumulation line)
+# add up from the first bar of the store, so they start every computation from
+# the total of the rows before it. Those totals are kept as checkpoints every
+# TOTAL_CHECKPOINT_ROWS rows, a total costs the rows since the last one. The
+# cached outputs are read-only and handed out as views.
+TOTAL_CHECKPOINT_ROWS = 1 << 16
+
+
+class _Entry:
+    def __init__(self, lo: int, hi: int, rows: int, outputs: dict):
+        self.lo = lo
+        self.hi = hi
+        # rows of the resolution in the store when the entry was computed
+        self.rows = rows
+        self.outputs = outputs
+
+
+class StudyCache:
+    def __init__(self, max_entries: int = 64,
+                 store_dir: str = tick_store.STORE_DIR):
+        self.max_entries = max_entries
+        self.store_dir = store_dir
+        self.computed_rows = 0
+        self.reused_rows = 0
+        self._entries = OrderedDict()
+        # (ticker, resolution, study, base_version) -> totals of the rows
+        # [0, k * TOTAL_CHECKPOINT_ROWS)
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    # Returns "<study>.<output>" -> array for the store rows [lo, hi) of every
+    # (descriptor, params) study of the plan
+    def study_values(self, ticker: str, resolution: str, plan, lo: int,
+                     hi: int):
+        base_version = tickers.meta(ticker, self.store_dir).get("base_version")
+        index = time_index.get_time_index(ticker, self.store_dir, resolution)
+        rows = len(index)
+        requests = []
+        segments = {}
+        with self._lock:
+            for descriptor, params in plan.studies:
+                key = (ticker.upper(), resolution, descriptor.study,
+                       tuple(sorted(params.items())), base_version)
+                entry = self._usable_entry(key, resolution, rows, lo, hi)
+                if entry is not None and descriptor.study in RECURSIVE_STUDIES \
+                        and (lo < entry.lo or hi > entry.hi):
+                    missing = [(min(lo, entry.lo), max(hi, entry.hi))]
+                    entry = None
+                elif entry is None:
+                    missing = [(lo, hi)]
+                else:
+                    missing = [s for s in ((lo, entry.lo), (entry.hi, hi))
+                               if s[0] < s[1]]
+                    self.reused_rows += (min(hi, entry.hi)
+                                         - max(lo, entry.lo))
+                for segment in missing:
+                    segments.setdefault(segment, []).append((descriptor,
+                                                             params))
+                requests.append((key, descriptor, params, entry, missing))
+
+        computed = {segment: self._compute(ticker, resolution, index, plan,
+                                           segment, studies, base_version)
+                    for segment, studies in segments.items()}
+
+        values = {}
+        with self._lock:
+            for key, descriptor, params, entry, missing in requests:
+                entry = self._merge(entry, missing, computed, descriptor.study,
+                                    rows)
+                self._put(key, entry)
+                for output, array in entry.outputs.items():
+                    values[output] = array[lo - entry.lo:hi - entry.lo]
+        return values
+
+    def _usable_entry(self, key, resolution, rows, lo, hi):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        if resolution != tick_store.BASE_RESOLUTION and rows != entry.rows \
+                and entry.hi >= entry.rows:
+            # the last bucket of a rollup may have changed since
+            entry = _Entry(entry.lo, entry.hi - 1, rows,
+                           {k: v[:-1] for k, v in entry.outputs.items()})
+        # disjoint ranges are not worth stitching together
+        if entry.hi <= entry.lo or hi < entry.lo or lo > entry.hi:
+            return None
+        return entry
+
+    def _compute(self, ticker, resolution, index, plan, segment, studies,
+                 base_version):
+        lo, hi = segment
+        start = max(0, lo - plan.lookback)
+        opened = tickers.get(ticker, self.store_dir, resolution).columns
+        arrays = {c: np.asarray(index.view(opened[c], start, hi),
+                                dtype=np.float64) for c in plan.columns}
+        with self._lock:
+            self.computed_rows += hi - start
+        batch = []
+        for d, p in studies:
+            if d.study in CUMULATIVE_STUDIES:
+                p = {**p, "initial": self._total_before(
+                    ticker, resolution, index, d, start, base_version)}
+            batch.append((d.study, p))
+        values = compute_batch(arrays, batch)
+        return {k: v[lo - start:] for k, v in values.items()}
+
+    # Total of the increments of a cumulative study over the rows [0, row),
+    # which never include the last, still changing, bucket of a rollup
+    def _total_before(self, ticker, resolution, index, descriptor, row,
+                      base_version):
+        increments = CUMULATIVE_STUDIES[descriptor.study]
+        opened = tickers.get(ticker, self.store_dir, resolution).columns
+
+        def total(lo, hi):
+            arrays = {c: np.asarray(index.view(opened[c], lo, hi),
+                                    dtype=np.float64)
+                      for c in descriptor.inputs}
+            return float(increments(arrays).sum())
+
+        key = (ticker.upper(), resolution, descriptor.study, base_version)
+        step = TOTAL_CHECKPOINT_ROWS
+        with self._lock:
+            checkpoints = list(self._totals.get(key, [0.0]))
+        known = len(checkpoints)
+        while len(checkpoints) * step <= row:
+            k = len(checkpoints) - 1
+            checkpoints.append(checkpoints[-1]
+                               + total(k * step, (k + 1) * step))
+        if len(checkpoints) > known:
+            with self._lock:
+                # checkpoints of earlier versions are stale
+                for stale in [k for k in self._totals
+                              if k[:3] == key[:3] and k != key]:
+                    del self._totals[stale]
+                if len(checkpoints) > len(self._totals.get(key, ())):
+                    self._totals[key] = checkpoints
+        k = row // step
+        return checkpoints[k] + total(k * step, row)
+
+    @staticmethod
+    def _merge(entry, missing, computed, study, rows):
+        prefix = study + "."
+        parts = [{k: v for k, v in computed[s].items() if k.startswith(prefix)}
+                 for s in missing]
+        if entry is None:
+            (lo, hi), = missing
+            return _Entry(lo, hi, rows, parts[0])
+
+        left = [p for s, p in zip(missing, parts) if s[1] == entry.lo]
+        right = [p for s, p in zip(missing, parts) if s[0] == entry.hi]
+        outputs = {k: readonly(np.concatenate([p[k] for p in left] + [v]
+                                              + [p[k] for p in right]))
+                   for k, v in entry.outputs.items()} if left or right \
+            else entry.outputs
+        lo = min([s[0] for s in missing] + [entry.lo])
+        hi = max([s[1] for s in missing] + [entry.hi])
+        return _Entry(lo, hi, rows, outputs)
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._totals.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "computed_rows": self.computed_rows,
+                    "reused_rows": self.reused_rows}
+
+
+study_cache = StudyCache()
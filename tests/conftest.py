@@ -0,0 +1,70 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the app is a set of flat modules next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import figure_pipeline  # noqa: E402
+import tick_store  # noqa: E402
+from indicators import engine  # noqa: E402
+
+
+# Minute bars of two sessions with a gap between them: dates and OHLCV columns
+# as float64 prices and integer volumes. The same seed gives the same bars.
+def synthetic_bars(n: int = 2000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    minutes = np.arange(n)
+    minutes[n // 2:] += 17 * 60
+    dates = (np.datetime64("2024-01-02T09:30", "m")
+             + minutes.astype("timedelta64[m]")).astype("datetime64[ns]")
+    close = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    open_ = np.append(close[0], close[:-1])
+    spread = rng.uniform(0.01, 0.5, (2, n))
+    columns = {"open": open_,
+               "high": np.maximum(open_, close) + spread[0],
+               "low": np.minimum(open_, close) - spread[1],
+               "close": close,
+               "volume": rng.integers(1, 10_000, n)}
+    return dates, columns
+
+
+# Rows [lo, hi) of bars
+def bar_rows(bars, lo: int, hi: int):
+    dates, columns = bars
+    return dates[lo:hi], {c: v[lo:hi] for c, v in columns.items()}
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path / "store")
+
+
+@pytest.fixture
+def bars():
+    return synthetic_bars()
+
+
+# The figure pipeline reads the store of the working directory: runs the test
+# in tmp_path, with the caches of the process emptied, and returns the store
+# directory
+@pytest.fixture
+def app_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    figure_pipeline.clear_caches()
+    engine.reset()
+    yield tick_store.STORE_DIR
+    figure_pipeline.clear_caches()
+    engine.reset()
+
+
+# Column of a resolution trimmed to the rows its meta lists
+def stored(ticker: str, column: str, store_dir: str,
+           resolution: str = tick_store.BASE_RESOLUTION):
+    meta = tick_store.read_meta(ticker, store_dir)
+    rows = (meta["rows"] if resolution == tick_store.BASE_RESOLUTION
+            else meta["rollups"][resolution])
+    return np.asarray(tick_store.open_column(ticker, column, store_dir,
+                                             resolution)[:rows])
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+import tick_store
+
+NAN = np.nan
+
+
+def test_positions_carry_events_forward():
+    events = np.array([NAN, 1, NAN, NAN, 0, NAN, -1, NAN])
+    np.testing.assert_array_equal(backtest.positions_from_events(events),
+                                  [0, 1, 1, 1, 0, 0, -1, -1])
+
+
+# CCI leaving the oversold zone, crossing zero, leaving the overbought zone
+# and crossing zero again, NaN while warming up
+def test_cci_reversal_positions_of_a_cross_sequence():
+    cci = np.array([NAN, -150, -120, -90, -50, 10, 150, 120, 80, -10, -20])
+    events = backtest.cci_reversal({"cci.cci": cci}, {})
+    np.testing.assert_array_equal(backtest.positions_from_events(events),
+                                  [0, 0, 0, 1, 1, 0, 0, 0, -1, 0, 0])
+
+
+def test_strategy_returns_earn_the_next_bar_and_pay_changes():
+    close = np.array([100.0, 110.0, 99.0, 99.0])
+    position = np.array([1.0, 1.0, 0.0, -1.0])
+    np.testing.assert_allclose(backtest.strategy_returns(close, position),
+                               [0, 0.1, -0.1, 0])
+    np.testing.assert_allclose(
+        backtest.strategy_returns(close, position, cost_bps=10),
+        [-0.001, 0.1, -0.101, -0.001])
+
+
+def test_drawdown_of_a_known_equity_curve():
+    equity = np.array([1.0, 1.2, 0.9, 1.5, 1.2, 1.5])
+    np.testing.assert_allclose(backtest.drawdown(equity),
+                               [0, 0, -0.25, 0, -0.2, 0])
+
+
+def test_trades_are_the_runs_of_a_position():
+    dates = np.arange(6).astype("datetime64[m]")
+    close = np.array([10.0, 10.0, 11.0, 12.0, 12.0, 9.0])
+    position = np.array([0.0, 1.0, 1.0, 0.0, -1.0, -1.0])
+    trades = backtest.trade_list(dates, close, position)
+    assert trades["side"].tolist() == [1, -1]
+    assert trades["entry"].tolist() == list(dates[[1, 4]])
+    assert trades["exit"].tolist() == list(dates[[3, 5]])
+    assert trades["bars"].tolist() == [2, 1]
+    np.testing.assert_allclose(trades["return"], [0.2, 0.25])
+    assert trades["open"].tolist() == [False, True]
+
+
+# daily bars over three days
+def test_metrics():
+    dates = np.datetime64("2024-01-01") + np.arange(4) * np.timedelta64(1, "D")
+    position = np.array([1.0, 1.0, 0.0, -1.0])
+    returns = np.array([0.0, 0.1, -0.05, 0.0])
+    equity = np.cumprod(1 + returns)
+    result = backtest.metrics(dates, position, returns, equity,
+                              backtest.drawdown(equity))
+    assert result["total_return"] == pytest.approx(1.1 * 0.95 - 1)
+    assert result["max_drawdown"] == pytest.approx(-0.05)
+    assert result["trades"] == 2
+    assert result["exposure"] == 0.75
+    assert result["turnover"] == 3.0
+    bars_per_year = 4 / (3 / 365.25)
+    assert result["sharpe"] == pytest.approx(
+        returns.mean() / returns.std() * np.sqrt(bars_per_year))
+
+
+def test_sweep_on_workers_matches_a_serial_sweep(store_dir, bars):
+    tick_store.write_columns("T", *bars, store_dir)
+    grid = backtest.parameter_grid({"n_days": [10, 20], "level": [50, 100]})
+    serial = backtest.sweep("T", "cci_reversal", grid, workers=1,
+                            task_size=1, store_dir=store_dir)
+    pooled = backtest.sweep("T", "cci_reversal", grid, workers=2,
+                            task_size=1, store_dir=store_dir)
+    assert len(serial) == len(grid)
+    key = ["n_days", "level"]
+    pd.testing.assert_frame_equal(
+        serial.sort_values(key, ignore_index=True),
+        pooled.sort_values(key, ignore_index=True))
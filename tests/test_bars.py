@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import tick_store
+from bars import MISSING_TICK, Bars
+
+
+# The csv frame the app used to keep: float64 prices, the date column and a
+# DatetimeIndex over it
+@pytest.fixture
+def frame(bars):
+    dates, columns = bars
+    df = pd.DataFrame({tick_store.DATE_COLUMN: dates, **columns})
+    return df.set_index(tick_store.DATE_COLUMN, drop=False)
+
+
+def _assert_round_trip(df, out, rtol):
+    np.testing.assert_array_equal(out.index.to_numpy(),
+                                  df.index.to_numpy().astype(out.index.dtype))
+    for column in tick_store.OHLCV_COLUMNS:
+        np.testing.assert_allclose(out[column].to_numpy(dtype=np.float64),
+                                   df[column].to_numpy(dtype=np.float64),
+                                   rtol=rtol, atol=0, equal_nan=True,
+                                   err_msg=column)
+
+
+def test_frame_round_trips(frame):
+    out = Bars.from_frame(frame).frame()
+    assert tuple(out.columns) == tick_store.OHLCV_COLUMNS
+    # float32 prices
+    _assert_round_trip(frame, out, rtol=1e-7)
+
+
+def test_tick_prices_round_trip(frame):
+    bars = Bars.from_frame(frame, tick_size=0.0001)
+    assert bars.close.dtype == np.int32
+    _assert_round_trip(frame, bars.frame(), rtol=1e-6)
+
+
+@pytest.mark.parametrize("tick_size", [None, 0.01])
+def test_missing_prices_stay_missing(frame, tick_size):
+    frame.iloc[[0, 10, 1999], 1:5] = np.nan
+    bars = Bars.from_frame(frame, tick_size)
+    if tick_size is not None:
+        assert (bars.high[[0, 10, 1999]] == MISSING_TICK).all()
+    out = bars.frame()
+    for column in tick_store.PRICE_COLUMNS:
+        assert np.isnan(out[column].to_numpy()).sum() == 3
+        assert np.isnan(out[column].iloc[[0, 10, 1999]]).all()
+
+
+def test_bars_take_at_most_half_the_frame(frame):
+    bars = Bars.from_frame(frame)
+    assert bars.nbytes <= frame.memory_usage(index=True).sum() / 2
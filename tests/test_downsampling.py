@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import synthetic_bars
+from downsampling import aggregate_ohlc, bucket_starts, lttb_indices
+
+
+@pytest.fixture
+def frame(bars):
+    dates, columns = bars
+    return pd.DataFrame(columns, index=dates)
+
+
+@pytest.mark.parametrize("n_out", [3, 10, 500, 1999])
+def test_lttb_keeps_the_ends_and_n_points(frame, n_out):
+    close = frame["close"].to_numpy()
+    idx = lttb_indices(close, n_out)
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == len(close) - 1
+    assert (np.diff(idx) > 0).all()
+
+
+def test_lttb_over_missing_values(frame):
+    close = frame["close"].to_numpy().copy()
+    close[[0, 1, 700, 1999]] = np.nan
+    idx = lttb_indices(close, 100)
+    assert len(idx) == 100 and idx[0] == 0 and idx[-1] == len(close) - 1
+
+
+def test_lttb_keeps_short_series_whole():
+    np.testing.assert_array_equal(lttb_indices(np.arange(5.0), 10),
+                                  np.arange(5))
+
+
+def test_buckets_keep_their_extremes(frame):
+    out = aggregate_ohlc(frame, 150)
+    starts = bucket_starts(len(frame), 150)
+    ends = np.append(starts[1:], len(frame))
+    assert len(out) == len(starts) <= 150
+    assert out.index.equals(frame.index[starts])
+    for i, (lo, hi) in enumerate(zip(starts, ends)):
+        bucket = frame.iloc[lo:hi]
+        assert out["high"].iloc[i] == bucket["high"].max()
+        assert out["low"].iloc[i] == bucket["low"].min()
+        assert out["open"].iloc[i] == bucket["open"].iloc[0]
+        assert out["close"].iloc[i] == bucket["close"].iloc[-1]
+    assert out["volume"].sum() == frame["volume"].sum()
+    assert out["high"].max() == frame["high"].max()
+    assert out["low"].min() == frame["low"].min()
+
+
+def test_buckets_skip_missing_prices():
+    dates, columns = synthetic_bars(100, seed=2)
+    frame = pd.DataFrame(columns, index=dates)
+    frame.iloc[:5, :4] = np.nan
+    out = aggregate_ohlc(frame, 10)
+    assert out["high"].iloc[0] == frame["high"].iloc[:10].max()
+    assert out["low"].iloc[0] == frame["low"].iloc[:10].min()
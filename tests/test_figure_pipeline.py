@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+import definitions
+import tick_store
+from figure_pipeline import build_figure, figure_patch
+
+
+@pytest.fixture
+def render(app_store, bars):
+    tick_store.write_columns("T", *bars)
+    now = pd.Timestamp(bars[0][-1]).to_pydatetime()
+
+    def render(studies, study_params=None):
+        return build_figure("T", 24, "candlestick_trace", studies,
+                            study_params, now=now)
+    return render
+
+
+# the meta a figure was sent with, as the callbacks keep it
+def _shown(fig):
+    return {**fig["layout"]["meta"], "revision": 1}
+
+
+STUDIES = ("moving_average_trace", "bollinger_trace")
+
+
+def test_unchanged_figure_gives_no_patch(render):
+    fig = render(STUDIES)
+    assert figure_patch(render(STUDIES), _shown(fig)) is None
+
+
+def test_changed_study_sends_only_its_segment(render):
+    shown = render(STUDIES, {"bollinger_trace": {"window_size": 20}})
+    fig = render(STUDIES, {"bollinger_trace": {"window_size": 50}})
+    patch = figure_patch(fig, _shown(shown))
+
+    assert patch["layout"] is fig["layout"]
+    # the candlestick and the moving average are kept where they are shown,
+    # the three bollinger traces are sent
+    assert [count for _, count in fig["layout"]["meta"]["segments"]] \
+        == [1, 1, 3]
+    assert patch["data"] == [0, 1] + fig["data"][2:]
+
+
+def test_added_study_keeps_the_traces_shown(render):
+    shown = render(("moving_average_trace",))
+    fig = render(STUDIES)
+    patch = figure_patch(fig, _shown(shown))
+    assert patch["data"][:2] == [0, 1]
+    assert all(isinstance(t, dict) for t in patch["data"][2:])
+    assert len(patch["data"]) == len(fig["data"])
+
+
+def test_changed_trace_count_replaces_the_figure(render):
+    fig = render(STUDIES)
+    shown = _shown(fig)
+    shown["segments"] = [[segment, count + (i == 2)]
+                         for i, (segment, count) in enumerate(
+                             shown["segments"])]
+    shown["traces"] += 1
+    assert figure_patch(fig, shown) == {"figure": fig}
+
+
+def test_figure_extended_since_sent_is_replaced(render):
+    fig = render(STUDIES)
+    shown = _shown(fig)
+    cursor = {"revision": 1, "row": shown["row"] + 5}
+    assert figure_patch(fig, shown, cursor) == {"figure": fig}
+
+
+def test_max_period_shows_the_whole_history(app_store, bars):
+    tick_store.write_columns("T", *bars)
+    period = definitions.PERIOD_SELECTION_DICT["MAX"]
+    assert period is not None
+    fig = build_figure("T", period, "line_trace", (),
+                       now=pd.Timestamp(bars[0][-1]).to_pydatetime())
+    meta = fig["layout"]["meta"]
+    assert meta["period"] == period
+    assert meta["range"] == [str(bars[0][0]), str(bars[0][-1])]
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import tick_store
+from conftest import bar_rows, stored, synthetic_bars
+from indicators import (INDICATORS, IndicatorEngine, compute_batch,
+                        study_defaults)
+
+
+# The pandas computations the batch kernels replace (charts.py before them)
+def _pandas(df: pd.DataFrame, study: str, params: dict):
+    close = df["close"]
+    if study == "moving_average":
+        return {"ma": close.rolling(params["window"]).mean()}
+    if study == "e_moving_average":
+        return {"ema": close.ewm(span=params["span"], adjust=False).mean()}
+    if study == "w_moving_average":
+        weights = np.arange(1, params["window"] + 1)
+        return {"wma": close.rolling(params["window"]).apply(
+            lambda x: (weights * x).sum() / weights.sum(), raw=True)}
+    if study == "de_moving_average":
+        first = close.ewm(span=params["span"], adjust=False).mean()
+        return {"dema": 2 * first
+                - first.ewm(span=params["span"], adjust=False).mean()}
+    if study == "bollinger":
+        mean = close.rolling(params["window_size"]).mean()
+        band = close.rolling(params["window_size"]).std() \
+            * params["num_of_std"]
+        return {"upper": mean + band, "mean": mean, "lower": mean - band}
+    if study == "accumulation":
+        flow = ((close - df["low"]) - (df["high"] - close)) \
+            / (df["high"] - df["low"]) * df["volume"]
+        return {"accumulation": flow.cumsum()}
+    if study == "cci":
+        tp = (df["high"] + df["low"] + close) / 3
+        n = params["n_days"]
+        return {"cci": (tp - tp.rolling(n).mean())
+                / (0.015 * tp.rolling(n).std())}
+    if study == "roc":
+        n = params["n_days"]
+        return {"roc": close.diff(n) / close.shift(n)}
+    if study == "stoc":
+        return {"so_k": (close - df["low"]) / (df["high"] - df["low"])}
+    if study == "mom":
+        return {"mom": close.diff(params["n"])}
+    if study == "pp":
+        pp, h, l = (df["high"] + df["low"] + close) / 3, df["high"], df["low"]
+        return {"pp": pp, "r1": 2 * pp - l, "s1": 2 * pp - h,
+                "r2": pp + h - l, "s2": pp - h + l,
+                "r3": h + 2 * (pp - l), "s3": l - 2 * (h - pp)}
+    raise ValueError(study)
+
+
+STUDIES = ["moving_average", "e_moving_average", "w_moving_average",
+           "de_moving_average", "bollinger", "accumulation", "cci", "roc",
+           "stoc", "mom", "pp"]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    dates, columns = synthetic_bars(5000, seed=1)
+    return pd.DataFrame(columns, index=dates)
+
+
+def _assert_matches(values, expected):
+    np.testing.assert_allclose(values, expected.to_numpy(), rtol=1e-9,
+                               atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("study", STUDIES)
+def test_defaults_match_pandas(frame, study):
+    arrays = {c: frame[c].to_numpy(dtype=np.float64) for c in frame}
+    values = compute_batch(arrays, [study])
+    expected = _pandas(frame, study, study_defaults(study))
+    assert sorted(values) == sorted(study + "." + k for k in expected)
+    for output, series in expected.items():
+        _assert_matches(values[study + "." + output], series)
+
+
+@pytest.mark.parametrize("study, params", [
+    ("moving_average", {"window": 50}),
+    ("w_moving_average", {"window": 7}),
+    ("e_moving_average", {"span": 5}),
+    ("bollinger", {"window_size": 20, "num_of_std": 2}),
+    ("cci", {"n_days": 14}),
+    ("roc", {"n_days": 20}),
+])
+def test_params_match_pandas(frame, study, params):
+    arrays = {c: frame[c].to_numpy(dtype=np.float64) for c in frame}
+    values = compute_batch(arrays, [(study, params)])
+    for output, series in _pandas(frame, study, params).items():
+        _assert_matches(values[study + "." + output], series)
+
+
+# a window holding a NaN is NaN, as with pandas rolling windows
+@pytest.mark.parametrize("study", ["moving_average", "w_moving_average",
+                                   "bollinger", "cci"])
+def test_windows_over_missing_bars_match_pandas(frame, study):
+    df = frame.copy()
+    df.iloc[[100, 101, 2500, 4999], :4] = np.nan
+    arrays = {c: df[c].to_numpy(dtype=np.float64) for c in df}
+    values = compute_batch(arrays, [study])
+    for output, series in _pandas(df, study, study_defaults(study)).items():
+        _assert_matches(values[study + "." + output], series)
+
+
+def test_batch_shares_intermediates_without_changing_results(frame):
+    arrays = {c: frame[c].to_numpy(dtype=np.float64) for c in frame}
+    together = compute_batch(arrays, STUDIES)
+    for study in STUDIES:
+        for output, values in compute_batch(arrays, [study]).items():
+            np.testing.assert_array_equal(together[output], values)
+
+
+def test_outputs_are_read_only(frame):
+    arrays = {c: frame[c].to_numpy(dtype=np.float64) for c in frame}
+    values = compute_batch(arrays, ["moving_average"])
+    with pytest.raises(ValueError):
+        values["moving_average.ma"][0] = 0.0
+
+
+# The engine follows the store bar by bar, missing bars included: the values
+# of every tick and of the whole history are those of a computation over the
+# whole history
+def test_engine_follows_appends_like_a_full_computation(store_dir):
+    bars = synthetic_bars(400, seed=3)
+    for column in tick_store.PRICE_COLUMNS:
+        bars[1][column][[320, 321, 350, 399]] = np.nan
+    tick_store.write_columns("T", *bar_rows(bars, 0, 300), store_dir)
+    engine = IndicatorEngine(store_dir)
+    studies = [(name, study_defaults(name)) for name in INDICATORS]
+    engine.study_values("T", studies, 0, 300)
+
+    ticks = []
+    for row in range(300, 400):
+        assert tick_store.append_columns(
+            "T", *bar_rows(bars, row, row + 1), store_dir) == 1
+        ticks.append(engine.study_values("T", studies, row, row + 1))
+
+    arrays = {c: stored("T", c, store_dir).astype(np.float64)
+              for c in tick_store.OHLCV_COLUMNS}
+    expected = compute_batch(arrays, studies)
+    values = engine.study_values("T", studies, 0, 400)
+    assert sorted(values) == sorted(expected)
+    for output, array in expected.items():
+        np.testing.assert_allclose(values[output], array, rtol=1e-9,
+                                   atol=1e-9, equal_nan=True, err_msg=output)
+        np.testing.assert_allclose([tick[output][0] for tick in ticks],
+                                   array[300:], rtol=1e-9, atol=1e-9,
+                                   equal_nan=True, err_msg=output)
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import ingestion
+import tick_store
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(calls_per_minute: float = None):
+        server = ingestion.StubAlphaVantageServer(
+            calls_per_minute=calls_per_minute, full_bars=500,
+            compact_bars=50)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+# a service whose own bucket never waits, retrying at once
+def _service(server, tickers, store_dir, **kwargs):
+    return ingestion.IngestionService(
+        tickers, "stub", base_url=server.url, calls_per_minute=60_000,
+        backoff=0.0, store_dir=store_dir, **kwargs)
+
+
+def test_run_once_appends_new_bars_only(stub, store_dir):
+    server = stub()
+    updates = []
+    service = _service(server, ["aaa", "bbb"], store_dir,
+                       on_update=lambda ticker, version:
+                       updates.append((ticker, version)))
+
+    assert asyncio.run(service.run_once()) == {"AAA": 500, "BBB": 500}
+    for ticker in ("AAA", "BBB"):
+        meta = tick_store.read_meta(ticker, store_dir)
+        assert meta["rows"] == 500 and meta["version"] == 1
+    assert sorted(updates) == [("AAA", 1), ("BBB", 1)]
+
+    # the compact payload repeats stored bars, at most a new minute is added
+    appended = asyncio.run(service.run_once())
+    for ticker, count in appended.items():
+        assert count in (0, 1)
+        assert tick_store.read_meta(ticker, store_dir)["rows"] == 500 + count
+    assert service.stats["appended_bars"] == 1000 + sum(appended.values())
+    assert service.stats["failures"] == 0
+
+
+def test_throttled_calls_are_rejected_once_retries_run_out(stub, store_dir):
+    server = stub(calls_per_minute=2)
+    service = _service(server, ["aaa", "bbb", "ccc"], store_dir,
+                       max_retries=2)
+    results = asyncio.run(service.run_once())
+
+    failed = [t for t, r in results.items() if isinstance(r, Exception)]
+    assert len(failed) == 1
+    assert isinstance(results[failed[0]], ingestion.RateLimited)
+    assert not tick_store.has_ticker(failed[0], store_dir)
+    assert service.stats == {"requests": 5, "retries": 2, "failures": 1,
+                             "appended_bars": 1000}
+    assert server.calls == 5
+
+
+def test_token_bucket_spaces_the_calls():
+    async def acquire(bucket, calls):
+        for _ in range(calls):
+            await bucket.acquire()
+
+    bucket = ingestion.TokenBucket(rate=50.0)
+    started = time.monotonic()
+    asyncio.run(acquire(bucket, 6))
+    # the first token is there, five more take 0.1s
+    assert time.monotonic() - started >= 0.09
+
+
+@pytest.mark.parametrize("code, requests", [(400, 1), (401, 1), (404, 1),
+                                            (429, 3), (500, 3), (503, 3)])
+def test_only_throttling_and_server_errors_are_retried(stub, store_dir,
+                                                       monkeypatch, code,
+                                                       requests):
+    service = _service(stub(), ["aaa"], store_dir, max_retries=2)
+
+    def fail(url):
+        raise urllib.error.HTTPError(url, code, "error", {}, None)
+    monkeypatch.setattr(service, "_get", fail)
+
+    results = asyncio.run(service.run_once())
+    assert isinstance(results["AAA"], urllib.error.HTTPError)
+    assert service.stats["requests"] == requests
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+import live_updates
+import tick_store
+from conftest import bar_rows, synthetic_bars
+from figure_pipeline import MAIN_CHART_MAX_POINTS, build_figure
+
+STUDIES = ("moving_average_trace", "cci_trace")
+
+
+def _figure(bars, period: int, appended: int = 10):
+    dates, columns = bars
+    tick_store.write_columns("T", *bar_rows(bars, 0, len(dates) - appended))
+    now = pd.Timestamp(dates[-appended - 1]).to_pydatetime()
+    fig = build_figure("T", period, "line_trace", STUDIES, now=now)
+    tick_store.append_columns("T", *bar_rows(bars, len(dates) - appended,
+                                             len(dates)))
+    return {**fig["layout"]["meta"], "revision": 1}
+
+
+def test_figure_of_few_base_bars_is_extended(app_store):
+    bars = synthetic_bars(6000)
+    meta = _figure(bars, 24)
+    assert meta["resolution"] == tick_store.BASE_RESOLUTION and meta["live"]
+
+    update, cursor = live_updates.extend_data(meta, None,
+                                              MAIN_CHART_MAX_POINTS)
+    assert cursor["row"] == len(bars[0])
+    data, traces, _ = update[0]
+    assert len(traces) == meta["traces"]
+    assert all(len(x) == 10 for x in data["x"])
+
+
+def test_decimated_figure_of_base_bars_is_not_extended(app_store):
+    bars = synthetic_bars(6000)
+    meta = _figure(bars, 7 * 24)
+    # too few rollup bars to fill the chart, decimated base bars instead
+    assert meta["resolution"] == tick_store.BASE_RESOLUTION
+    first, last = (np.datetime64(d) for d in meta["range"])
+    assert ((bars[0] >= first) & (bars[0] <= last)).sum() > MAIN_CHART_MAX_POINTS
+    assert not meta["live"] and not meta["full"]
+
+    update, cursor = live_updates.extend_data(meta, None,
+                                              MAIN_CHART_MAX_POINTS)
+    assert update is None
+    patch, cursor = live_updates.refresh(
+        meta, cursor, lambda shown: build_figure(
+            "T", 7 * 24, "line_trace", STUDIES,
+            now=pd.Timestamp(bars[0][-1]).to_pydatetime()))
+    assert cursor["meta"]["row"] == len(bars[0])
+    assert np.datetime64(cursor["meta"]["range"][1]) == bars[0][-1]
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import tick_store
+from conftest import synthetic_bars
+from sparklines import day_trend, format_trend
+
+
+# the second session starts 17 hours after the first one ends, a day before
+# its last bar lies in the first session
+def _trend(columns, last, first):
+    return (columns["close"][last] / columns["close"][first] - 1) * 100
+
+
+def test_trend_over_the_day(app_store):
+    dates, columns = synthetic_bars(2000)
+    tick_store.write_columns("T", dates, columns)
+    before = int(np.searchsorted(dates, dates[-1] - np.timedelta64(1, "D"),
+                                 side="right"))
+    assert day_trend("T") == pytest.approx(_trend(columns, -1, before - 1),
+                                           rel=1e-5)
+
+
+def test_missing_closes_are_skipped(app_store):
+    dates, columns = synthetic_bars(2000)
+    before = int(np.searchsorted(dates, dates[-1] - np.timedelta64(1, "D"),
+                                 side="right"))
+    columns["close"][-3:] = np.nan
+    columns["close"][before - 2:before] = np.nan
+    tick_store.write_columns("T", dates, columns)
+    # the day before the last close, which is three bars earlier
+    before = int(np.searchsorted(dates, dates[-4] - np.timedelta64(1, "D"),
+                                 side="right"))
+    first = max(row for row in range(before)
+                if not np.isnan(columns["close"][row]))
+    trend = day_trend("T")
+    assert trend == pytest.approx(_trend(columns, -4, first), rel=1e-5)
+    assert "nan" not in format_trend(trend)
+
+
+def test_short_history_starts_from_the_first_close(app_store):
+    dates, columns = synthetic_bars(100)
+    columns["close"][:2] = np.nan
+    tick_store.write_columns("T", dates, columns)
+    assert day_trend("T") == pytest.approx(_trend(columns, -1, 2), rel=1e-5)
+
+
+@pytest.mark.parametrize("valid", [0, 1])
+def test_no_trend_without_two_closes(app_store, valid):
+    dates, columns = synthetic_bars(100)
+    columns["close"][valid:] = np.nan
+    tick_store.write_columns("T", dates, columns)
+    assert day_trend("T") is None
+    assert format_trend(day_trend("T")) == ""
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+import study_cache as study_cache_module
+import tick_store
+from conftest import bar_rows, synthetic_bars
+from indicators import compute_batch
+from study_cache import StudyCache
+from trace_registry import plan_render
+
+WINDOWED = plan_render("line_trace", ("moving_average_trace",
+                                      "bollinger_trace"))
+RECURSIVE = plan_render("line_trace", ("e_moving_average_trace",
+                                       "de_moving_average_trace"))
+
+
+@pytest.fixture
+def store(store_dir, bars):
+    tick_store.write_columns("T", *bars, store_dir)
+    return store_dir
+
+
+def _fresh(store_dir, plan, lo, hi, resolution=tick_store.BASE_RESOLUTION):
+    return StudyCache(store_dir=store_dir).study_values("T", resolution, plan,
+                                                        lo, hi)
+
+
+# windowed studies sum their windows in chunks offset by where a computation
+# starts, so they match up to rounding
+def _assert_equal(values, expected, rtol=0.0):
+    assert sorted(values) == sorted(expected)
+    for output, array in expected.items():
+        np.testing.assert_allclose(values[output], array, rtol=rtol,
+                                   equal_nan=True)
+
+
+@pytest.mark.parametrize("first, second", [((1000, 1200), (800, 1400)),
+                                           ((1000, 1200), (800, 1100)),
+                                           ((1000, 1200), (1100, 1400)),
+                                           ((1000, 1200), (1050, 1150))])
+def test_windowed_studies_compute_only_missing_rows(store, first, second):
+    cache = StudyCache(store_dir=store)
+    cache.study_values("T", tick_store.BASE_RESOLUTION, WINDOWED, *first)
+    computed = cache.computed_rows
+    values = cache.study_values("T", tick_store.BASE_RESOLUTION, WINDOWED,
+                                *second)
+
+    _assert_equal(values, _fresh(store, WINDOWED, *second), rtol=1e-12)
+    lookback = WINDOWED.lookback
+    missing = [s for s in ((second[0], first[0]), (first[1], second[1]))
+               if s[0] < s[1]]
+    assert cache.computed_rows - computed == sum(hi - lo + lookback
+                                                 for lo, hi in missing)
+
+
+@pytest.mark.parametrize("first, second", [((1000, 1200), (800, 1200)),
+                                           ((1000, 1200), (1000, 1400))])
+def test_recursive_studies_are_recomputed_from_their_warm_up(store, first,
+                                                             second):
+    cache = StudyCache(store_dir=store)
+    cache.study_values("T", tick_store.BASE_RESOLUTION, RECURSIVE, *first)
+    values = cache.study_values("T", tick_store.BASE_RESOLUTION, RECURSIVE,
+                                *second)
+    lo, hi = min(first[0], second[0]), max(first[1], second[1])
+    union = _fresh(store, RECURSIVE, lo, hi)
+    _assert_equal(values, {k: v[second[0] - lo:second[1] - lo]
+                           for k, v in union.items()})
+
+
+def test_last_rollup_bucket_is_recomputed_after_an_append(store_dir, bars):
+    # ends within a 5 minute bucket
+    tick_store.write_columns("T", *bar_rows(bars, 0, 1003), store_dir)
+    cache = StudyCache(store_dir=store_dir)
+    rows = tick_store.read_meta("T", store_dir)["rollups"]["5m"]
+    cache.study_values("T", "5m", WINDOWED, 0, rows)
+
+    tick_store.append_columns("T", *bar_rows(bars, 1003, 2000), store_dir)
+    rows = tick_store.read_meta("T", store_dir)["rollups"]["5m"]
+    _assert_equal(cache.study_values("T", "5m", WINDOWED, 0, rows),
+                  _fresh(store_dir, WINDOWED, 0, rows, "5m"), rtol=1e-12)
+
+
+def test_rewritten_store_is_computed_again(store):
+    cache = StudyCache(store_dir=store)
+    cache.study_values("T", tick_store.BASE_RESOLUTION, WINDOWED, 0, 500)
+    tick_store.write_columns("T", *synthetic_bars(seed=7), store)
+    _assert_equal(cache.study_values("T", tick_store.BASE_RESOLUTION,
+                                     WINDOWED, 0, 500),
+                  _fresh(store, WINDOWED, 0, 500), rtol=1e-12)
+
+
+def test_cumulative_studies_start_from_the_total_before(store, bars,
+                                                        monkeypatch):
+    monkeypatch.setattr(study_cache_module, "TOTAL_CHECKPOINT_ROWS", 256)
+    plan = plan_render("line_trace", ("accumulation_trace",))
+    cache = StudyCache(store_dir=store)
+    values = cache.study_values("T", tick_store.BASE_RESOLUTION, plan, 1500,
+                                1600)
+
+    # the whole history at the precision of the store
+    arrays = {c: np.asarray(v[:1600], dtype=np.float32).astype(np.float64)
+              for c, v in bars[1].items()}
+    expected = compute_batch(arrays, ["accumulation"])
+    np.testing.assert_allclose(values["accumulation.accumulation"],
+                               expected["accumulation.accumulation"][1500:],
+                               rtol=1e-9)
+
+
+def test_values_are_read_only_views(store):
+    cache = StudyCache(store_dir=store)
+    values = cache.study_values("T", tick_store.BASE_RESOLUTION, WINDOWED, 0,
+                                100)
+    with pytest.raises(ValueError):
+        values["moving_average.ma"][50] = 0.0
@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tick_store
+from conftest import bar_rows, stored
+
+COLUMNS = (tick_store.DATE_COLUMN,) + tick_store.OHLCV_COLUMNS
+
+
+# bar counts of the appends, ending mid-bucket of every rollup
+@pytest.mark.parametrize("chunks", [(1000, 1000), (997, 3, 1, 999),
+                                    (1, 1999)])
+def test_appends_match_a_single_write(store_dir, bars, chunks):
+    tick_store.write_columns("ONE", *bars, store_dir)
+    start = 0
+    for count in chunks:
+        appended = tick_store.append_columns(
+            "APP", *bar_rows(bars, start, start + count), store_dir)
+        assert appended == count
+        start += count
+
+    whole = tick_store.read_meta("ONE", store_dir)
+    meta = tick_store.read_meta("APP", store_dir)
+    assert meta["rows"] == whole["rows"] == len(bars[0])
+    assert meta["rollups"] == whole["rollups"]
+    for column in COLUMNS:
+        np.testing.assert_array_equal(stored("APP", column, store_dir),
+                                      stored("ONE", column, store_dir))
+    for resolution in tick_store.ROLLUP_RESOLUTIONS:
+        for column in COLUMNS:
+            np.testing.assert_array_equal(
+                stored("APP", column, store_dir, resolution),
+                stored("ONE", column, store_dir, resolution))
+
+
+def test_rollups_aggregate_the_base_bars(store_dir, bars):
+    tick_store.write_columns("T", *bar_rows(bars, 0, 1500), store_dir)
+    tick_store.append_columns("T", *bar_rows(bars, 1500, 2000), store_dir)
+    dates = stored("T", tick_store.DATE_COLUMN, store_dir)
+    columns = {c: stored("T", c, store_dir) for c in tick_store.OHLCV_COLUMNS}
+    for resolution, step in tick_store.ROLLUP_RESOLUTIONS.items():
+        rolled_dates, rolled = tick_store.aggregate_bars(dates, columns, step)
+        np.testing.assert_array_equal(
+            stored("T", tick_store.DATE_COLUMN, store_dir, resolution),
+            rolled_dates)
+        for column in tick_store.OHLCV_COLUMNS:
+            np.testing.assert_array_equal(
+                stored("T", column, store_dir, resolution), rolled[column])
+
+
+def test_append_ignores_bars_not_newer_than_the_store(store_dir, bars):
+    tick_store.write_columns("T", *bar_rows(bars, 0, 1000), store_dir)
+    meta = tick_store.read_meta("T", store_dir)
+    assert tick_store.append_columns("T", *bar_rows(bars, 500, 1000),
+                                     store_dir) == 0
+    assert tick_store.read_meta("T", store_dir) == meta
+
+    # only the bars after the last stored one of an overlapping batch
+    assert tick_store.append_columns("T", *bar_rows(bars, 900, 1100),
+                                     store_dir) == 100
+    np.testing.assert_array_equal(stored("T", "close", store_dir),
+                                  bars[1]["close"][:1100].astype(np.float32))
+
+
+def test_versions(store_dir, bars):
+    first = tick_store.write_columns("T", *bar_rows(bars, 0, 1000), store_dir)
+    tick_store.append_columns("T", *bar_rows(bars, 1000, 1500), store_dir)
+    appended = tick_store.read_meta("T", store_dir)
+    assert appended["version"] == first["version"] + 1
+    assert appended["base_version"] == first["base_version"]
+
+    rewritten = tick_store.write_columns("T", *bars, store_dir)
+    assert rewritten["version"] == appended["version"] + 1
+    assert rewritten["base_version"] == rewritten["version"]
+    assert "rewriting" not in rewritten
+
+
+def test_append_widens_volumes_outgrowing_uint32(store_dir, bars):
+    tick_store.write_columns("T", *bar_rows(bars, 0, 1000), store_dir)
+    dates, columns = bar_rows(bars, 1000, 1010)
+    columns["volume"] = columns["volume"] + np.iinfo(np.uint32).max
+    tick_store.append_columns("T", dates, columns, store_dir)
+
+    volume = stored("T", "volume", store_dir)
+    assert volume.dtype == np.uint64
+    np.testing.assert_array_equal(volume[:1000], bars[1]["volume"][:1000])
+    np.testing.assert_array_equal(volume[1000:], columns["volume"])
+
+
+def test_merge_adds_missing_bars_and_keeps_the_stored_ones(store_dir, bars):
+    tick_store.write_columns("T", *bar_rows(bars, 500, 1500), store_dir)
+    # the source holds other prices for the stored bars
+    dates, columns = bars
+    source = {c: v * 2 for c, v in columns.items()}
+    assert tick_store.merge_columns("T", dates[:1000],
+                                    {c: v[:1000] for c, v in source.items()},
+                                    store_dir) == 500
+    close = stored("T", "close", store_dir)
+    np.testing.assert_array_equal(close[:500],
+                                  source["close"][:500].astype(np.float32))
+    np.testing.assert_array_equal(close[500:],
+                                  columns["close"][500:1500].astype(np.float32))
+    assert tick_store.merge_columns("T", *bar_rows(bars, 0, 2000),
+                                    store_dir) == 500
+    assert tick_store.read_meta("T", store_dir)["rows"] == 2000
+
+
+# Alpha Vantage csv of rows [lo, hi) of bars, newest first
+def _write_csv(path, bars, lo, hi):
+    dates, columns = bar_rows(bars, lo, hi)
+    df = pd.DataFrame({tick_store.DATE_COLUMN: dates,
+                       **{key: columns[column] for key, column
+                          in tick_store.CSV_COLUMNS.items()}})
+    df.iloc[::-1].to_csv(path, date_format="%Y-%m-%d %H:%M:%S", index=False)
+
+
+def test_newer_csv_keeps_the_appended_bars(tmp_path, store_dir, bars):
+    csv_path = str(tmp_path / "t.csv")
+    _write_csv(csv_path, bars, 500, 1000)
+    assert tick_store.ensure_ingested(csv_path, "T", store_dir)["rows"] == 500
+    tick_store.append_columns("T", *bar_rows(bars, 1000, 1200), store_dir)
+
+    # a csv written after the store, reaching further back
+    meta_path = tick_store._meta_path("T", store_dir)
+    earlier = os.path.getmtime(meta_path) - 10
+    os.utime(meta_path, (earlier, earlier))
+    _write_csv(csv_path, bars, 0, 1000)
+    meta = tick_store.ensure_ingested(csv_path, "T", store_dir)
+    assert meta["rows"] == 1200
+    for column in tick_store.PRICE_COLUMNS:
+        np.testing.assert_allclose(stored("T", column, store_dir),
+                                   bars[1][column][:1200], rtol=1e-6)
+
+    # merged once
+    merged = os.path.getmtime(meta_path)
+    assert tick_store.ensure_ingested(csv_path, "T", store_dir) == meta
+    assert os.path.getmtime(meta_path) == merged
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import tick_store
+from trading_calendar import get_calendar
+
+
+# Minute bars of the 09:30-16:00 sessions of the business days of two weeks,
+# without the days of `holidays`
+def session_bars(holidays=()):
+    days = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-13"))
+    days = days[np.is_busday(days) & ~np.isin(days, np.array(
+        holidays, dtype="datetime64[D]"))]
+    minutes = np.arange(9 * 60 + 30, 16 * 60).astype("timedelta64[m]")
+    dates = (days.astype("datetime64[m]")[:, None] + minutes).ravel()
+    n = len(dates)
+    close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, n))
+    return dates, {"open": close, "high": close + 0.1, "low": close - 0.1,
+                   "close": close, "volume": np.ones(n, dtype=np.int64)}
+
+
+@pytest.fixture
+def calendar(store_dir):
+    tick_store.write_columns("T", *session_bars(["2024-01-10"]), store_dir)
+    return get_calendar("T", store_dir)
+
+
+def test_business_days_break_on_weekends_and_nights(calendar):
+    breaks = calendar.rangebreaks()
+    assert {"bounds": ["sat", "mon"]} in breaks
+    assert {"bounds": [16.0, 9.5], "pattern": "hour"} in breaks
+
+
+def test_weekdays_without_bars_are_holidays(calendar):
+    assert calendar.holidays().tolist() == [np.datetime64("2024-01-10")]
+    assert {"values": ["2024-01-10"]} in calendar.rangebreaks()
+    assert not any("values" in b for b in calendar.rangebreaks(
+        start="2024-01-11"))
+
+
+def test_daily_bars_keep_their_nights(calendar):
+    breaks = calendar.rangebreaks(resolution="1d")
+    assert not any(b.get("pattern") == "hour" for b in breaks)
+    assert {"bounds": ["sat", "mon"]} in breaks
+
+
+def test_bars_on_weekends_keep_them(store_dir):
+    dates, columns = session_bars()
+    saturday = np.datetime64("2024-01-13T10:00", "m")
+    tick_store.write_columns("T", np.append(dates, saturday),
+                             {c: np.append(v, v[-1])
+                              for c, v in columns.items()}, store_dir)
+    assert {"bounds": ["sat", "mon"]} not in \
+        get_calendar("T", store_dir).rangebreaks()
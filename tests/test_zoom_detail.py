@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from zoom_detail import (AUTORANGE, MIN_TILE_MINUTES, detail_window,
+                         tile_window, visible_range)
+
+START = np.datetime64("2024-01-02T10:07:13", "ns")
+
+
+@pytest.mark.parametrize("minutes", [1, 16, 17, 90, 1000, 60 * 24 * 40])
+def test_windows_are_power_of_two_tiles_over_the_visible_range(minutes):
+    end = START + np.timedelta64(minutes, "m")
+    first, last = tile_window(START, end)
+    assert first <= START and end <= last
+
+    width = int((last - first) / np.timedelta64(1, "m"))
+    tile = width // 2
+    assert width == 2 * tile and tile & (tile - 1) == 0
+    assert tile >= max(minutes, MIN_TILE_MINUTES)
+    # on the grid of its tile
+    assert (first - np.datetime64(0, "ns")) \
+        % np.timedelta64(tile, "m") == np.timedelta64(0)
+
+
+def test_nearby_pans_request_the_same_window():
+    span = np.timedelta64(100, "m")
+    window = tile_window(START, START + span)
+    shifted = START + np.timedelta64(3, "m")
+    assert tile_window(shifted, shifted + span) == window
+
+
+def test_relayouts():
+    assert visible_range({"autosize": True}) is None
+    assert visible_range({"xaxis.autorange": True}) == AUTORANGE
+    start, end = visible_range({"xaxis.range[0]": "2024-01-02 12:00",
+                                "xaxis.range[1]": "2024-01-02 10:00"})
+    assert (start, end) == (np.datetime64("2024-01-02T10:00", "ns"),
+                            np.datetime64("2024-01-02T12:00", "ns"))
+
+
+def test_shown_window_is_not_requested_again():
+    end = START + np.timedelta64(60, "m")
+    window = tile_window(START, end)
+    meta = {"window": [str(window[0]), str(window[1])]}
+    assert detail_window(meta, START, end) is None
+    assert detail_window({}, START, end) == window
@@ -0,0 +1,436 @@
+import io
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------------------------------------------------------
+# Columnar on-disk tick store
+#
+# Every ticker is kept in its own directory as one .npy file per column:
+#
+#   assets/store/MSFT/date.npy     datetime64[ns], sorted ascending
+#   assets/store/MSFT/open.npy     float32
+#   ...
+#   assets/store/MSFT/volume.npy   uint32, uint64 once a volume outgrows it
+#   assets/store/MSFT/meta.json    row count, columns and data version
+#   assets/store/MSFT/1h/...       rollups of the 1 minute bars, same layout
+#
+# Reads go through np.load(mmap_mode="r"), so only the pages of the columns and
+# rows that are actually touched are loaded into memory.
+STORE_DIR = "assets/store"
+
+# resolution of the stored bars
+BASE_RESOLUTION = "1m"
+
+# OHLCV rollups kept next to the base bars, finest first
+ROLLUP_RESOLUTIONS = {"5m": np.timedelta64(5, "m"),
+                      "15m": np.timedelta64(15, "m"),
+                      "1h": np.timedelta64(1, "h"),
+                      "1d": np.timedelta64(1, "D")}
+
+DATE_COLUMN = "date"
+
+# Alpha Vantage csv layout (see assets/trading_data_to_csv.py)
+CSV_COLUMNS = {"1. open": "open",
+               "2. high": "high",
+               "3. low": "low",
+               "4. close": "close",
+               "5. volume": "volume"}
+
+COLUMN_DTYPES = {"open": np.float32,
+                 "high": np.float32,
+                 "low": np.float32,
+                 "close": np.float32,
+                 "volume": np.uint32}
+
+# rollup volumes sum up many bars
+ROLLUP_DTYPES = {**COLUMN_DTYPES, "volume": np.uint64}
+
+PRICE_COLUMNS = ("open", "high", "low", "close")
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def ticker_dir(ticker: str, store_dir: str = STORE_DIR):
+    return os.path.join(store_dir, ticker.upper())
+
+
+def _column_path(ticker: str, column: str, store_dir: str,
+                 resolution: str = BASE_RESOLUTION):
+    path = ticker_dir(ticker, store_dir)
+    if resolution != BASE_RESOLUTION:
+        path = os.path.join(path, resolution)
+    return os.path.join(path, column + ".npy")
+
+
+def _meta_path(ticker: str, store_dir: str):
+    return os.path.join(ticker_dir(ticker, store_dir), "meta.json")
+
+
+def list_tickers(store_dir: str = STORE_DIR):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(t for t in os.listdir(store_dir)
+                  if os.path.isfile(_meta_path(t, store_dir)))
+
+
+def has_ticker(ticker: str, store_dir: str = STORE_DIR):
+    return os.path.isfile(_meta_path(ticker, store_dir))
+
+
+# parsed meta.json per path, with the (inode, mtime, size) it was read at
+_metas = {}
+_metas_lock = threading.Lock()
+
+
+# Parses meta.json again only once it was replaced
+def read_meta(ticker: str, store_dir: str = STORE_DIR):
+    path = _meta_path(ticker, store_dir)
+    with open(path, "r") as f:
+        stat = os.fstat(f.fileno())
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with _metas_lock:
+            cached = _metas.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, json.load(f))
+            with _metas_lock:
+                _metas[path] = cached
+    return dict(cached[1])
+
+
+def data_version(ticker: str, store_dir: str = STORE_DIR):
+    if not has_ticker(ticker, store_dir):
+        return 0
+    return read_meta(ticker, store_dir)["version"]
+
+
+# ------------------------------------------------------------------------------
+# Rollups
+#
+# Aggregates sorted bars into buckets of `resolution`: first open, max high,
+# min low, last close and summed volume, stamped with the bucket start.
+def aggregate_bars(dates: np.ndarray, columns: dict, resolution: np.timedelta64):
+    step = resolution.astype("timedelta64[ns]").astype(np.int64)
+    buckets = dates.astype("datetime64[ns]").astype(np.int64) // step
+    if not len(buckets):
+        return dates[:0], {c: np.asarray(columns[c])[:0] for c in columns}
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(buckets))
+
+    rolled = {"open": np.asarray(columns["open"])[starts],
+              "high": np.maximum.reduceat(columns["high"], starts),
+              "low": np.minimum.reduceat(columns["low"], starts),
+              "close": np.asarray(columns["close"])[ends - 1],
+              "volume": np.add.reduceat(columns["volume"], starts,
+                                        dtype=np.uint64)}
+    bucket_dates = (buckets[starts] * step).astype("datetime64[ns]")
+    return bucket_dates, rolled
+
+
+# Rewrites the rollups of a ticker from its base bars
+def build_rollups(ticker: str, store_dir: str = STORE_DIR):
+    dates = open_column(ticker, DATE_COLUMN, store_dir)
+    columns = open_columns(ticker, OHLCV_COLUMNS, store_dir)
+    files, rows = _rollup_files(ticker, dates, columns, store_dir)
+    for path, values in files.items():
+        _save_column(path, values)
+    return rows
+
+
+# path -> values of the rollups of the base bars, and resolution -> rows
+def _rollup_files(ticker: str, dates: np.ndarray, columns: dict,
+                  store_dir: str):
+    files = {}
+    rows = {}
+    for resolution, step in ROLLUP_RESOLUTIONS.items():
+        os.makedirs(os.path.dirname(
+            _column_path(ticker, DATE_COLUMN, store_dir, resolution)),
+            exist_ok=True)
+        rolled_dates, rolled = aggregate_bars(dates, columns, step)
+        files[_column_path(ticker, DATE_COLUMN, store_dir, resolution)] = \
+            rolled_dates
+        for column, dtype in ROLLUP_DTYPES.items():
+            files[_column_path(ticker, column, store_dir, resolution)] = \
+                rolled[column].astype(dtype)
+        rows[resolution] = int(len(rolled_dates))
+    return files, rows
+
+
+# Brings the rollups of `rolled_rows` (resolution -> rows, from the meta) up
+# to date after base rows from `first_new_row` on were appended. Only the
+# last, possibly partial, bucket of every rollup and the buckets of the new
+# rows are aggregated again.
+def _update_rollups(ticker: str, first_new_row: int, rolled_rows: dict,
+                    store_dir: str):
+    dates = open_column(ticker, DATE_COLUMN, store_dir)
+    rows = {}
+    for resolution, step in ROLLUP_RESOLUTIONS.items():
+        keep = rolled_rows[resolution]
+        start = first_new_row
+        if keep:
+            keep -= 1
+            last = open_column(ticker, DATE_COLUMN, store_dir,
+                               resolution)[keep]
+            start = min(start, int(np.searchsorted(dates, last)))
+
+        columns = {c: open_column(ticker, c, store_dir)[start:]
+                   for c in OHLCV_COLUMNS}
+        new_dates, rolled = aggregate_bars(dates[start:], columns, step)
+        _write_tail(_column_path(ticker, DATE_COLUMN, store_dir, resolution),
+                    keep, new_dates)
+        for column, dtype in ROLLUP_DTYPES.items():
+            _write_tail(_column_path(ticker, column, store_dir, resolution),
+                        keep, rolled[column].astype(dtype))
+        rows[resolution] = keep + int(len(new_dates))
+    return rows
+
+
+# ------------------------------------------------------------------------------
+# Ingestion
+#
+# Readers map the columns while they are written, so a file is never changed
+# in a way a mapping of it cannot see: columns are rewritten next to their file
+# and swapped in, appended rows are written before the header that counts them,
+# and meta.json, which readers trim every column to, is replaced last. A full
+# rewrite swaps all its files in while meta.json is marked "rewriting", readers
+# wait for it to end (see ticker_manager).
+def _write_meta(ticker: str, meta: dict, store_dir: str):
+    path = _meta_path(ticker, store_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(path + ".tmp", path)
+
+
+def write_columns(ticker: str, dates: np.ndarray, columns: dict,
+                  store_dir: str = STORE_DIR):
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    # keep the store sorted ascending no matter how the source was ordered
+    order = np.argsort(dates, kind="stable")
+    if not (order == np.arange(len(order))).all():
+        dates = dates[order]
+        columns = {c: np.asarray(v)[order] for c, v in columns.items()}
+
+    path = ticker_dir(ticker, store_dir)
+    os.makedirs(path, exist_ok=True)
+    old = read_meta(ticker, store_dir) if has_ticker(ticker, store_dir) \
+        else None
+    version = (old["version"] if old else 0) + 1
+
+    # every file is written next to its column first, then all are swapped in
+    columns = {c: as_store_type(columns[c], dtype)
+               for c, dtype in COLUMN_DTYPES.items()}
+    files = {_column_path(ticker, DATE_COLUMN, store_dir): dates,
+             **{_column_path(ticker, c, store_dir): v
+                for c, v in columns.items()}}
+    rollup_files, rollup_rows = _rollup_files(ticker, dates, columns,
+                                              store_dir)
+    files.update(rollup_files)
+    for column_path, values in files.items():
+        with open(column_path + ".tmp", "wb") as f:
+            np.save(f, values)
+    if old is not None:
+        _write_meta(ticker, {**old, "rewriting": True}, store_dir)
+    for column_path in files:
+        os.replace(column_path + ".tmp", column_path)
+
+    meta = {"ticker": ticker.upper(),
+            "rows": int(len(dates)),
+            "columns": list(COLUMN_DTYPES),
+            "rollups": rollup_rows,
+            "version": version,
+            # version of the last full rewrite, appends leave it unchanged
+            "base_version": version}
+    _write_meta(ticker, meta, store_dir)
+    return meta
+
+
+# Casts a column to its store type; integer columns whose values outgrow it
+# are widened to 64 bits
+def as_store_type(values, dtype):
+    values = np.asarray(values)
+    if np.issubdtype(dtype, np.integer):
+        if values.dtype.kind == "f":
+            values = np.nan_to_num(values).round()
+        if np.issubdtype(dtype, np.unsignedinteger):
+            values = np.clip(values, 0, None)
+        if len(values) and values.max() > np.iinfo(dtype).max:
+            dtype = (np.uint64 if np.issubdtype(dtype, np.unsignedinteger)
+                     else np.int64)
+    return values.astype(dtype)
+
+
+def _fits(values: np.ndarray, dtype):
+    if np.can_cast(values.dtype, dtype):
+        return True
+    if values.dtype.kind not in "iu" or dtype.kind not in "iu":
+        return False
+    return not len(values) or (values.min() >= np.iinfo(dtype).min
+                               and values.max() <= np.iinfo(dtype).max)
+
+
+# Writes a column next to its file and swaps it in, readers mapping the old
+# file keep it
+def _save_column(path: str, values: np.ndarray):
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, values)
+    os.replace(path + ".tmp", path)
+
+
+# Overwrites a .npy column from row `start` on with `values`, dropping any
+# rows after them. When the column does not shrink and its padded header
+# allows it, the rows are written in place and the header patched after them,
+# so appending costs O(new rows) instead of rewriting the column and a reader
+# never sees a header counting rows the file does not have yet. Rows before
+# the old end that are overwritten (the last bucket of a rollup) change under
+# readers in place.
+def _write_tail(path: str, start: int, values: np.ndarray):
+    with open(path, "r+b") as f:
+        major, minor = np.lib.format.read_magic(f)
+        read_header = (np.lib.format.read_array_header_1_0 if major == 1
+                       else np.lib.format.read_array_header_2_0)
+        shape, fortran_order, dtype = read_header(f)
+        header_length = f.tell()
+
+        header = io.BytesIO()
+        header_dict = {"descr": np.lib.format.dtype_to_descr(dtype),
+                       "fortran_order": False,
+                       "shape": (start + len(values),)}
+        if major == 1:
+            np.lib.format.write_array_header_1_0(header, header_dict)
+        else:
+            np.lib.format.write_array_header_2_0(header, header_dict)
+
+        if len(header.getvalue()) == header_length and \
+                start + len(values) >= shape[0] and _fits(values, dtype):
+            f.seek(header_length + start * dtype.itemsize)
+            f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            f.flush()
+            f.seek(0)
+            f.write(header.getvalue())
+            return
+
+    # a column that shrinks or that the values outgrow (it is widened) is
+    # rewritten and swapped in
+    existing = np.load(path)[:start]
+    dtype = (existing.dtype if _fits(values, existing.dtype)
+             else np.promote_types(existing.dtype, values.dtype))
+    _save_column(path, np.concatenate((existing.astype(dtype),
+                                       values.astype(dtype))))
+
+
+# Appends bars newer than the last stored one and updates the rollups
+# incrementally; bars at or before the last stored date are ignored. Returns
+# the number of appended rows.
+def append_columns(ticker: str, dates: np.ndarray, columns: dict,
+                   store_dir: str = STORE_DIR):
+    if not has_ticker(ticker, store_dir):
+        write_columns(ticker, dates, columns, store_dir)
+        return len(dates)
+
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    order = np.argsort(dates, kind="stable")
+    # rows past the meta's (of an append that did not finish) are overwritten
+    meta = read_meta(ticker, store_dir)
+    rows = meta["rows"]
+    last = open_column(ticker, DATE_COLUMN, store_dir)[rows - 1] \
+        if rows else None
+    new = order if last is None else order[dates[order] > last]
+    if not len(new):
+        return 0
+
+    _write_tail(_column_path(ticker, DATE_COLUMN, store_dir), rows, dates[new])
+    for column, dtype in COLUMN_DTYPES.items():
+        _write_tail(_column_path(ticker, column, store_dir), rows,
+                    as_store_type(np.asarray(columns[column])[new], dtype))
+
+    meta.update({"rows": rows + int(len(new)),
+                 "rollups": _update_rollups(ticker, rows, meta["rollups"],
+                                             store_dir),
+                 "version": meta["version"] + 1})
+    _write_meta(ticker, meta, store_dir)
+    return int(len(new))
+
+
+# Adds the bars of dates the store does not have yet and keeps every stored
+# bar, the ones appended since the source was written included. Bars newer
+# than the last stored one are appended, earlier ones rewrite the store with
+# both merged. Returns the number of added rows.
+def merge_columns(ticker: str, dates: np.ndarray, columns: dict,
+                  store_dir: str = STORE_DIR):
+    if not has_ticker(ticker, store_dir):
+        write_columns(ticker, dates, columns, store_dir)
+        return len(dates)
+
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    rows = read_meta(ticker, store_dir)["rows"]
+    stored = np.asarray(open_column(ticker, DATE_COLUMN, store_dir)[:rows])
+    new = ~np.isin(dates, stored)
+    if not new.any():
+        return 0
+    if not rows or dates[new].min() > stored[-1]:
+        return append_columns(ticker, dates[new],
+                              {c: np.asarray(columns[c])[new]
+                               for c in COLUMN_DTYPES}, store_dir)
+
+    merged = {c: np.concatenate((open_column(ticker, c, store_dir)[:rows],
+                                 as_store_type(np.asarray(columns[c])[new],
+                                               dtype)))
+              for c, dtype in COLUMN_DTYPES.items()}
+    write_columns(ticker, np.concatenate((stored, dates[new])), merged,
+                  store_dir)
+    return int(new.sum())
+
+
+def read_alpha_vantage_csv(csv_path: str):
+    df = pd.read_csv(csv_path)
+    df.rename(columns=CSV_COLUMNS, inplace=True)
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN],
+                                     format="%Y-%m-%d %H:%M:%S")
+    return df
+
+
+def ingest_csv(csv_path: str, ticker: str, store_dir: str = STORE_DIR):
+    df = read_alpha_vantage_csv(csv_path)
+    return write_columns(ticker, df[DATE_COLUMN].values,
+                         {c: df[c].values for c in COLUMN_DTYPES}, store_dir)
+
+
+# Ingests the csv once. A csv newer than the store is merged into it: its
+# bars the store does not have are added, the stored ones (with the bars
+# IngestionService appended) are kept.
+def ensure_ingested(csv_path: str, ticker: str, store_dir: str = STORE_DIR):
+    if not has_ticker(ticker, store_dir):
+        return ingest_csv(csv_path, ticker, store_dir)
+    meta_path = _meta_path(ticker, store_dir)
+    csv_changed = os.path.isfile(csv_path) and \
+        os.path.getmtime(csv_path) > os.path.getmtime(meta_path)
+    meta = read_meta(ticker, store_dir)
+    if "rollups" not in meta:
+        meta["rollups"] = build_rollups(ticker, store_dir)
+        _write_meta(ticker, meta, store_dir)
+    if csv_changed:
+        df = read_alpha_vantage_csv(csv_path)
+        merge_columns(ticker, df[DATE_COLUMN].values,
+                      {c: df[c].values for c in COLUMN_DTYPES}, store_dir)
+        # merged, the csv is not read again until it changes
+        os.utime(meta_path)
+        meta = read_meta(ticker, store_dir)
+    return meta
+
+
+# ------------------------------------------------------------------------------
+# Reading
+def open_column(ticker: str, column: str, store_dir: str = STORE_DIR,
+                resolution: str = BASE_RESOLUTION):
+    return np.load(_column_path(ticker, column, store_dir, resolution),
+                   mmap_mode="r")
+
+
+def open_columns(ticker: str, columns=OHLCV_COLUMNS,
+                 store_dir: str = STORE_DIR,
+                 resolution: str = BASE_RESOLUTION):
+    return {c: open_column(ticker, c, store_dir, resolution) for c in columns}
+
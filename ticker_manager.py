@@ -0,0 +1,240 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import mmap
+import threading
+import time
+
+import tick_store
+
+
+# ------------------------------------------------------------------------------
+# Ticker manager
+#
+# Opens the columns of a ticker on its first request and keeps them in an LRU
+# bounded by the bytes mapped rather than by the number of tickers, so the app
+# can serve thousands of symbols while only the recently used ones stay
+# mapped. Every entry belongs to one data version of its ticker, its columns
+# are trimmed to the rows the meta.json of that version counts (appends write
+# past them while they are mapped), and it is reopened once the store moves
+# on. Evicting an entry unmaps its columns once the last frame viewing them is
+# gone. Shared by all Dash worker threads: loads of the same ticker wait for
+# each other instead of repeating the work.
+#
+# A render reads a ticker many times (index, columns, rollups, calendar,
+# version of its cache keys). Within pinned() all of them see the version of
+# the first read: meta.json is read once per ticker and the same entries are
+# handed out however far the store moves on meanwhile.
+
+# bytes of mapped columns kept open
+MAX_BYTES = 1 << 30
+
+# seconds a load waits for a rewrite of the store to end
+REWRITE_WAIT = 5.0
+
+
+class TickerData:
+    def __init__(self, version: int, dates, columns: dict):
+        self.version = version
+        self.dates = dates
+        self.columns = columns
+        self.nbytes = dates.nbytes + sum(c.nbytes for c in columns.values())
+        # time_index.TimeIndex of the dates, built on first use
+        self.index = None
+        # trading_calendar.TradingCalendar, built on first use (daily rollups)
+        self.calendar = None
+
+
+# Meta of the ticker once no rewrite is in progress
+def _settled_meta(ticker: str, store_dir: str):
+    deadline = time.monotonic() + REWRITE_WAIT
+    meta = tick_store.read_meta(ticker, store_dir)
+    while meta.get("rewriting") and time.monotonic() < deadline:
+        time.sleep(0.01)
+        meta = tick_store.read_meta(ticker, store_dir)
+    return meta
+
+
+# metas and entries of the tickers read within pinned()
+class _Pins:
+    def __init__(self):
+        self.metas = {}
+        self.entries = {}
+
+
+class TickerManager:
+    def __init__(self, max_bytes: int = MAX_BYTES, prefetch_workers: int = 2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._local = threading.local()
+        self._prefetch_workers = prefetch_workers
+        self._executor = None
+
+    # Pins the tickers read by the block to their version at the first read,
+    # nested blocks share the outermost pins
+    @contextmanager
+    def pinned(self):
+        if getattr(self._local, "pins", None) is not None:
+            yield
+            return
+        self._local.pins = _Pins()
+        try:
+            yield
+        finally:
+            self._local.pins = None
+
+    def meta(self, ticker: str, store_dir: str = tick_store.STORE_DIR):
+        pins = getattr(self._local, "pins", None)
+        key = (store_dir, ticker.upper())
+        if pins is not None and key in pins.metas:
+            return pins.metas[key]
+        meta = tick_store.read_meta(ticker, store_dir)
+        if pins is not None:
+            pins.metas[key] = meta
+        return meta
+
+    # data version of the ticker, 0 when it is not in the store
+    def version(self, ticker: str, store_dir: str = tick_store.STORE_DIR):
+        if not tick_store.has_ticker(ticker, store_dir):
+            return 0
+        return self.meta(ticker, store_dir)["version"]
+
+    def get(self, ticker: str, store_dir: str = tick_store.STORE_DIR,
+            resolution: str = tick_store.BASE_RESOLUTION):
+        key = (store_dir, ticker.upper(), resolution)
+        pins = getattr(self._local, "pins", None)
+        if pins is not None and key in pins.entries:
+            with self._lock:
+                self.hits += 1
+            return pins.entries[key]
+
+        meta = self.meta(ticker, store_dir)
+        data = self._cached(key, meta["version"])
+        if data is not None:
+            with self._lock:
+                self.hits += 1
+        else:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                # another thread may have loaded it while we waited
+                data = self._cached(key, meta["version"])
+                if data is None:
+                    with self._lock:
+                        self.misses += 1
+                    data = self._load(ticker, store_dir, resolution, meta,
+                                      pins)
+                    self._put(key, data)
+            with self._lock:
+                self._key_locks.pop(key, None)
+        if pins is not None:
+            pins.entries[key] = data
+        return data
+
+    def _cached(self, key, version):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None or data.version != version:
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    # Opens the columns of a meta. The store writes the meta last, but a full
+    # rewrite swaps all files while the meta is marked "rewriting": a load
+    # that began during one or that one began under is retried once on the
+    # meta after it, which then replaces the pinned meta.
+    def _load(self, ticker, store_dir, resolution, meta, pins=None):
+        if not meta.get("rewriting"):
+            data = None
+            try:
+                data = self._open(ticker, store_dir, resolution, meta)
+            except ValueError:
+                pass
+            current = tick_store.read_meta(ticker, store_dir)
+            if data is not None and not current.get("rewriting") and \
+                    current.get("base_version") == meta.get("base_version"):
+                return data
+        meta = _settled_meta(ticker, store_dir)
+        if pins is not None:
+            pins.metas[(store_dir, ticker.upper())] = meta
+        data = self._open(ticker, store_dir, resolution, meta)
+        if data is None:
+            raise ValueError("store of {} changed while it was opened"
+                             .format(ticker))
+        return data
+
+    # TickerData of the rows the meta counts, None when a column is shorter
+    @staticmethod
+    def _open(ticker, store_dir, resolution, meta):
+        rows = (meta["rows"] if resolution == tick_store.BASE_RESOLUTION
+                else meta["rollups"][resolution])
+        dates = tick_store.open_column(ticker, tick_store.DATE_COLUMN,
+                                       store_dir, resolution)[:rows]
+        columns = {c: column[:rows] for c, column in tick_store.open_columns(
+            ticker, tick_store.OHLCV_COLUMNS, store_dir, resolution).items()}
+        if any(len(a) < rows for a in (dates, *columns.values())):
+            return None
+        return TickerData(meta["version"], dates, columns)
+
+    def _put(self, key, data):
+        with self._lock:
+            old = self._entries.get(key)
+            # a pinned render loading an older version leaves the newer entry
+            if old is not None and old.version > data.version:
+                return
+            self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = data
+            self._bytes += data.nbytes
+            # the entry just loaded stays, even when it is larger than the bound
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    # Hint that the tickers are about to be requested (e.g. by the favorites
+    # board): opens them in the background and asks the kernel to read their
+    # columns ahead
+    def prefetch(self, tickers, store_dir: str = tick_store.STORE_DIR,
+                 resolutions=(tick_store.BASE_RESOLUTION,)):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self._prefetch_workers, thread_name_prefix="prefetch")
+            executor = self._executor
+        return [executor.submit(self._prefetch, ticker, store_dir, resolution)
+                for ticker in tickers for resolution in resolutions
+                if tick_store.has_ticker(ticker, store_dir)]
+
+    def _prefetch(self, ticker, store_dir, resolution):
+        data = self.get(ticker, store_dir, resolution)
+        if hasattr(mmap, "MADV_WILLNEED"):
+            for array in (data.dates, *data.columns.values()):
+                mapped = getattr(array, "_mmap", None)
+                if mapped is not None:
+                    mapped.madvise(mmap.MADV_WILLNEED)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "bytes": self._bytes,
+                    "max_bytes": self.max_bytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+tickers = TickerManager()
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import tick_store
+from bars import Bars
+from ticker_manager import tickers
+
+
+# ------------------------------------------------------------------------------
+# Sorted time index
+#
+# Finds the rows of a time window by binary search on the date column instead
+# of masking the whole history, so the cost of a slice depends on the size of
+# the window only. Dates may be sorted ascending or newest-first (the order
+# Alpha Vantage writes its csv in); the returned views are always ascending and
+# never copy the underlying column.
+class TimeIndex:
+    def __init__(self, dates: np.ndarray):
+        self.dates = dates
+        self.descending = len(dates) > 1 and dates[0] > dates[-1]
+        # ascending view of the dates, reversing a view does not copy
+        self._ascending = dates[::-1] if self.descending else dates
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def first(self):
+        return self._ascending[0] if len(self) else None
+
+    @property
+    def last(self):
+        return self._ascending[-1] if len(self) else None
+
+    # Returns the [lo, hi) positions in ascending order of the rows in
+    # [start, end]
+    def range_positions(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(
+            self._ascending, np.datetime64(start, "ns"), side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(
+            self._ascending, np.datetime64(end, "ns"), side="right"))
+        return lo, max(lo, hi)
+
+    # a period of None is the whole history up to now
+    def period_positions(self, period: int, now: datetime = None):
+        end_dt = datetime.now() if now is None else now
+        start_dt = None if period is None else end_dt - timedelta(hours=period)
+        return self.range_positions(start_dt, end_dt)
+
+    # Zero-copy ascending view of any column aligned with the dates
+    def view(self, column: np.ndarray, lo: int, hi: int):
+        if self.descending:
+            n = len(self)
+            return column[n - hi:n - lo][::-1]
+        return column[lo:hi]
+
+    def date_view(self, lo: int, hi: int):
+        return self.view(self.dates, lo, hi)
+
+
+# ------------------------------------------------------------------------------
+# Index of the columns the ticker manager keeps open, rebuilt with every data
+# version of the ticker
+def get_time_index(ticker: str, store_dir: str = tick_store.STORE_DIR,
+                   resolution: str = tick_store.BASE_RESOLUTION):
+    data = tickers.get(ticker, store_dir, resolution)
+    if data.index is None:
+        data.index = TimeIndex(data.dates)
+    return data.index
+
+
+# ------------------------------------------------------------------------------
+# Frame reads
+#
+# Returns a frame indexed by date with only the requested columns and the rows
+# of the last `period` hours. The columns are views on the memory mapped store,
+# nothing outside the range is read from disk. The app reads rows by position
+# (read_rows, read_bars), only benchmarks.py reads periods.
+def read_period(ticker: str, period: int, columns=tick_store.OHLCV_COLUMNS,
+                now: datetime = None, store_dir: str = tick_store.STORE_DIR,
+                resolution: str = tick_store.BASE_RESOLUTION):
+    index = get_time_index(ticker, store_dir, resolution)
+    lo, hi = index.period_positions(period, now)
+    return _frame(ticker, index, columns, lo, hi, store_dir, resolution)
+
+
+# Rows [lo, hi) in ascending order, as returned by the index positions
+def read_rows(ticker: str, lo: int, hi: int, columns=tick_store.OHLCV_COLUMNS,
+              store_dir: str = tick_store.STORE_DIR,
+              resolution: str = tick_store.BASE_RESOLUTION):
+    index = get_time_index(ticker, store_dir, resolution)
+    return _frame(ticker, index, columns, lo, hi, store_dir, resolution)
+
+
+# Rows [lo, hi) as compact bars.Bars, the prices are views on the store
+def read_bars(ticker: str, lo: int, hi: int, columns=tick_store.OHLCV_COLUMNS,
+              store_dir: str = tick_store.STORE_DIR,
+              resolution: str = tick_store.BASE_RESOLUTION):
+    index = get_time_index(ticker, store_dir, resolution)
+    opened = tickers.get(ticker, store_dir, resolution).columns
+    return Bars.from_columns(index.date_view(lo, hi),
+                             {c: index.view(opened[c], lo, hi)
+                              for c in columns})
+
+
+# ------------------------------------------------------------------------------
+# Coarsened reads
+#
+# Aggregates the rows [lo, hi) into bars of `step` consecutive rows each, at
+# most `max_rows` of them, for histories too long even for the coarsest
+# rollup. The columns are streamed from the store in chunks of whole steps, so
+# only one chunk of every column is in memory at a time.
+CHUNK_ROWS = 1 << 16
+
+
+def _aggregate(column: str, values: np.ndarray, starts: np.ndarray):
+    if column == "open":
+        return values[starts]
+    if column == "close":
+        return values[np.append(starts[1:], len(values)) - 1]
+    if column == "high":
+        return np.maximum.reduceat(values, starts)
+    if column == "low":
+        return np.minimum.reduceat(values, starts)
+    return np.add.reduceat(values, starts, dtype=np.uint64)
+
+
+def read_coarsened(ticker: str, lo: int, hi: int, max_rows: int,
+                   columns=tick_store.OHLCV_COLUMNS,
+                   store_dir: str = tick_store.STORE_DIR,
+                   resolution: str = tick_store.BASE_RESOLUTION,
+                   chunk_rows: int = CHUNK_ROWS):
+    index = get_time_index(ticker, store_dir, resolution)
+    step = max(1, -(-(hi - lo) // max_rows))
+    if step == 1:
+        return _frame(ticker, index, columns, lo, hi, store_dir, resolution)
+
+    opened = tickers.get(ticker, store_dir, resolution).columns
+    chunk = max(1, chunk_rows // step) * step
+    dates = []
+    parts = {c: [] for c in columns}
+    for start in range(lo, hi, chunk):
+        end = min(hi, start + chunk)
+        starts = np.arange(0, end - start, step)
+        dates.append(index.date_view(start, end)[starts])
+        for c in columns:
+            parts[c].append(_aggregate(c, np.asarray(
+                index.view(opened[c], start, end)), starts))
+    return pd.DataFrame({c: np.concatenate(parts[c]) for c in columns},
+                        index=pd.DatetimeIndex(np.concatenate(dates),
+                                               name=tick_store.DATE_COLUMN))
+
+
+# Picks the coarsest resolution that still has at least `min_rows` bars in
+# [start, end], falling back to the base bars
+def select_resolution(ticker: str, start, end, min_rows: int,
+                      store_dir: str = tick_store.STORE_DIR):
+    for resolution in reversed(list(tick_store.ROLLUP_RESOLUTIONS)):
+        lo, hi = get_time_index(ticker, store_dir,
+                                resolution).range_positions(start, end)
+        if hi - lo >= min_rows:
+            return resolution
+    return tick_store.BASE_RESOLUTION
+
+
+def _frame(ticker, index, columns, lo, hi, store_dir, resolution):
+    opened = tickers.get(ticker, store_dir, resolution).columns
+    data = {c: index.view(opened[c], lo, hi) for c in columns}
+    dates = pd.DatetimeIndex(index.date_view(lo, hi),
+                             name=tick_store.DATE_COLUMN)
+    return pd.DataFrame(data, index=dates, copy=False)
@@ -0,0 +1,215 @@
+import attr
+
+import charts
+import indicators
+import tick_store
+
+
+# ------------------------------------------------------------------------------
+# Trace registry
+#
+# Describes every chart type and study once at startup: the function building
+# its trace(s), where it is placed, its default parameters, the store columns
+# it reads and how many bars it looks back. The figure pipeline plans a render
+# from these descriptors instead of eval()-ing names coming in from callbacks,
+# and plugin indicators only have to register a descriptor.
+
+# placements
+CHART = "chart"          # main trace of the first row, fn(df) -> trace
+OVERLAY = "overlay"      # drawn onto the first row, fn(df, fig, **kw) -> fig
+SUBPLOT = "subplot"      # gets a row of its own, fn(df, **kw) -> trace
+
+PLACEMENTS = (CHART, OVERLAY, SUBPLOT)
+
+
+def _no_lookback(params):
+    return 0
+
+
+@attr.s(frozen=True, kw_only=True)
+class TraceDescriptor:
+    name = attr.ib(type=str)
+    function = attr.ib()
+    placement = attr.ib(type=str, validator=attr.validators.in_(PLACEMENTS))
+    # indicators.compute_batch study the trace plots, None for chart types
+    study = attr.ib(default=None)
+    params = attr.ib(factory=dict)
+    inputs = attr.ib(default=("close",))
+    # params -> bars needed before the first valid value
+    lookback = attr.ib(default=_no_lookback)
+
+    def merged_params(self, params: dict = None):
+        return {**self.params, **(params or {})}
+
+
+class TraceRegistry:
+    def __init__(self):
+        self._descriptors = {}
+
+    def register(self, descriptor: TraceDescriptor):
+        self._descriptors[descriptor.name] = descriptor
+        return descriptor
+
+    def get(self, name: str):
+        return self._descriptors.get(name)
+
+    def __contains__(self, name):
+        return name in self._descriptors
+
+    def names(self, placement: str = None):
+        return [name for name, d in self._descriptors.items()
+                if placement is None or d.placement == placement]
+
+
+# ------------------------------------------------------------------------------
+# Render plan
+@attr.s(frozen=True, kw_only=True)
+class RenderPlan:
+    chart = attr.ib()
+    # tuples of (descriptor, merged params)
+    overlays = attr.ib()
+    subplots = attr.ib()
+
+    @property
+    def studies(self):
+        return self.overlays + self.subplots
+
+    # rows of the subplot grid
+    @property
+    def rows(self):
+        return 1 + len(self.subplots)
+
+    # (descriptor, params, grid row) of the chart and of every study, in the
+    # order their traces are drawn
+    @property
+    def segments(self):
+        return ((self.chart, {}, 1),) \
+            + tuple((d, p, 1) for d, p in self.overlays) \
+            + tuple((d, p, row)
+                    for row, (d, p) in enumerate(self.subplots, start=2))
+
+    # Plan of the chart and the studies of some of its segments
+    def restricted(self, segments):
+        studies = [(d, p) for d, p, _ in segments if d.placement != CHART]
+        return attr.evolve(
+            self,
+            overlays=tuple(s for s in studies if s[0].placement == OVERLAY),
+            subplots=tuple(s for s in studies if s[0].placement == SUBPLOT))
+
+    # store columns to read, in store order
+    @property
+    def columns(self):
+        needed = set(self.chart.inputs)
+        for descriptor, _ in self.studies:
+            needed.update(descriptor.inputs)
+        return [c for c in tick_store.OHLCV_COLUMNS if c in needed]
+
+    # bars the studies are warmed up on, the longest of their lookbacks
+    @property
+    def lookback(self):
+        return max([d.lookback(p) for d, p in self.studies], default=0)
+
+    # (study, params) requests for indicators.compute_batch
+    @property
+    def batch(self):
+        return [(d.study, p) for d, p in self.studies]
+
+
+# Plans a render; unknown chart types raise a ValueError, empty ("No study"),
+# unknown and repeated studies are left out
+def plan_render(chart_type: str, studies: tuple, study_params: dict = None,
+                registry: TraceRegistry = None):
+    registry = registry or default_registry
+    study_params = study_params or {}
+
+    chart = registry.get(chart_type)
+    if chart is None or chart.placement != CHART:
+        raise ValueError("unknown chart type: {!r}".format(chart_type))
+
+    overlays, subplots = [], []
+    for study in dict.fromkeys(studies or ()):
+        descriptor = registry.get(study)
+        if descriptor is None or descriptor.placement == CHART:
+            continue
+        entry = (descriptor, descriptor.merged_params(study_params.get(study)))
+        (subplots if descriptor.placement == SUBPLOT else overlays).append(entry)
+    return RenderPlan(chart=chart, overlays=tuple(overlays),
+                      subplots=tuple(subplots))
+
+
+# ------------------------------------------------------------------------------
+# Built-in traces
+OHLC = ("open", "high", "low", "close")
+HLC = ("high", "low", "close")
+HLCV = ("high", "low", "close", "volume")
+
+default_registry = TraceRegistry()
+
+
+# Registers a trace with the default registry; the params of a study trace
+# are the defaults of its study everywhere (indicators.STUDY_DEFAULTS, the
+# parameter dropdowns of the app)
+def register_trace(descriptor: TraceDescriptor):
+    if descriptor.study is not None:
+        indicators.STUDY_DEFAULTS[descriptor.study] = dict(descriptor.params)
+    return default_registry.register(descriptor)
+
+
+for _descriptor in (
+        TraceDescriptor(name="line_trace", function=charts.line_trace,
+                        placement=CHART),
+        TraceDescriptor(name="area_trace", function=charts.area_trace,
+                        placement=CHART),
+        TraceDescriptor(name="candlestick_trace",
+                        function=charts.candlestick_trace, placement=CHART,
+                        inputs=OHLC),
+        TraceDescriptor(name="colored_bar_trace",
+                        function=charts.colored_bar_trace, placement=CHART,
+                        inputs=OHLC),
+        TraceDescriptor(name="bar_trace", function=charts.bar_trace,
+                        placement=CHART, inputs=OHLC),
+
+        TraceDescriptor(name="moving_average_trace",
+                        function=charts.moving_average_trace,
+                        placement=OVERLAY, study="moving_average",
+                        params={"window": 5},
+                        lookback=lambda p: p["window"] - 1),
+        TraceDescriptor(name="e_moving_average_trace",
+                        function=charts.e_moving_average_trace,
+                        placement=OVERLAY, study="e_moving_average",
+                        params={"span": 20},
+                        lookback=lambda p: 3 * p["span"]),
+        TraceDescriptor(name="w_moving_average_trace",
+                        function=charts.w_moving_average_trace,
+                        placement=OVERLAY, study="w_moving_average",
+                        params={"window": 20},
+                        lookback=lambda p: p["window"] - 1),
+        TraceDescriptor(name="de_moving_average_trace",
+                        function=charts.de_moving_average_trace,
+                        placement=OVERLAY, study="de_moving_average",
+                        params={"span": 20},
+                        lookback=lambda p: 6 * p["span"]),
+        TraceDescriptor(name="bollinger_trace",
+                        function=charts.bollinger_trace, placement=OVERLAY,
+                        study="bollinger",
+                        params={"window_size": 10, "num_of_std": 5},
+                        lookback=lambda p: p["window_size"] - 1),
+        TraceDescriptor(name="pp_trace", function=charts.pp_trace,
+                        placement=OVERLAY, study="pp", inputs=HLC),
+
+        TraceDescriptor(name="accumulation_trace",
+                        function=charts.accumulation_trace,
+                        placement=SUBPLOT, study="accumulation", inputs=HLCV),
+        TraceDescriptor(name="cci_trace", function=charts.cci_trace,
+                        placement=SUBPLOT, study="cci", params={"n_days": 20},
+                        inputs=HLC, lookback=lambda p: p["n_days"] - 1),
+        TraceDescriptor(name="roc_trace", function=charts.roc_trace,
+                        placement=SUBPLOT, study="roc", params={"n_days": 5},
+                        lookback=lambda p: p["n_days"]),
+        TraceDescriptor(name="stoc_trace", function=charts.stoc_trace,
+                        placement=SUBPLOT, study="stoc", inputs=HLC),
+        TraceDescriptor(name="mom_trace", function=charts.mom_trace,
+                        placement=SUBPLOT, study="mom", params={"n": 5},
+                        lookback=lambda p: p["n"]),
+):
+    register_trace(_descriptor)
@@ -0,0 +1,87 @@
+import numpy as np
+
+import tick_store
+from ticker_manager import tickers
+
+
+# ------------------------------------------------------------------------------
+# Trading-session calendar
+#
+# Minute bars only exist during the sessions of a ticker, on a date axis the
+# nights, weekends and holidays between them would take up most of the chart.
+# The calendar of a ticker holds its trading days (read from the daily rollup)
+# and the time of day its sessions open and close (from the 15 minute rollup),
+# and turns them into plotly rangebreaks, which collapse the gaps so the bars
+# sit next to each other while the axis keeps its dates (relayout ranges and
+# live extensions stay plain timestamps). Built once per data version of the
+# ticker, alongside its mapped columns.
+
+# resolution the trading days are read from
+DAYS_RESOLUTION = "1d"
+# resolution the session hours are read from, and their granularity
+SESSION_RESOLUTION = "15m"
+
+_DAY = np.timedelta64(1, "D")
+
+
+class TradingCalendar:
+    def __init__(self, days: np.ndarray, session_open: np.timedelta64,
+                 session_close: np.timedelta64):
+        # trading days, datetime64[D] ascending
+        self.days = days
+        # time of day of the first bar and the end of the last bar
+        self.session_open = session_open
+        self.session_close = session_close
+        self.weekends = bool(len(days)) and not np.is_busday(
+            days, weekmask="Sat Sun").any()
+
+    # Weekdays in [start, end] without bars
+    def holidays(self, start=None, end=None):
+        if not len(self.days):
+            return self.days
+        first = self.days[0] if start is None else max(
+            self.days[0], np.datetime64(start, "D"))
+        last = self.days[-1] if end is None else min(
+            self.days[-1], np.datetime64(end, "D"))
+        weekdays = np.arange(first, last + _DAY, dtype="datetime64[D]")
+        weekdays = weekdays[np.is_busday(weekdays)]
+        return weekdays[~np.isin(weekdays, self.days)]
+
+    # plotly rangebreaks for the bars of `resolution` in [start, end]
+    def rangebreaks(self, start=None, end=None,
+                    resolution: str = tick_store.BASE_RESOLUTION):
+        breaks = []
+        if self.weekends:
+            breaks.append({"bounds": ["sat", "mon"]})
+        # daily bars are stamped at midnight, outside any session
+        intraday = resolution == tick_store.BASE_RESOLUTION or \
+            tick_store.ROLLUP_RESOLUTIONS[resolution] < _DAY
+        hours = np.timedelta64(1, "h")
+        if intraday and (self.session_open > np.timedelta64(0, "m")
+                         or self.session_close < _DAY):
+            breaks.append({"bounds": [float(self.session_close / hours),
+                                      float(self.session_open / hours)],
+                           "pattern": "hour"})
+        holidays = self.holidays(start, end)
+        if len(holidays):
+            breaks.append({"values": [str(day) for day in holidays]})
+        return breaks
+
+
+def _build(ticker: str, days: np.ndarray, store_dir: str):
+    days = days.astype("datetime64[D]")
+    stamps = tickers.get(ticker, store_dir, SESSION_RESOLUTION).dates
+    if not len(stamps):
+        return TradingCalendar(days, np.timedelta64(0, "m"), _DAY)
+    time_of_day = (stamps - stamps.astype("datetime64[D]")).astype(
+        "timedelta64[m]")
+    step = tick_store.ROLLUP_RESOLUTIONS[SESSION_RESOLUTION]
+    return TradingCalendar(days, time_of_day.min(),
+                           min(time_of_day.max() + step, _DAY))
+
+
+def get_calendar(ticker: str, store_dir: str = tick_store.STORE_DIR):
+    data = tickers.get(ticker, store_dir, DAYS_RESOLUTION)
+    if data.calendar is None:
+        data.calendar = _build(ticker, data.dates, store_dir)
+    return data.calendar
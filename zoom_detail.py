@@ -0,0 +1,79 @@
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------------------------------------------------------
+# Zoom detail
+#
+# A long period is sent as a few coarse points per pixel. When the user zooms
+# into the chart, the visible x-range is re-queried at the best resolution the
+# time index offers for it and the figure is swapped for one of that range;
+# uirevision keeps the zoom of the user. Like the tiles of a map, ranges are
+# snapped to a grid of windows whose width is a power of two minutes (twice
+# the smallest power of two covering the visible span), so nearby zooms and
+# pans request the same window and hit the figure cache. Relayouts inside the
+# window already shown, or into bars the figure already shows one by one,
+# re-query nothing. The figures are built by figure_pipeline.get_zoom_fig.
+
+# smallest window, in minutes
+MIN_TILE_MINUTES = 16
+
+_RANGE_KEY = re.compile(r"^xaxis\d*\.range(\[[01]\])?$")
+_AUTORANGE_KEY = re.compile(r"^xaxis\d*\.autorange$")
+
+# relayoutData asking for the whole figure again
+AUTORANGE = "autorange"
+
+
+# Returns the visible (start, end) of the x-axis as datetime64, AUTORANGE or
+# None for relayouts which do not touch the x-range (autosize, y zoom, ...)
+def visible_range(relayout_data: dict):
+    if not relayout_data:
+        return None
+    bounds = {}
+    for key, value in relayout_data.items():
+        if _AUTORANGE_KEY.match(key) and value:
+            return AUTORANGE
+        match = _RANGE_KEY.match(key)
+        if not match:
+            continue
+        if match.group(1) is None:
+            bounds[0], bounds[1] = value
+        else:
+            bounds[int(match.group(1)[1])] = value
+    if len(bounds) != 2:
+        return None
+    start, end = sorted(pd.Timestamp(bounds[i]).to_datetime64().astype(
+        "datetime64[ns]") for i in (0, 1))
+    return start, end
+
+
+# Window of the tile grid covering [start, end]
+def tile_window(start: np.datetime64, end: np.datetime64):
+    minutes = max((end - start) / np.timedelta64(1, "m"), MIN_TILE_MINUTES)
+    tile = np.timedelta64(2 ** math.ceil(math.log2(minutes)), "m")
+    epoch = np.datetime64(0, "m")
+    first = epoch + (start.astype("datetime64[m]") - epoch) // tile * tile
+    return (first.astype("datetime64[ns]"),
+            (first + 2 * tile).astype("datetime64[ns]"))
+
+
+def _covers(bounds, start: np.datetime64, end: np.datetime64):
+    return bool(bounds) and np.datetime64(bounds[0]) <= start \
+        and end <= np.datetime64(bounds[1])
+
+
+# Returns the window to re-query for a relayout, or None when the figure of
+# `meta` already shows the visible range in full detail
+def detail_window(meta: dict, start: np.datetime64, end: np.datetime64):
+    window = tile_window(start, end)
+    shown = meta.get("window")
+    if shown and np.datetime64(shown[0]) == window[0] \
+            and np.datetime64(shown[1]) == window[1]:
+        return None
+    if meta.get("full") and _covers(meta.get("range"), start, end):
+        return None
+    return window